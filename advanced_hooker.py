@@ -1,181 +1,44 @@
 import ctypes
 import ctypes.wintypes
-from ctypes import windll, POINTER, Structure, c_char_p, c_void_p, c_int, c_uint, c_ulong
-import win32api
 import win32con
 import win32gui
 import win32process
-import win32clipboard
 import psutil
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
-import threading
-import queue
-import time
-import struct
 from datetime import datetime
-import json
-import re
+import multiprocessing
+import os
 
+from capture_engine import CallbackSink, CaptureEngine, ClipboardSource, JournalSink, MemoryScanSource
+from capture_queue import CaptureQueue
+from capture_journal import CaptureJournal
+from history_store import HistoryStore
+from japanese_classifier import is_japanese
+from memory_scanner import MemoryScanner
+from memory_source import Win32MemorySource
+from metrics import registry
+from text_pane import PaneRenderer
 
-# Windows API structures
-class MEMORY_BASIC_INFORMATION(Structure):
-    _fields_ = [
-        ("BaseAddress", c_void_p),
-        ("AllocationBase", c_void_p),
-        ("AllocationProtect", ctypes.wintypes.DWORD),
-        ("RegionSize", ctypes.c_size_t),
-        ("State", ctypes.wintypes.DWORD),
-        ("Protect", ctypes.wintypes.DWORD),
-        ("Type", ctypes.wintypes.DWORD)
-    ]
 
-
-class AdvancedTextHooker:
+class AdvancedTextHooker(MemoryScanner):
     def __init__(self):
-        self.hooked_processes = {}
-        self.text_patterns = []
-        self.captured_texts = []
+        super().__init__()
+        # (source, text, script line ID) tuples from the capture threads, drained by the GUI
+        self.captured_texts = CaptureQueue(1000)
         self.running = False
-        self.load_patterns()
-
-    def load_patterns(self):
-        """Load common text patterns for Japanese visual novels"""
-        self.text_patterns = [
-            # Common dialogue patterns
-            rb'[\x81-\x9F\xE0-\xFC][\x40-\x7E\x80-\xFC]+',  # Shift-JIS
-            rb'[\xA1-\xFE][\xA1-\xFE]+',  # EUC-JP
-            rb'(?:\xE3[\x80-\xBF][\x80-\xBF])+',  # UTF-8 Japanese
-        ]
 
     def hook_process_advanced(self, pid):
         """Advanced process hooking with memory reading"""
         try:
             # Open process with read permissions
-            process_handle = windll.kernel32.OpenProcess(
-                win32con.PROCESS_VM_READ | win32con.PROCESS_QUERY_INFORMATION,
-                False,
-                pid
-            )
-
-            if not process_handle:
-                return False
-
-            self.hooked_processes[pid] = {
-                'handle': process_handle,
-                'text_addresses': set(),
-                'last_texts': set()
-            }
-
-            return True
+            source = Win32MemorySource(pid)
         except Exception as e:
             print(f"Failed to hook process {pid}: {e}")
             return False
 
-    def read_process_memory(self, pid, address, size):
-        """Read memory from a process"""
-        if pid not in self.hooked_processes:
-            return None
-
-        handle = self.hooked_processes[pid]['handle']
-        buffer = ctypes.create_string_buffer(size)
-        bytes_read = ctypes.c_size_t()
-
-        result = windll.kernel32.ReadProcessMemory(
-            handle,
-            ctypes.c_void_p(address),
-            buffer,
-            size,
-            ctypes.byref(bytes_read)
-        )
-
-        if result:
-            return buffer.raw[:bytes_read.value]
-        return None
-
-    def scan_memory_for_text(self, pid):
-        """Scan process memory for Japanese text"""
-        if pid not in self.hooked_processes:
-            return []
-
-        handle = self.hooked_processes[pid]['handle']
-        found_texts = []
-
-        # Get system info for memory scanning
-        system_info = ctypes.wintypes.SYSTEM_INFO()
-        windll.kernel32.GetSystemInfo(ctypes.byref(system_info))
-
-        min_address = system_info.lpMinimumApplicationAddress
-        max_address = system_info.lpMaximumApplicationAddress
-
-        current_address = min_address
-        memory_info = MEMORY_BASIC_INFORMATION()
-
-        while current_address < max_address:
-            # Query memory region
-            result = windll.kernel32.VirtualQueryEx(
-                handle,
-                ctypes.c_void_p(current_address),
-                ctypes.byref(memory_info),
-                ctypes.sizeof(memory_info)
-            )
-
-            if result == 0:
-                break
-
-            # Check if memory is readable
-            if (memory_info.State == win32con.MEM_COMMIT and
-                memory_info.Protect & win32con.PAGE_READWRITE):
-
-                # Read memory region
-                data = self.read_process_memory(pid, current_address, memory_info.RegionSize)
-
-                if data:
-                    # Search for text patterns
-                    texts = self.extract_japanese_text(data)
-                    for text in texts:
-                        if text not in self.hooked_processes[pid]['last_texts']:
-                            found_texts.append(text)
-                            self.hooked_processes[pid]['last_texts'].add(text)
-
-                            # Keep cache size manageable
-                            if len(self.hooked_processes[pid]['last_texts']) > 500:
-                                old_texts = list(self.hooked_processes[pid]['last_texts'])[:250]
-                                for old in old_texts:
-                                    self.hooked_processes[pid]['last_texts'].discard(old)
-
-            current_address += memory_info.RegionSize
-
-        return found_texts
-
-    def extract_japanese_text(self, data):
-        """Extract Japanese text from binary data"""
-        texts = []
-
-        # Try different encodings
-        encodings = ['shift_jis', 'utf-8', 'euc-jp', 'utf-16-le']
-
-        for encoding in encodings:
-            try:
-                decoded = data.decode(encoding, errors='ignore')
-
-                # Find sequences of Japanese characters
-                japanese_pattern = re.compile(
-                    r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\u3000-\u303F]{2,}'
-                )
-
-                matches = japanese_pattern.findall(decoded)
-
-                for match in matches:
-                    # Filter out noise
-                    if len(match) >= 2 and len(match) <= 500:
-                        # Check if it's meaningful text (not just repeated characters)
-                        if len(set(match)) > 1:
-                            texts.append(match)
-            except:
-                pass
-
-        return texts
+        self.attach_source(pid, source)
+        return True
 
     def hook_window_messages(self, hwnd):
         """Hook window messages to capture text"""
@@ -184,12 +47,12 @@ class AdvancedTextHooker:
                 # Text is being set to a window
                 try:
                     text = ctypes.string_at(lparam).decode('utf-8', errors='ignore')
-                    if self._is_japanese(text):
-                        self.captured_texts.append(('WM_SETTEXT', text))
+                    if is_japanese(text):
+                        self.captured_texts.put(('WM_SETTEXT', text, None))
                 except:
                     pass
 
-            return windll.user32.CallWindowProcW(
+            return ctypes.windll.user32.CallWindowProcW(
                 self.old_window_proc,
                 hwnd,
                 msg,
@@ -212,38 +75,6 @@ class AdvancedTextHooker:
         self.window_proc_hook = WNDPROC(window_proc)
         win32gui.SetWindowLong(hwnd, win32con.GWL_WNDPROC, self.window_proc_hook)
 
-    def _is_japanese(self, text):
-        """Check if text contains Japanese characters"""
-        if not text:
-            return False
-
-        for char in text:
-            code = ord(char)
-            if (0x3040 <= code <= 0x309F) or \
-               (0x30A0 <= code <= 0x30FF) or \
-               (0x4E00 <= code <= 0x9FAF) or \
-               (0x3000 <= code <= 0x303F):
-                return True
-        return False
-
-    def monitor_clipboard(self):
-        """Monitor clipboard for Japanese text"""
-        last_clipboard = ""
-
-        while self.running:
-            try:
-                win32clipboard.OpenClipboard()
-                if win32clipboard.IsClipboardFormatAvailable(win32con.CF_UNICODETEXT):
-                    data = win32clipboard.GetClipboardData(win32con.CF_UNICODETEXT)
-                    if data != last_clipboard and self._is_japanese(data):
-                        self.captured_texts.append(('Clipboard', data))
-                        last_clipboard = data
-                win32clipboard.CloseClipboard()
-            except:
-                pass
-
-            time.sleep(0.5)
-
 
 class AdvancedHookerGUI:
     def __init__(self):
@@ -252,7 +83,12 @@ class AdvancedHookerGUI:
         self.root.geometry("1000x700")
 
         self.hooker = AdvancedTextHooker()
-        self.monitor_threads = []
+        # Source of truth for the history pane and exports
+        self.history = HistoryStore()
+        # Crash-safe on-disk copy of every capture
+        self.journal = CaptureJournal()
+        # CaptureEngine of the running capture
+        self.engine = None
         self.selected_process = None
 
         self.setup_ui()
@@ -277,6 +113,11 @@ class AdvancedHookerGUI:
         notebook.add(history_tab, text="History")
         self.setup_history_tab(history_tab)
 
+        # Stats tab
+        stats_tab = ttk.Frame(notebook)
+        notebook.add(stats_tab, text="Stats")
+        self.setup_stats_tab(stats_tab)
+
         # Status bar
         self.status_label = ttk.Label(self.root, text="Ready", relief=tk.SUNKEN, anchor=tk.W)
         self.status_label.pack(fill=tk.X, side=tk.BOTTOM)
@@ -317,6 +158,7 @@ class AdvancedHookerGUI:
             font=("Yu Gothic UI", 11)
         )
         self.text_display.pack(fill=tk.BOTH, expand=True)
+        self.capture_pane = PaneRenderer(self.text_display)
 
         # Action buttons
         action_frame = ttk.Frame(text_frame)
@@ -337,6 +179,8 @@ class AdvancedHookerGUI:
         self.capture_methods = {
             'window_text': tk.BooleanVar(value=True),
             'memory_scan': tk.BooleanVar(value=False),
+            'incremental_scan': tk.BooleanVar(value=True),
+            'pin_addresses': tk.BooleanVar(value=True),
             'clipboard': tk.BooleanVar(value=True),
             'window_messages': tk.BooleanVar(value=False)
         }
@@ -345,11 +189,31 @@ class AdvancedHookerGUI:
                        variable=self.capture_methods['window_text']).pack(anchor=tk.W)
         ttk.Checkbutton(method_frame, text="Memory Scanning (Advanced)",
                        variable=self.capture_methods['memory_scan']).pack(anchor=tk.W)
+        ttk.Checkbutton(method_frame, text="Incremental Scan (skip unchanged pages)",
+                       variable=self.capture_methods['incremental_scan']).pack(anchor=tk.W, padx=(20, 0))
+        ttk.Checkbutton(method_frame, text="Pin Text Addresses (re-read where lines appeared)",
+                       variable=self.capture_methods['pin_addresses']).pack(anchor=tk.W, padx=(20, 0))
         ttk.Checkbutton(method_frame, text="Clipboard Monitoring",
                        variable=self.capture_methods['clipboard']).pack(anchor=tk.W)
         ttk.Checkbutton(method_frame, text="Window Messages (WM_SETTEXT)",
                        variable=self.capture_methods['window_messages']).pack(anchor=tk.W)
 
+        # Memory scan settings
+        scan_frame = ttk.LabelFrame(parent, text="Memory Scan", padding="10")
+        scan_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(scan_frame, text="Scan Workers (processes):").grid(row=0, column=0, sticky=tk.W)
+        self.scan_workers = tk.IntVar(value=1)
+        ttk.Spinbox(scan_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.scan_workers,
+                   width=10).grid(row=0, column=1)
+
+        # Known script: only its lines are captured, tagged with their line IDs
+        ttk.Label(scan_frame, text="Known Script:").grid(row=1, column=0, sticky=tk.W)
+        self.script_label = ttk.Label(scan_frame, text="None (capture any Japanese text)")
+        self.script_label.grid(row=1, column=1, sticky=tk.W)
+        ttk.Button(scan_frame, text="Load...", command=self.load_script).grid(row=1, column=2, padx=2)
+        ttk.Button(scan_frame, text="Clear", command=self.clear_script).grid(row=1, column=3, padx=2)
+
         # Filter settings
         filter_frame = ttk.LabelFrame(parent, text="Text Filters", padding="10")
         filter_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -367,6 +231,29 @@ class AdvancedHookerGUI:
         ttk.Checkbutton(filter_frame, text="Filter Duplicates",
                        variable=self.filter_duplicates).grid(row=2, column=0, columnspan=2, sticky=tk.W)
 
+    def load_script(self):
+        """Load a known script; memory scans then only report its lines"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Text files", "*.txt *.tsv"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+
+        from script_index import ScriptIndex
+        try:
+            script = ScriptIndex.from_file(filename)
+        except Exception as e:
+            messagebox.showerror("Script Error", f"Failed to load script: {e}")
+            return
+
+        self.hooker.set_script(script)
+        self.script_label.config(text=f"{os.path.basename(filename)} ({len(script)} lines)")
+        self.update_status(f"Loaded {len(script)} script lines")
+
+    def clear_script(self):
+        self.hooker.set_script(None)
+        self.script_label.config(text="None (capture any Japanese text)")
+
     def setup_history_tab(self, parent):
         # History list
         history_frame = ttk.Frame(parent, padding="10")
@@ -380,6 +267,7 @@ class AdvancedHookerGUI:
             font=("Yu Gothic UI", 10)
         )
         self.history_list.pack(fill=tk.BOTH, expand=True)
+        self.history_pane = PaneRenderer(self.history_list, max_lines=5000, keep_log=False)
 
         # History controls
         control_frame = ttk.Frame(history_frame)
@@ -388,6 +276,61 @@ class AdvancedHookerGUI:
         ttk.Button(control_frame, text="Export History", command=self.export_history).pack(side=tk.LEFT, padx=2)
         ttk.Button(control_frame, text="Clear History", command=self.clear_history).pack(side=tk.LEFT, padx=2)
 
+    def setup_stats_tab(self, parent):
+        stats_frame = ttk.Frame(parent, padding="10")
+        stats_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.stats_text = scrolledtext.ScrolledText(
+            stats_frame,
+            wrap=tk.NONE,
+            width=80,
+            height=25,
+            font=("Consolas", 9)
+        )
+        self.stats_text.pack(fill=tk.BOTH, expand=True)
+
+        control_frame = ttk.Frame(stats_frame)
+        control_frame.pack(fill=tk.X, pady=(5, 0))
+
+        ttk.Button(control_frame, text="Export JSON",
+                  command=lambda: self.export_stats('.json')).pack(side=tk.LEFT, padx=2)
+        ttk.Button(control_frame, text="Export Prometheus",
+                  command=lambda: self.export_stats('.prom')).pack(side=tk.LEFT, padx=2)
+        ttk.Button(control_frame, text="Reset", command=self.reset_stats).pack(side=tk.LEFT, padx=2)
+
+        self.root.after(1000, self.update_stats)
+
+    def update_stats(self):
+        """Refresh the stats panel once a second"""
+        report = registry.report() or "No measurements yet"
+        if self.stats_text.get('1.0', 'end-1c') != report:
+            position = self.stats_text.yview()[0]
+            self.stats_text.delete('1.0', tk.END)
+            self.stats_text.insert('1.0', report)
+            self.stats_text.yview_moveto(position)
+        self.root.after(1000, self.update_stats)
+
+    def export_stats(self, extension):
+        """Export the timers and counters as JSON or Prometheus text"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=extension,
+            filetypes=[("JSON files", "*.json"), ("Prometheus text", "*.prom"), ("All files", "*.*")],
+            initialfile=f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+        )
+
+        if filename:
+            try:
+                registry.write(filename)
+            except Exception as e:
+                messagebox.showerror("Export Error", f"Failed to export stats: {e}")
+                return
+
+            self.update_status(f"Stats exported to {filename}")
+
+    def reset_stats(self):
+        registry.reset()
+        self.update_status("Stats reset")
+
     def refresh_processes(self):
         """Refresh the list of processes"""
         self.process_tree.delete(*self.process_tree.get_children())
@@ -440,63 +383,68 @@ class AdvancedHookerGUI:
             messagebox.showwarning("No Process", "Please hook a process first")
             return
 
-        self.hooker.running = True
+        if self.engine and self.engine.running:
+            messagebox.showinfo("Already Running", "Capture is already running")
+            return
+
+        # The GUI applies its own length filters so spinbox changes take effect live
+        self.engine = CaptureEngine()
 
         # Start memory scanning if enabled
         if self.capture_methods['memory_scan'].get():
-            thread = threading.Thread(target=self.memory_scan_loop, daemon=True)
-            thread.start()
-            self.monitor_threads.append(thread)
+            self.hooker.set_scan_workers(self.scan_workers.get())
+            self.engine.add_source(MemoryScanSource(
+                self.selected_process, scanner=self.hooker,
+                incremental=self.capture_methods['incremental_scan'].get(),
+                pin_interval=0.02 if self.capture_methods['pin_addresses'].get() else None,
+                on_scan=lambda stats: self.root.after(0, self.update_status, stats.report())))
 
         # Start clipboard monitoring if enabled
         if self.capture_methods['clipboard'].get():
-            thread = threading.Thread(target=self.hooker.monitor_clipboard, daemon=True)
-            thread.start()
-            self.monitor_threads.append(thread)
+            self.engine.add_source(ClipboardSource())
+
+        self.engine.add_sink(CallbackSink(
+            lambda record: self.hooker.captured_texts.put((record.source, record.text,
+                                                           record.line_id))))
+        self.engine.add_sink(JournalSink(self.journal))
+        self.hooker.running = True
+        self.engine.start()
 
         # Start text update loop
         self.root.after(100, self.update_captured_text)
 
         self.update_status("Capture started")
 
-    def memory_scan_loop(self):
-        """Continuously scan memory for text"""
-        while self.hooker.running:
-            if self.selected_process:
-                texts = self.hooker.scan_memory_for_text(self.selected_process)
-                for text in texts:
-                    self.hooker.captured_texts.append(('Memory', text))
-            time.sleep(0.5)
-
     def update_captured_text(self):
         """Update the display with captured text"""
-        if not self.hooker.running:
+        if not self.engine.running and not len(self.hooker.captured_texts):
             return
 
-        while self.hooker.captured_texts:
-            source, text = self.hooker.captured_texts.pop(0)
-
+        # A bounded batch per tick keeps the Tk loop responsive during bursts
+        batch = self.hooker.captured_texts.drain(200)
+        for source, text, line_id in batch:
             # Apply filters
             if len(text) < self.min_length.get() or len(text) > self.max_length.get():
                 continue
 
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            formatted = f"[{timestamp}][{source}] {text}\n"
+            index = self.history.append(text, source, self.selected_process, line_id=line_id)
+            formatted = self.history.format(index)
 
-            self.text_display.insert(tk.END, formatted)
-            self.history_list.insert(tk.END, formatted)
+            # Rendered in one insert per frame
+            self.capture_pane.append(formatted)
+            self.history_pane.append(formatted)
 
-            if self.autoscroll:
-                self.text_display.see(tk.END)
-                self.history_list.see(tk.END)
-
-        # Continue updating
-        self.root.after(100, self.update_captured_text)
+        # Continue updating; right away if the queue still holds a backlog
+        self.root.after(10 if len(self.hooker.captured_texts) else 100,
+                        self.update_captured_text)
 
     def stop_capture(self):
         """Stop capturing text"""
         self.hooker.running = False
-        self.update_status("Capture stopped")
+        if self.engine:
+            # Scans in progress finish in the background
+            self.engine.stop(wait=False)
+            self.update_status(f"Capture stopped ({self.engine.report()})")
 
     def copy_text(self):
         """Copy selected text"""
@@ -506,7 +454,7 @@ class AdvancedHookerGUI:
             self.root.clipboard_append(selected)
             self.update_status("Text copied")
         except:
-            all_text = self.text_display.get(1.0, tk.END)
+            all_text = self.capture_pane.text()
             self.root.clipboard_clear()
             self.root.clipboard_append(all_text)
             self.update_status("All text copied")
@@ -521,49 +469,44 @@ class AdvancedHookerGUI:
 
         if filename:
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.text_display.get(1.0, tk.END))
+                f.write(self.capture_pane.text())
             self.update_status(f"Saved to {filename}")
 
     def clear_text(self):
         """Clear the text display"""
-        self.text_display.delete(1.0, tk.END)
+        self.capture_pane.clear()
 
     def toggle_autoscroll(self):
         """Toggle auto-scrolling"""
         self.autoscroll = not self.autoscroll
+        self.capture_pane.autoscroll = self.autoscroll
+        self.history_pane.autoscroll = self.autoscroll
         self.update_status(f"Auto-scroll: {'ON' if self.autoscroll else 'OFF'}")
 
     def export_history(self):
-        """Export history to JSON"""
+        """Export history to JSON, NDJSON or CSV"""
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json"), ("NDJSON files", "*.ndjson"),
+                       ("CSV files", "*.csv"), ("All files", "*.*")],
             initialfile=f"history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         )
 
         if filename:
-            history_text = self.history_list.get(1.0, tk.END)
-            lines = history_text.strip().split('\n')
-
-            history_data = []
-            for line in lines:
-                if line:
-                    match = re.match(r'\[(\d{2}:\d{2}:\d{2})\]\[([^\]]+)\] (.+)', line)
-                    if match:
-                        history_data.append({
-                            'timestamp': match.group(1),
-                            'source': match.group(2),
-                            'text': match.group(3)
-                        })
-
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=2)
+            # Unknown extensions fall back to JSON
+            extension = os.path.splitext(filename)[1].lstrip('.').lower()
+            try:
+                self.history.export(filename, extension if extension in ('ndjson', 'csv') else 'json')
+            except Exception as e:
+                messagebox.showerror("Export Error", f"Failed to export history: {e}")
+                return
 
-            self.update_status(f"History exported to {filename}")
+            self.update_status(f"History exported to {filename} ({len(self.history)} records)")
 
     def clear_history(self):
         """Clear history"""
-        self.history_list.delete(1.0, tk.END)
+        self.history.clear()
+        self.history_pane.clear()
         self.update_status("History cleared")
 
     def update_status(self, message):
@@ -573,8 +516,14 @@ class AdvancedHookerGUI:
     def run(self):
         """Run the GUI"""
         self.root.mainloop()
+        if self.engine:
+            self.engine.stop()
+        self.hooker.close()
+        self.journal.close()
 
 
 if __name__ == "__main__":
+    # Scan worker processes re-launch this executable in PyInstaller builds
+    multiprocessing.freeze_support()
     app = AdvancedHookerGUI()
     app.run()
\ No newline at end of file
@@ -0,0 +1,1549 @@
+"""Benchmarks for the text hooker engines
+
+Runs on any platform; nothing here needs a hooked Windows process.
+
+    python benchmarks.py scanner --size-mb 256
+    python benchmarks.py incremental --size-mb 256
+    python benchmarks.py pipeline --source linux --pid 1234
+    python benchmarks.py parallel --size-mb 256
+    python benchmarks.py buffers --size-mb 256
+    python benchmarks.py regions --passes 16
+    python benchmarks.py pins --lines 50
+    python benchmarks.py script --size-mb 64 --script-lines 20000
+    python benchmarks.py translation --latency 0.3 --lines 40
+    python benchmarks.py batching --bursts 5 --lines 30
+    python benchmarks.py pretranslate --script-lines 5000 --latency 0.3
+    python benchmarks.py client --lines 60 --server-rate 5
+    python benchmarks.py backends --lines 500
+    python benchmarks.py typewriter --lines 20 --char-ms 40
+    python benchmarks.py capture --seconds 10
+    python benchmarks.py queue --lines 10000 50000
+    python benchmarks.py render --lines 100000      (needs a display)
+    python benchmarks.py journal --lines 20000
+    python benchmarks.py classifier
+    python benchmarks.py imports --baseline HEAD~1
+    python benchmarks.py startup --app overlay      (needs a display)
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from capture_engine import CallbackSink, CaptureEngine, CaptureSource
+from capture_journal import CaptureJournal, read_journal
+from capture_queue import CaptureQueue
+from capture_trigger import PollingTrigger, SyntheticTrigger, run_capture_loop
+from japanese_classifier import CORE_BLOCKS, DEFAULT_BLOCKS, JapaneseClassifier
+from memory_scanner import MemoryScanner, PageFingerprints, ScanStats, extract_region_text
+from memory_source import (
+    MEM_IMAGE, MEM_PRIVATE, PAGE_EXECUTE_READ, PAGE_GUARD, PAGE_READWRITE, PAGE_WRITECOMBINE,
+    PAGE_WRITECOPY, FakeMemorySource, LinuxMemorySource,
+)
+from pretranslate import Pretranslator, corpus_texts
+from region_policy import RegionPolicy
+from script_index import ScriptIndex
+from text_pane import PaneRenderer
+from text_scanner import JapaneseTextScanner
+from translation_batch import build_batch_prompt, parse_batch_response
+from translation_cache import TranslationCache
+from translation_client import TokenBucket
+from translation_index import TranslationIndex
+from translation_worker import TranslationWorker
+from translators import GeminiTranslator, GlossaryTranslator, LocalHttpTranslator
+
+
+SAMPLE_LINES = [
+    "「おはようございます、先輩」",
+    "今日はいい天気ですね。",
+    "この先に何があるのか、誰も知らない。",
+    "ちょっと待って！まだ話は終わってないよ",
+    "セーブしますか？",
+    "第三章　約束の場所",
+]
+
+
+def legacy_extract_japanese_text(data):
+    """Original extract_japanese_text: full decode per encoding"""
+    texts = []
+
+    encodings = ['shift_jis', 'utf-8', 'euc-jp', 'utf-16-le']
+
+    for encoding in encodings:
+        try:
+            decoded = data.decode(encoding, errors='ignore')
+
+            japanese_pattern = re.compile(
+                r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\u3000-\u303F]{2,}'
+            )
+
+            matches = japanese_pattern.findall(decoded)
+
+            for match in matches:
+                if len(match) >= 2 and len(match) <= 500:
+                    if len(set(match)) > 1:
+                        texts.append(match)
+        except:
+            pass
+
+    return texts
+
+
+def make_synthetic_memory(size_mb, noise=0.05, seed=0):
+    """Build a buffer that looks like a game heap: zeros, pointers, strings, noise and text
+
+    noise is the fraction of blocks filled with uniformly random bytes
+    (compressed assets, hashes), the worst case for the byte scanner.
+    """
+    rng = random.Random(seed)
+    encodings = ['shift_jis', 'utf-8', 'euc-jp', 'utf-16-le']
+    ascii_words = [b'texture', b'sound/bgm01.ogg', b'flag_route_a', b'Data/script.dat', b'%s']
+
+    # Build one 1 MB chunk and repeat it; keeps generation fast for big sizes
+    chunk = bytearray()
+    while len(chunk) < 1024 * 1024:
+        kind = rng.random()
+        if kind < noise:
+            chunk += bytes(rng.getrandbits(8) for _ in range(rng.randrange(16, 256)))
+        elif kind < 0.03 + noise:
+            line = rng.choice(SAMPLE_LINES)
+            chunk += line.encode(rng.choice(encodings)) + b'\x00\x00'
+        elif kind < 0.10 + noise:
+            chunk += rng.choice(ascii_words) + b'\x00'
+        elif kind < 0.40 + noise:
+            for _ in range(rng.randrange(4, 64)):
+                chunk += (0x7FF600000000 + rng.getrandbits(32)).to_bytes(8, 'little')
+        else:
+            chunk += bytes(rng.randrange(16, 512))
+
+    chunk = bytes(chunk[:1024 * 1024])
+    return chunk * size_mb
+
+
+def bench_scanner(args):
+    """Compare the byte scanner against the legacy full-decode extractor"""
+    print(f"Building {args.size_mb} MB synthetic buffer ({args.noise:.0%} random noise)...")
+    data = make_synthetic_memory(args.size_mb, args.noise)
+    scanner = JapaneseTextScanner(blocks=DEFAULT_BLOCKS if args.extra_blocks else CORE_BLOCKS)
+
+    start = time.perf_counter()
+    new_texts = scanner.extract(data)
+    new_time = time.perf_counter() - start
+
+    print(f"byte scanner : {new_time:8.3f} s  {args.size_mb / new_time:9.1f} MB/s  "
+          f"{len(new_texts)} texts")
+
+    # One region of random bytes bigger than a window: no zero gap ends its
+    # spans, so every span crosses a window's ownership edge
+    dense = random.Random(1).randbytes(args.dense_kb * 1024)
+    start = time.perf_counter()
+    dense_texts = scanner.extract(dense)
+    dense_time = time.perf_counter() - start
+    print(f"dense noise  : {dense_time:8.3f} s  {args.dense_kb / 1024 / dense_time:9.1f} MB/s  "
+          f"{len(dense_texts)} texts in {args.dense_kb} KB of random bytes")
+
+    if args.skip_legacy:
+        return
+
+    start = time.perf_counter()
+    old_texts = legacy_extract_japanese_text(data)
+    old_time = time.perf_counter() - start
+
+    print(f"legacy decode: {old_time:8.3f} s  {args.size_mb / old_time:9.1f} MB/s  "
+          f"{len(old_texts)} texts")
+    print(f"speedup      : {old_time / new_time:8.1f}x")
+
+    # Every sample-line run the legacy decoder finds must also be found here
+    legacy_hits = {text for text in old_texts
+                   if any(text in line for line in SAMPLE_LINES)}
+    missing = legacy_hits - set(new_texts)
+    print(f"sample lines missed by byte scanner: {len(missing)}")
+
+
+def write_dialogue_line(region, rng):
+    """Overwrite a random spot of a region with a new line, like a game text buffer"""
+    line = rng.choice(SAMPLE_LINES).encode('utf-16-le')
+    offset = rng.randrange(0, len(region) - len(line)) & ~1
+    region[offset:offset + len(line)] = line
+
+
+def bench_incremental(args):
+    """Steady-state cost of full re-parsing versus page-fingerprint scanning"""
+    rng = random.Random(1)
+    data = make_synthetic_memory(args.size_mb, args.noise)
+    region_size = args.region_kb * 1024
+    regions = [bytearray(data[offset:offset + region_size])
+               for offset in range(0, len(data), region_size)]
+    scanner = JapaneseTextScanner()
+    fingerprints = PageFingerprints()
+
+    print(f"{args.size_mb} MB in {len(regions)} regions, "
+          f"{args.changes} dialogue writes between passes")
+
+    def scan(fingerprints):
+        stats = ScanStats()
+        for base, region in enumerate(regions):
+            texts = extract_region_text(scanner.extract, base * region_size, bytes(region),
+                                        fingerprints, stats)
+            stats.texts_found += len(texts)
+        return stats.finish()
+
+    # The first pass parses everything and fills the fingerprint tables
+    print("first pass  :", scan(fingerprints).report())
+
+    full_times = []
+    incremental_times = []
+    for _ in range(args.passes):
+        for _ in range(args.changes):
+            write_dialogue_line(rng.choice(regions), rng)
+
+        stats = scan(fingerprints)
+        incremental_times.append(stats.elapsed)
+        full_times.append(scan(None).elapsed)
+
+    print("incremental :", stats.report())
+    full = sum(full_times) / len(full_times)
+    incremental = sum(incremental_times) / len(incremental_times)
+    print(f"full re-parse: {full * 1000:8.0f} ms/pass")
+    print(f"incremental  : {incremental * 1000:8.0f} ms/pass  ({full / incremental:.1f}x faster)")
+
+
+def make_memory_source(args):
+    """Build the memory source selected on the command line"""
+    if args.source == 'linux':
+        return LinuxMemorySource(args.pid or os.getpid())
+    if args.source == 'file':
+        return FakeMemorySource.from_file(args.file, args.region_kb * 1024)
+
+    # bytearray regions, so reads copy like they do from a live process
+    data = make_synthetic_memory(args.size_mb, args.noise)
+    region_size = args.region_kb * 1024
+    return FakeMemorySource({0x10000 + offset: bytearray(data[offset:offset + region_size])
+                             for offset in range(0, len(data), region_size)})
+
+
+def bench_pipeline(args):
+    """Throughput of scan_memory_for_text over any memory source"""
+    pid = args.pid or 0
+    scanner = MemoryScanner(cold_interval=args.cold_interval)
+    scanner.attach_source(pid, make_memory_source(args))
+
+    for scan in range(args.passes):
+        scanner.scan_memory_for_text(pid, incremental=args.incremental)
+        stats = scanner.hooked_processes[pid]['scan_stats']
+        throughput = stats.bytes_read / (1024 * 1024) / stats.elapsed if stats.elapsed else 0.0
+        print(f"pass {scan + 1}: {stats.report()}  {throughput:.1f} MB/s")
+
+    scanner.detach_source(pid)
+
+
+def bench_parallel(args):
+    """Full-scan time as the process pool grows"""
+    worker_counts = args.workers or sorted({1, 2, 4, 8, 16, os.cpu_count() or 1})
+    source = make_memory_source(args)
+    print(f"{os.cpu_count()} CPUs, {args.size_mb} MB synthetic heap")
+
+    baseline = None
+    for workers in worker_counts:
+        scanner = MemoryScanner(workers, cold_interval=1)
+        scanner.attach_source(0, source)
+
+        # The first pass also pays for starting the pool
+        scanner.scan_memory_for_text(0, incremental=False)
+        scanner.hooked_processes[0]['last_texts'].clear()
+        scanner.scan_memory_for_text(0, incremental=False)
+        stats = scanner.hooked_processes[0]['scan_stats']
+        scanner.set_scan_workers(1)
+
+        baseline = baseline or stats.elapsed
+        print(f"{workers:3d} workers: {stats.elapsed * 1000:8.0f} ms  "
+              f"{args.size_mb / stats.elapsed:8.1f} MB/s  {baseline / stats.elapsed:5.2f}x")
+
+
+def buffers_child(args):
+    """Measure one read mode in a fresh process so peak RSS is not shared"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    def peak_rss_kb():
+        if resource is None:
+            # Windows: the peak working set
+            import psutil
+            return psutil.Process().memory_info().peak_wset // 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    scanner = MemoryScanner(cold_interval=1)
+    if args.child == 'bytes':
+        scanner.buffer_pool = None
+    scanner.attach_source(0, make_memory_source(args))
+
+    def scan():
+        scanner.scan_memory_for_text(0)
+        return scanner.hooked_processes[0]['scan_stats']
+
+    # Steady state of a capture session: the warm-up pass parses everything
+    # and fills the pool, later passes mostly read and fingerprint
+    scan()
+    rss_before = peak_rss_kb()
+    stats = scan()
+    rss_after = peak_rss_kb()
+
+    tracemalloc.start()
+    scan()
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    pool = scanner.buffer_pool
+    print(json.dumps({
+        'elapsed': stats.elapsed,
+        'regions': stats.regions,
+        'rss_growth_kb': rss_after - rss_before,
+        'peak_rss_kb': rss_after,
+        'traced_peak': traced_peak,
+        # A read() allocates at least one bytes object per region; the pool
+        # allocates nothing once warm
+        'region_allocations': stats.regions if pool is None else 0,
+        'pool_bytes': pool.arena_bytes() if pool else 0,
+    }))
+
+
+def bench_buffers(args):
+    """Peak memory and allocations per steady-state scan: bytes reads vs pooled arenas"""
+    if args.child:
+        buffers_child(args)
+        return
+
+    results = {}
+    for mode in ('bytes', 'pool'):
+        command = [sys.executable, os.path.abspath(__file__), 'buffers', '--child', mode,
+                   '--source', args.source, '--size-mb', str(args.size_mb),
+                   '--noise', str(args.noise), '--region-kb', str(args.region_kb)]
+        if args.pid:
+            command += ['--pid', str(args.pid)]
+        if args.file:
+            command += ['--file', args.file]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'':24}{'bytes reads':>14}{'pooled arenas':>16}")
+    rows = [
+        ('scan time (ms)', lambda r: f"{r['elapsed'] * 1000:.0f}"),
+        ('peak RSS (MB)', lambda r: f"{r['peak_rss_kb'] / 1024:.1f}"),
+        ('RSS growth/scan (MB)', lambda r: f"{r['rss_growth_kb'] / 1024:.1f}"),
+        ('traced peak/scan (MB)', lambda r: f"{r['traced_peak'] / (1024 * 1024):.1f}"),
+        ('region allocs/scan', lambda r: f"{r['region_allocations']}"),
+        ('pool size (MB)', lambda r: f"{r['pool_bytes'] / (1024 * 1024):.1f}"),
+    ]
+    for label, value in rows:
+        print(f"{label:24}{value(results['bytes']):>14}{value(results['pool']):>16}")
+
+
+class LegacyRegionPolicy:
+    """The original filter: every committed region with the PAGE_READWRITE bit set"""
+
+    def select(self, regions, skipped=None):
+        return (region for region in regions if region.protect & PAGE_READWRITE)
+
+
+def make_process_layout(args):
+    """Synthetic process: a few dialogue heaps among textless heaps, thread
+    stacks behind guard pages, write-combined GPU staging buffers, module
+    code and copy-on-write module data holding the script
+    """
+    rng = random.Random(1)
+    mb = 1024 * 1024
+    text_chunk = make_synthetic_memory(1, noise=0.0)
+
+    # Counters and zeros: busy memory without text.  (ASCII would not do:
+    # most pairs of lowercase letters read as kanji in UTF-16.)
+    heap_chunk = bytearray()
+    while len(heap_chunk) < mb:
+        heap_chunk += b''.join(rng.randrange(1000).to_bytes(4, 'little')
+                               for _ in range(rng.randrange(4, 64)))
+        heap_chunk += bytes(rng.randrange(16, 512))
+    heap_chunk = bytes(heap_chunk[:mb])
+
+    regions = {}
+    attributes = {}
+    address = 0x10000
+
+    def add(data, protect=PAGE_READWRITE, region_type=MEM_PRIVATE):
+        nonlocal address
+        regions[address] = bytearray(data)
+        attributes[address] = (protect, region_type)
+        address += len(data)
+
+    text_bases = []
+    for index in range(args.heap_mb):
+        if index % max(1, args.heap_mb // args.text_regions) == 0 and len(text_bases) < args.text_regions:
+            text_bases.append(address)
+            add(text_chunk)
+        else:
+            add(heap_chunk)
+    for _ in range(args.threads):
+        add(bytes(4096), PAGE_READWRITE | PAGE_GUARD)
+        add(heap_chunk)
+    for _ in range(args.gpu_buffers):
+        add(bytes(16 * mb), PAGE_READWRITE | PAGE_WRITECOMBINE)
+    add(heap_chunk * 4, PAGE_EXECUTE_READ, MEM_IMAGE)
+    script_base = address
+    add(text_chunk * 2, PAGE_WRITECOPY, MEM_IMAGE)
+
+    return FakeMemorySource(regions, attributes=attributes), text_bases, script_base
+
+
+def bench_regions(args):
+    """Region policy and hot/cold scheduling vs scanning every PAGE_READWRITE region"""
+    source, text_bases, script_base = make_process_layout(args)
+    total = sum(len(data) for data in source.memory.values())
+    print(f"{len(source.memory)} regions, {total / (1024 * 1024):.0f} MB; "
+          f"{len(text_bases)} dialogue heaps, script in a PAGE_WRITECOPY image section")
+
+    modes = [
+        ('every RW region', LegacyRegionPolicy(), 1),
+        ('policy', RegionPolicy(), 1),
+        ('policy + hot/cold', RegionPolicy(), args.cold_interval),
+    ]
+    rng = random.Random(2)
+    for label, policy, cold_interval in modes:
+        scanner = MemoryScanner(region_policy=policy, cold_interval=cold_interval)
+        scanner.attach_source(0, source)
+        elapsed = []
+        bytes_read = []
+        texts = 0
+        missed = 0
+
+        for scan in range(args.passes):
+            # A new dialogue line lands in one of the dialogue heaps
+            # tagged with the pass number in katakana so the scan can be checked for it
+            tag = ''.join('アイウエオカキクケコ'[int(digit)] for digit in f"{scan:04d}")
+            line = f"{rng.choice(SAMPLE_LINES)}{tag}".encode('utf-16-le') + b'\x00\x00'
+            region = source.memory[rng.choice(text_bases)]
+            offset = rng.randrange(0, len(region) - len(line), 2)
+            region[offset:offset + len(line)] = line
+
+            found = scanner.scan_memory_for_text(0)
+            stats = scanner.hooked_processes[0]['scan_stats']
+            texts += len(found)
+            if scan and not any(text.endswith(tag) for text in found):
+                missed += 1
+            # The first pass reads everything whatever the mode; report the steady state
+            if scan:
+                elapsed.append(stats.elapsed)
+                bytes_read.append(stats.bytes_read)
+
+        script_seen = script_base in scanner.hooked_processes[0]['region_schedule'].hits
+        scanner.detach_source(0)
+        mean = sum(elapsed) / len(elapsed)
+        print(f"{label:18}: {mean * 1000:7.1f} ms/pass, "
+              f"{sum(bytes_read) / len(bytes_read) / (1024 * 1024):7.1f} MB read/pass, "
+              f"{texts} texts, new lines missed {missed}/{args.passes - 1}, "
+              f"script section {'found' if script_seen else 'not read'}")
+        # detach_source closes the source; reopen the same regions for the next mode
+        source = FakeMemorySource(source.memory, attributes=source.attributes)
+
+
+def bench_pins(args):
+    """Pinned-address polls vs full incremental scans for lines rewritten in one buffer"""
+    source, text_bases, _ = make_process_layout(args)
+    rng = random.Random(3)
+    # The game's dialogue buffer: every line is written to the same address
+    buffer = source.memory[text_bases[0]]
+    address = rng.randrange(0, len(buffer) // 2, 2)
+
+    def write_line(number):
+        tag = ''.join('アイウエオカキクケコ'[int(digit)] for digit in f"{number:04d}")
+        line = f"{rng.choice(SAMPLE_LINES)}{tag}".encode('utf-16-le') + b'\x00\x00'
+        buffer[address:address + len(line)] = line
+        return tag
+
+    for label, pinned in (('full scan', False), ('pinned', True)):
+        scanner = MemoryScanner(max_pins=32 if pinned else 0)
+        scanner.attach_source(0, FakeMemorySource(source.memory, attributes=source.attributes))
+        # Discovery: a first pass, then one line so its address gets pinned
+        scanner.scan_memory_for_text(0)
+        write_line(0)
+        scanner.scan_memory_for_text(0)
+
+        elapsed = []
+        bytes_read = []
+        missed = 0
+        for number in range(1, args.lines + 1):
+            tag = write_line(number)
+            if pinned:
+                found = scanner.poll_pinned_text(0)
+                stats = scanner.hooked_processes[0]['poll_stats']
+            else:
+                found = scanner.scan_memory_for_text(0)
+                stats = scanner.hooked_processes[0]['scan_stats']
+            elapsed.append(stats.elapsed)
+            bytes_read.append(stats.bytes_read)
+            if not any(text.endswith(tag) for text in found):
+                missed += 1
+
+        pins = len(scanner.hooked_processes[0]['text_addresses'])
+        scanner.close()
+        print(f"{label:9}: {sum(elapsed) / len(elapsed) * 1000:8.3f} ms/line, "
+              f"{sum(bytes_read) / len(bytes_read) / 1024:9.1f} KB read/line, "
+              f"missed {missed}/{args.lines}, {pins} pinned addresses")
+
+
+def make_script(count, seed=0):
+    """A script of count distinct lines, the sample lines among them"""
+    rng = random.Random(seed)
+    kana = [chr(code) for code in range(0x3042, 0x3094)]
+    kanji = [chr(code) for code in range(0x4E00, 0x4F00)]
+    lines = list(SAMPLE_LINES)
+    seen = set(lines)
+    while len(lines) < count:
+        line = ''.join(rng.choice(kanji if rng.random() < 0.3 else kana)
+                       for _ in range(rng.randrange(4, 40))) + '。'
+        if line not in seen:
+            seen.add(line)
+            lines.append(line)
+    rng.shuffle(lines)
+    return list(enumerate(lines, 1))
+
+
+def bench_script(args):
+    """Known-script matching vs generic extraction on a synthetic heap"""
+    data = make_synthetic_memory(args.size_mb)
+    started = time.perf_counter()
+    script = ScriptIndex(make_script(args.script_lines))
+    print(f"{args.size_mb} MB; script of {len(script)} lines indexed in "
+          f"{time.perf_counter() - started:.2f} s")
+
+    scanner = JapaneseTextScanner()
+    for label, extract in (('generic extractor', scanner.extract), ('known script', script.extract)):
+        started = time.perf_counter()
+        texts = extract(data)
+        elapsed = time.perf_counter() - started
+        script_texts = sum(1 for text in texts if script.line_id(text) is not None)
+        print(f"{label:18}: {elapsed:6.2f} s ({args.size_mb / elapsed:7.1f} MB/s), "
+              f"{len(texts)} texts, {script_texts} script lines, "
+              f"{len(texts) - script_texts} noise, {len(set(texts))} distinct")
+
+    # Script lines stored right next to other Japanese text: a name tag
+    # before, the next line after
+    rng = random.Random(2)
+    lines = [text for _, text in make_script(args.script_lines)]
+    embedded = bytearray()
+    placed = []
+    for _ in range(args.embedded):
+        text, after = rng.choice(lines), rng.choice(lines)
+        placed += [text, after]
+        tag = rng.choice(("【先輩】", "「", "ナレーション："))
+        # The script's random kanji are not all in Shift-JIS or EUC-JP
+        encoded = (tag + text + after).encode(rng.choice(('utf-8', 'utf-16-le')))
+        # Padded to keep the UTF-16 entries aligned
+        embedded += encoded + bytes(2 * rng.randrange(4, 32) + len(encoded) % 2)
+    # What matching whole runs only, as the index used to, finds
+    whole_runs = ScriptIndex(make_script(args.script_lines))
+    whole_runs.find_lines = lambda run: [run] if run in whole_runs.ids else []
+    for label, index in (('embedded, runs', whole_runs), ('embedded, lines', script)):
+        started = time.perf_counter()
+        found = index.extract(bytes(embedded))
+        elapsed = time.perf_counter() - started
+        print(f"{label:18}: {len(found)}/{len(placed)} script lines found in {elapsed * 1000:.1f} ms")
+
+    # Whole scan passes: everything extracted also goes through deduplication
+    # and address pinning, and whatever is new goes on to the capture engine
+    region_size = 1024 * 1024
+    regions = {0x10000 + index * region_size: bytearray(data[index * region_size:(index + 1) * region_size])
+               for index in range(args.size_mb)}
+    rng = random.Random(1)
+    for label, known in (('scan, generic', None), ('scan, script', script)):
+        memory_scanner = MemoryScanner()
+        memory_scanner.set_script(known)
+        memory_scanner.attach_source(0, FakeMemorySource(regions))
+        elapsed = []
+        emitted = 0
+        for _ in range(args.passes):
+            # A changed page in every region
+            for region in regions.values():
+                write_dialogue_line(region, rng)
+            found = memory_scanner.scan_memory_for_text(0)
+            elapsed.append(memory_scanner.hooked_processes[0]['scan_stats'].elapsed)
+            emitted += len(found)
+        memory_scanner.close()
+        print(f"{label:18}: first pass {elapsed[0]:6.2f} s, later passes "
+              f"{sum(elapsed[1:]) / max(1, len(elapsed) - 1) * 1000:7.1f} ms, {emitted} texts emitted")
+
+
+class StubTranslator:
+    """Offline stand-in for GeminiTranslator with an injectable per-call latency"""
+
+    model_name = 'stub'
+
+    def __init__(self, latency=0.0, batch_failure_rate=0.0, seed=0):
+        self.latency = latency
+        # Share of batch replies that come back malformed
+        self.batch_failure_rate = batch_failure_rate
+        self.random = random.Random(seed)
+        self.initialized = True
+        self.last_error = None
+        self.calls = 0
+        self.batch_calls = 0
+
+    def translate(self, text, target_language="English"):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"[{target_language}] {text}"
+
+    def translate_batch(self, texts, target_language="English"):
+        self.calls += 1
+        self.batch_calls += 1
+        # Built only so the stub pays the same prompt cost as the real client
+        build_batch_prompt(texts, target_language)
+        time.sleep(self.latency)
+
+        if self.random.random() < self.batch_failure_rate:
+            response = "Here are the translations:\n1. ..."
+        else:
+            response = "```json\n" + json.dumps(
+                [f"[{target_language}] {text}" for text in texts], ensure_ascii=False) + "\n```"
+        return parse_batch_response(response, len(texts))
+
+
+def bench_translation(args):
+    """Caller blocking time for a burst of lines: inline translate() vs TranslationWorker"""
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}" for i in range(args.lines)]
+    print(f"{args.lines} lines, {args.latency * 1000:.0f} ms per translation")
+
+    # What the Tk thread used to do: translate each line as it is displayed
+    translator = StubTranslator(args.latency)
+    start = time.perf_counter()
+    for line in lines:
+        translator.translate(line, "English")
+    inline = time.perf_counter() - start
+    print(f"inline       : blocked {inline * 1000:8.0f} ms, done in {inline * 1000:8.0f} ms")
+
+    for concurrency in args.concurrency:
+        translator = StubTranslator(args.latency)
+        worker = TranslationWorker(translator.translate, concurrency, args.queue_size)
+        worker.start()
+        results = []
+
+        start = time.perf_counter()
+        longest = 0.0
+        for line in lines:
+            submitted = time.perf_counter()
+            worker.submit(line, "English", lambda text, translation: results.append(translation))
+            longest = max(longest, time.perf_counter() - submitted)
+        blocked = time.perf_counter() - start
+        worker.join()
+        elapsed = time.perf_counter() - start
+        worker.stop()
+
+        stats = worker.stats()
+        print(f"{concurrency:2d} in flight : blocked {blocked * 1000:8.2f} ms "
+              f"(longest submit {longest * 1e6:.0f} us), done in {elapsed * 1000:8.0f} ms, "
+              f"{len(results)} delivered, {stats['dropped']} dropped, "
+              f"mean latency {stats['mean_latency'] * 1000:.0f} ms")
+
+
+def bench_batching(args):
+    """API calls and drain time for bursts of lines: per-line requests vs batches"""
+    print(f"{args.bursts} bursts of {args.lines} lines ({args.interval * 1000:.0f} ms apart), "
+          f"{args.latency * 1000:.0f} ms per call, {args.failure_rate:.0%} bad batch replies")
+
+    for batching in (False, True):
+        translator = StubTranslator(args.latency, args.failure_rate)
+        worker = TranslationWorker(
+            translator.translate, args.concurrency,
+            translate_batch=translator.translate_batch if batching else None,
+            batch_window=args.window, max_batch=args.max_batch)
+        worker.start()
+        results = []
+
+        start = time.perf_counter()
+        for burst in range(args.bursts):
+            # A scene change: a screenful of lines inside one monitor poll
+            for i in range(args.lines):
+                line = f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{burst}-{i}"
+                worker.submit(line, "English", lambda text, translation: results.append(translation))
+                time.sleep(args.interval)
+            worker.join()
+        elapsed = time.perf_counter() - start
+        worker.stop()
+
+        stats = worker.stats()
+        label = "batched " if batching else "per-line"
+        print(f"{label}: {translator.calls:5d} API calls ({stats['batches']} batches, "
+              f"{stats['batch_fallbacks']} fallbacks), {elapsed * 1000:7.0f} ms, "
+              f"{sum(1 for r in results if r)} / {args.bursts * args.lines} translated")
+
+
+def bench_pretranslate(args):
+    """Building a pre-translated index, then per-line lookup time vs the API and the cache"""
+    directory = tempfile.mkdtemp()
+    try:
+        texts = corpus_texts(text for _, text in make_script(args.script_lines))
+        index = TranslationIndex(os.path.join(directory, 'pretranslated.db'), writable=True)
+        translator = StubTranslator(args.latency, args.failure_rate)
+        pretranslator = Pretranslator(translator, index, concurrency=args.concurrency,
+                                      per_minute=args.rpm, backoff=0.01)
+        started = time.perf_counter()
+        stats = pretranslator.run(texts)
+        elapsed = time.perf_counter() - started
+        index.close()
+        print(f"{len(texts)} script lines pre-translated in {elapsed:.1f} s: "
+              f"{stats['requests']} requests ({stats['retries']} retries, {stats['splits']} splits), "
+              f"{stats['failed']} failed, index {os.path.getsize(index.path) / 1024:.0f} KB")
+
+        # A play session: mostly script lines, some lines the script does not have
+        rng = random.Random(0)
+        session = [rng.choice(texts) if rng.random() < args.known else f"{rng.choice(texts)}？"
+                   for _ in range(args.lines)]
+
+        index = TranslationIndex(index.path)
+        cache = TranslationCache(os.path.join(directory, 'translations.db'))
+        for text in texts:
+            cache.put(text, "English", translator.model_name, f"[English] {text}")
+        # Only the disk tier of the cache, as for a line first seen this session
+        cache.memory_size = 0
+
+        api = StubTranslator(args.latency)
+        started = time.perf_counter()
+        for text in session[:args.api_lines]:
+            api.translate(text, "English")
+        per_line = (time.perf_counter() - started) / max(1, args.api_lines)
+        print(f"{'API call':15}: {per_line * 1e6:10.1f} us per line")
+
+        lookups = (('cache (disk)', lambda text: cache.get(text, "English", translator.model_name)),
+                   ('pre-translated', lambda text: index.get(text, "English")))
+        for label, lookup in lookups:
+            found = 0
+            started = time.perf_counter()
+            for text in session:
+                found += lookup(text) is not None
+            per_line = (time.perf_counter() - started) / len(session)
+            print(f"{label:15}: {per_line * 1e6:10.1f} us per line, "
+                  f"{found / len(session):.0%} answered locally")
+        cache.close()
+        index.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class StubTranslationServer:
+    """Local HTTP server answering like the Gemini, OpenAI and LibreTranslate APIs
+
+    Each request takes latency seconds.  Requests beyond rate_limit a
+    second (burst at once) get a 429 with a Retry-After, and error_rate of
+    the rest a 503.  Replies echo the line as "[language] line", or a JSON
+    array of those for a batch prompt.  Counts requests, connections and
+    the errors handed out, to check the clients against.
+    """
+
+    def __init__(self, latency=0.0, rate_limit=None, burst=1, error_rate=0.0, retry_after=1,
+                 seed=0, port=0):
+        self.latency = latency
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.connections = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reply(self, prompt):
+        """Text the stub model answers prompt with"""
+        match = re.search(r' to (.+?)\.', prompt)
+        language = match.group(1) if match else 'English'
+        lines = re.search(r'Lines: (\[.*\])\s*$', prompt, re.S)
+        if lines:
+            translations = [f"[{language}] {line}" for line in json.loads(lines.group(1))]
+            return "```json\n" + json.dumps(translations, ensure_ascii=False) + "\n```"
+        return f"[{language}] {prompt.rpartition('Text: ')[2]}"
+
+    def _answer(self, path, request):
+        """(status, headers, body) for one request"""
+        with self.lock:
+            self.requests += 1
+            if self.bucket and not self.bucket.acquire(time.monotonic()):
+                self.rate_limited += 1
+                return 429, {'Retry-After': str(self.retry_after)}, {
+                    'error': {'code': 429, 'message': "Resource has been exhausted"}}
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return 503, {}, {'error': {'code': 503, 'message': "The model is overloaded"}}
+
+        time.sleep(self.latency)
+        if path.endswith(':generateContent'):
+            prompt = request['contents'][0]['parts'][0]['text']
+            return 200, {}, {'candidates': [{'content': {'parts': [{'text': self.reply(prompt)}]}}]}
+        if path.endswith('/chat/completions'):
+            prompt = request['messages'][-1]['content']
+            return 200, {}, {'choices': [{'message': {'role': 'assistant',
+                                                      'content': self.reply(prompt)}}]}
+        if path == '/translate':
+            lines = request['q'] if isinstance(request['q'], list) else [request['q']]
+            translations = [f"[{request['target']}] {line}" for line in lines]
+            return 200, {}, {'translatedText': (translations if isinstance(request['q'], list)
+                                                else translations[0])}
+        return 404, {}, {'error': {'code': 404, 'message': f"No such endpoint: {path}"}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the real APIs
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; without this every
+            # reply waits out the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                path = self.path.partition('?')[0]
+                status, headers, body = stub._answer(path, json.loads(self.rfile.read(length)))
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def bench_client(args):
+    """Bursts against a stub Gemini server that rate limits and fails: bare vs resilient client"""
+    print(f"{args.lines} lines on {args.concurrency} threads, server allows {args.server_rate}/s "
+          f"(burst {args.server_burst}), {args.error_rate:.0%} 503s, {args.latency * 1000:.0f} ms per call")
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}" for i in range(args.lines)]
+    clients = (
+        # One attempt per line on a new connection, as with no client layer
+        ('bare', dict(requests_per_minute=None, retries=0, pool_size=0)),
+        ('resilient', dict(requests_per_minute=args.server_rate * 60, burst=args.server_burst)),
+    )
+
+    for label, options in clients:
+        with StubTranslationServer(args.latency, args.server_rate, args.server_burst,
+                              args.error_rate) as server:
+            translator = GeminiTranslator('stub', base_url=server.url, deadline=args.deadline,
+                                          **options)
+            with open(os.devnull, 'w') as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(args.concurrency) as executor:
+                        results = list(executor.map(translator.translate, lines))
+                    elapsed = time.perf_counter() - started
+                finally:
+                    sys.stdout = stdout
+            translator.close()
+            print(f"{label:9}: {sum(1 for r in results if r)} / {len(lines)} translated in "
+                  f"{elapsed:5.1f} s, {server.requests} requests, {server.rate_limited} got 429, "
+                  f"{server.errors} got 503, {server.connections} connections")
+
+    # An outage: every request fails; the circuit breaker stops the waiting
+    with StubTranslationServer(error_rate=1.0) as server:
+        translator = GeminiTranslator('stub', base_url=server.url, deadline=args.deadline,
+                                      requests_per_minute=None, backoff=0.05)
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                times = []
+                for line in lines[:20]:
+                    started = time.perf_counter()
+                    translator.translate(line)
+                    times.append(time.perf_counter() - started)
+            finally:
+                sys.stdout = stdout
+        translator.close()
+        print(f"outage   : first call {times[0] * 1000:.0f} ms, later calls "
+              f"{sum(times[1:]) / len(times[1:]) * 1e6:.0f} us each (circuit open), "
+              f"{server.requests} requests for {len(times)} lines")
+
+
+def bench_backends(args):
+    """Per-line translation time of each backend, all offline (local servers are stubs)"""
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}" for i in range(args.lines)]
+    glossary = {line: f"[English] {line}" for line in SAMPLE_LINES}
+    glossary.update({"勇者": "Hero", "魔王": "Demon King", "今日": "today"})
+    print(f"{args.lines} lines, stub servers answering in {args.latency * 1000:.1f} ms")
+
+    with StubTranslationServer(args.latency) as server:
+        backends = (
+            ('glossary', GlossaryTranslator(glossary)),
+            ('local openai', LocalHttpTranslator(server.url, 'openai')),
+            ('local libretranslate', LocalHttpTranslator(server.url, 'libretranslate')),
+            ('gemini (stub server)', GeminiTranslator('stub', base_url=server.url,
+                                                       requests_per_minute=None)),
+        )
+        for label, translator in backends:
+            connections = server.connections
+            started = time.perf_counter()
+            translated = sum(1 for line in lines if translator.translate(line, "English"))
+            single = (time.perf_counter() - started) / len(lines)
+
+            started = time.perf_counter()
+            for index in range(0, len(lines), args.batch):
+                translator.translate_batch(lines[index:index + args.batch], "English")
+            batched = (time.perf_counter() - started) / len(lines)
+            translator.close()
+            print(f"{label:21}: {single * 1e6:8.1f} us per line, {batched * 1e6:8.1f} us per line "
+                  f"in batches of {args.batch}, {translated} / {len(lines)} translated, "
+                  f"{server.connections - connections} connections")
+
+
+class TypewriterSource(CaptureSource):
+    """Reveals lines a character at a time, as a visual novel text box does
+
+    Pauses longer after punctuation, and waits read seconds after each
+    line.  revealed maps each line to when its last character appeared.
+    """
+
+    name = 'typewriter'
+
+    def __init__(self, lines, char_interval, pause, read):
+        super().__init__()
+        self.lines = lines
+        self.char_interval = char_interval
+        self.pause = pause
+        self.read = read
+        self.revealed = {}
+
+    def run(self, emit):
+        for line in self.lines:
+            for end in range(1, len(line) + 1):
+                emit('Window Text', line[:end])
+                if end == len(line):
+                    self.revealed[line] = time.perf_counter()
+                    break
+                time.sleep(self.pause if line[end - 1] in '、。！？' else self.char_interval)
+            if self.stopped.wait(self.read):
+                break
+
+
+def bench_typewriter(args):
+    """API calls and reveal-to-translation latency for typewriter text: every prefix vs assembled vs speculative"""
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}" for i in range(args.lines)]
+    print(f"{args.lines} lines revealed {args.char_ms:.0f} ms a character "
+          f"({args.pause * 1000:.0f} ms after punctuation), {args.latency * 1000:.0f} ms per call, "
+          f"settle {args.settle * 1000:.0f} ms")
+
+    for mode in ('prefixes', 'settled', 'speculative'):
+        translator = StubTranslator(args.latency)
+        worker = TranslationWorker(translator.translate, args.concurrency,
+                                   translate_batch=translator.translate_batch)
+        source = TypewriterSource(lines, args.char_ms / 1000, args.pause, args.read)
+        translated = {}
+        speculation = [None]
+
+        def deliver(text, translation):
+            translated.setdefault(text, time.perf_counter())
+
+        def write(record):
+            # What the overlay does with a settled line
+            if speculation[0] is not None and speculation[0].text != record.text:
+                worker.cancel(speculation[0])
+            speculation[0] = None
+            worker.submit(record.text, "English", deliver)
+
+        def preview(record):
+            worker.cancel(speculation[0])
+            speculation[0] = worker.submit(record.text, "English", lambda text, translation: None,
+                                          speculative=True)
+
+        settle = None if mode == 'prefixes' else args.settle
+        engine = CaptureEngine(settle=settle, preview=args.settle / 3 if mode == 'speculative' else None)
+        engine.add_source(source)
+        engine.add_sink(CallbackSink(write, preview))
+        worker.start()
+        engine.start()
+        engine.wait()
+        engine.stop()
+        worker.join()
+        worker.stop()
+
+        latencies = sorted(translated[line] - source.revealed[line]
+                           for line in lines if line in translated)
+        stats = worker.stats()
+        print(f"{mode:11}: {engine.delivered:4d} lines delivered, {translator.calls:4d} API calls "
+              f"({stats['coalesced']} joined, {stats['cancelled']} cancelled), latency mean "
+              f"{sum(latencies) / max(len(latencies), 1) * 1000:5.0f} ms / "
+              f"max {max(latencies, default=0) * 1000:5.0f} ms, {len(latencies)}/{len(lines)} translated")
+
+
+def bench_capture(args):
+    """Captures, CPU time and change-to-capture latency: 100 ms polling vs change events"""
+    rng = random.Random(0)
+    intervals = []
+    while sum(intervals) < args.seconds:
+        intervals.append(rng.expovariate(1 / args.mean_interval))
+    print(f"{len(intervals)} text changes over {args.seconds} s, "
+          f"{args.capture_ms:.1f} ms per capture_text walk")
+
+    for mode in ('poll', 'event'):
+        trigger = (PollingTrigger(0.1) if mode == 'poll'
+                   else SyntheticTrigger(debounce=0.0, fallback_interval=None))
+        # version of the window text, and when each version appeared
+        window = {'version': 0, 'changed': [time.perf_counter()], 'done': False}
+        seen = {'version': 0}
+        latencies = []
+
+        def change_text():
+            for interval in intervals:
+                time.sleep(interval)
+                window['changed'].append(time.perf_counter())
+                window['version'] += 1
+                if mode == 'event':
+                    trigger.fire()
+            window['done'] = True
+            trigger.stop()
+
+        def capture():
+            # Stand-in for GetWindowText + WM_GETTEXT + EnumChildWindows
+            deadline = time.perf_counter() + args.capture_ms / 1000
+            while time.perf_counter() < deadline:
+                pass
+            version = window['version']
+            if version != seen['version']:
+                latencies.append(time.perf_counter() - window['changed'][version])
+                seen['version'] = version
+
+        driver = threading.Thread(target=change_text, daemon=True)
+        cpu = time.process_time()
+        driver.start()
+        captures = run_capture_loop(trigger, capture, lambda: not window['done'])
+        cpu = time.process_time() - cpu
+        driver.join()
+
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+        print(f"{mode:5}: {captures:5d} captures, CPU {cpu * 1000:7.0f} ms, "
+              f"latency mean {mean * 1000:5.1f} ms / max {max(latencies, default=0) * 1000:5.1f} ms")
+
+
+def bench_queue(args):
+    """Draining a burst of captured lines: list.pop(0) vs CaptureQueue batches"""
+    for lines in args.lines:
+        burst = [('Memory', f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}") for i in range(lines)]
+
+        captured = list(burst)
+        start = time.perf_counter()
+        while captured:
+            captured.pop(0)
+        legacy = time.perf_counter() - start
+
+        queue = CaptureQueue(lines)
+        for item in burst:
+            queue.put(item)
+        start = time.perf_counter()
+        while len(queue):
+            queue.drain(200)
+        drained = time.perf_counter() - start
+
+        print(f"{lines:7d} lines: pop(0) {legacy * 1000:8.1f} ms, "
+              f"drain(200) {drained * 1000:6.1f} ms  ({legacy / drained:5.1f}x)")
+
+
+def bench_render(args):
+    """Tk cost of appending captured lines: insert+see per line vs PaneRenderer frames"""
+    import tkinter as tk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"render benchmark needs a display: {e}")
+        return
+    root.withdraw()
+
+    lines = [f"[12:00:00][Memory] {SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}\n"
+             for i in range(args.lines)]
+    batch = args.batch
+
+    for mode in ('per-line', 'renderer'):
+        widget = tk.Text(root)
+        pane = PaneRenderer(widget, max_lines=args.max_lines)
+        slowest = 0.0
+        start = time.perf_counter()
+
+        # One update_captured_text tick at a time
+        for offset in range(0, len(lines), batch):
+            tick = time.perf_counter()
+            if mode == 'per-line':
+                for line in lines[offset:offset + batch]:
+                    widget.insert(tk.END, line)
+                    widget.see(tk.END)
+            else:
+                pane.extend(lines[offset:offset + batch])
+                pane.flush()
+            root.update_idletasks()
+            slowest = max(slowest, time.perf_counter() - tick)
+
+        elapsed = time.perf_counter() - start
+        widget_lines = int(widget.index('end-1c').split('.')[0]) - 1
+        print(f"{mode:9}: {elapsed * 1000:8.0f} ms total, slowest tick {slowest * 1000:6.1f} ms, "
+              f"{widget_lines} lines in widget")
+        widget.destroy()
+
+    root.destroy()
+
+
+def bench_journal(args):
+    """Caller cost of journaling captures vs appending with fsync per line"""
+    directory = tempfile.mkdtemp(prefix='journal_bench_')
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]}{i}" for i in range(args.lines)]
+    try:
+        # Naive crash-safe logging: open, append, fsync, close for every line
+        path = os.path.join(directory, 'naive.ndjson')
+        start = time.perf_counter()
+        for line in lines[:args.naive_lines]:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'source': 'Memory', 'text': line}, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        naive = (time.perf_counter() - start) / args.naive_lines
+
+        journal = CaptureJournal(os.path.join(directory, 'logs'), max_bytes=args.max_kb * 1024)
+        start = time.perf_counter()
+        for line in lines:
+            journal.record(line, 'Memory', 1234)
+        queued = (time.perf_counter() - start) / len(lines)
+        journal.close()
+        elapsed = time.perf_counter() - start
+
+        # Rotated files are compressed in the background
+        time.sleep(0.5)
+        files = glob.glob(os.path.join(directory, 'logs', '*'))
+        entries = sum(1 for path in files for _ in read_journal(path))
+        size = sum(os.path.getsize(path) for path in files)
+
+        print(f"fsync per line : {naive * 1e6:8.1f} us per line (caller)")
+        print(f"CaptureJournal : {queued * 1e6:8.1f} us per line (caller), "
+              f"{len(lines)} lines on disk in {elapsed * 1000:.0f} ms")
+        print(f"{entries} entries read back from {len(files)} files "
+              f"({journal.rotations} rotations), {size / 1024:.0f} KB")
+    finally:
+        shutil.rmtree(directory)
+
+
+def legacy_is_japanese(text):
+    """Original per-character loop (advanced_hooker variant, with punctuation)"""
+    if not text:
+        return False
+
+    for char in text:
+        code = ord(char)
+        if (0x3040 <= code <= 0x309F) or \
+           (0x30A0 <= code <= 0x30FF) or \
+           (0x4E00 <= code <= 0x9FAF) or \
+           (0x3000 <= code <= 0x303F):
+            return True
+    return False
+
+
+def legacy_japanese_ratio(text):
+    """Per-character loop equivalent of JapaneseClassifier.japanese_ratio"""
+    if not text:
+        return 0.0
+    count = 0
+    for char in text:
+        code = ord(char)
+        if (0x3040 <= code <= 0x309F) or (0x30A0 <= code <= 0x30FF) or \
+           (0x4E00 <= code <= 0x9FAF) or (0x3000 <= code <= 0x303F):
+            count += 1
+    return count / len(text)
+
+
+def bench_classifier(args):
+    """Japanese character tests: per-character loops vs the shared precompiled classifier"""
+    rng = random.Random(0)
+    titles = ["Program Manager", "Microsoft Text Input Application", "Settings",
+              "C:\\Windows\\System32\\cmd.exe - python benchmarks.py", "Default IME"]
+    corpora = {
+        # What a window walk mostly sees: ASCII captions, where the loop
+        # has to look at every character before saying no
+        'window titles': [rng.choice(titles) * rng.randint(1, 4) for _ in range(args.count)],
+        'dialogue': [rng.choice(SAMPLE_LINES) * rng.randint(1, 4) for _ in range(args.count)],
+        'mixed': [rng.choice(titles + SAMPLE_LINES) + rng.choice(SAMPLE_LINES)
+                  for _ in range(args.count)],
+    }
+    classifier = JapaneseClassifier()
+
+    def timed(function, texts):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        return (time.perf_counter() - start) / len(texts) * 1e9
+
+    print(f"{'':16}{'is_japanese loop':>18}{'classifier':>12}{'ratio loop':>14}{'classifier':>12}  (ns/text)")
+    for name, texts in corpora.items():
+        legacy = timed(legacy_is_japanese, texts)
+        shared = timed(classifier.is_japanese, texts)
+        legacy_ratio = timed(legacy_japanese_ratio, texts)
+        shared_ratio = timed(classifier.japanese_ratio, texts)
+        print(f"{name:16}{legacy:18.0f}{shared:12.0f}{legacy_ratio:14.0f}{shared_ratio:12.0f}"
+              f"   {legacy / shared:4.1f}x / {legacy_ratio / shared_ratio:4.1f}x")
+
+
+IMPORT_MODULES = ['overlay_hooker', 'text_hooker', 'advanced_hooker', 'capture_engine',
+                  'window_capture', 'translation_worker']
+
+STARTUP_APPS = {
+    'basic': ('text_hooker', 'TextHookerGUI'),
+    'advanced': ('advanced_hooker', 'AdvancedHookerGUI'),
+    'overlay': ('overlay_hooker', 'OverlayTextHooker'),
+}
+
+# Run in a child interpreter: import the app, build it and wait for its window
+STARTUP_SCRIPT = """
+import os, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+app = getattr(module, sys.argv[2])()
+while not app.root.winfo_viewable():
+    app.root.update()
+shown = time.perf_counter()
+print(imported - start, shown - start, flush=True)
+os._exit(0)
+"""
+
+
+def profile_import(module, directory):
+    """-X importtime profile of importing module from directory in a fresh interpreter
+
+    Returns (cumulative us, [(cumulative us, name)] of its direct imports, error).
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=directory, capture_output=True, text=True)
+    entries = []
+    errors = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            errors.append(line)
+            continue
+        fields = line[len('import time:'):].split('|')
+        if fields[0].strip() == 'self [us]':
+            continue
+        # The name column starts with one space, then the nesting indent
+        entries.append((int(fields[1]), fields[2][1:].rstrip()))
+
+    if result.returncode:
+        return None, [], errors[-1] if errors else f"exit code {result.returncode}"
+
+    # -X importtime indents nested imports by two spaces per level and
+    # prints each module after everything it imported
+    total = next(cumulative for cumulative, name in reversed(entries) if name == module)
+    direct = [(cumulative, name.strip()) for cumulative, name in entries
+              if name.startswith('  ') and not name.startswith('   ')]
+    return total, direct, None
+
+
+def bench_imports(args):
+    """Import-time profile of the entry points, optionally against a baseline revision"""
+    trees = [('current', os.path.dirname(os.path.abspath(__file__)))]
+    baseline_dir = None
+    if args.baseline:
+        baseline_dir = tempfile.mkdtemp(prefix='import_bench_')
+        archive = subprocess.run(['git', 'archive', args.baseline], cwd=trees[0][1],
+                                 capture_output=True, check=True).stdout
+        subprocess.run(['tar', '-x', '-C', baseline_dir], input=archive, check=True)
+        trees.insert(0, (args.baseline, baseline_dir))
+
+    try:
+        for module in args.modules:
+            print(module)
+            for label, directory in trees:
+                # Best of several runs; the first one also writes .pyc files
+                profiles = [profile_import(module, directory) for _ in range(args.repeat)]
+                total, direct, error = min(profiles, key=lambda p: p[0] if p[0] is not None else 0)
+                if error:
+                    print(f"  {label:>10}: unavailable ({error})")
+                    continue
+                heaviest = ', '.join(f"{name} {cumulative / 1000:.1f}"
+                                     for cumulative, name in sorted(direct, reverse=True)[:args.top])
+                print(f"  {label:>10}: {total / 1000:7.1f} ms  (heaviest: {heaviest})")
+    finally:
+        if baseline_dir:
+            shutil.rmtree(baseline_dir)
+
+
+def bench_startup(args):
+    """Time from launch to first visible window for a GUI app or a built executable"""
+    if args.exe:
+        try:
+            import win32gui
+        except ImportError:
+            print("startup --exe needs Windows (pywin32)")
+            return
+
+    timings = []
+    directory = tempfile.mkdtemp(prefix='startup_bench_')
+    try:
+        for run in range(args.runs):
+            start = time.perf_counter()
+            if args.exe:
+                # Frozen builds cannot report on themselves; wait for the window title
+                process = subprocess.Popen([os.path.abspath(args.exe)], cwd=directory)
+                while not win32gui.FindWindow(None, args.title):
+                    if process.poll() is not None or time.perf_counter() - start > args.timeout:
+                        print("window never appeared")
+                        return
+                    time.sleep(0.005)
+                timings.append((None, time.perf_counter() - start))
+                process.kill()
+                process.wait()
+                continue
+
+            # Settings, caches and logs of the app go to a scratch directory
+            module, cls = STARTUP_APPS[args.app]
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, module, cls], cwd=directory,
+                                    env=env, capture_output=True, text=True, timeout=args.timeout)
+            launched = time.perf_counter() - start
+            if result.returncode:
+                print(f"{args.app} did not start: {(result.stderr.strip().splitlines() or ['?'])[-1]}")
+                return
+            imported, shown = map(float, result.stdout.split())
+            # Interpreter start-up is whatever the child did not account for
+            timings.append((imported, launched - (shown - imported)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for run, (imported, window) in enumerate(timings):
+        label = 'cold' if run == 0 else f'run {run}'
+        detail = f" (imports {imported * 1000:.0f} ms)" if imported is not None else ""
+        print(f"{label:>6}: first window after {window * 1000:7.0f} ms{detail}")
+    if len(timings) > 1:
+        warm = sorted(window for _, window in timings[1:])
+        print(f"median warm start: {warm[len(warm) // 2] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text hooker benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scanner_parser = subparsers.add_parser('scanner', help=bench_scanner.__doc__)
+    scanner_parser.add_argument('--size-mb', type=int, default=256)
+    scanner_parser.add_argument('--noise', type=float, default=0.05)
+    scanner_parser.add_argument('--skip-legacy', action='store_true')
+    scanner_parser.add_argument('--extra-blocks', action='store_true',
+                                help="also look for halfwidth katakana and rare kanji blocks")
+    scanner_parser.add_argument('--dense-kb', type=int, default=4096,
+                                help="size of the random-bytes region (KB)")
+    scanner_parser.set_defaults(func=bench_scanner)
+
+    incremental_parser = subparsers.add_parser('incremental', help=bench_incremental.__doc__)
+    incremental_parser.add_argument('--size-mb', type=int, default=256)
+    incremental_parser.add_argument('--noise', type=float, default=0.05)
+    incremental_parser.add_argument('--region-kb', type=int, default=1024)
+    incremental_parser.add_argument('--changes', type=int, default=8)
+    incremental_parser.add_argument('--passes', type=int, default=3)
+    incremental_parser.set_defaults(func=bench_incremental)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help=bench_pipeline.__doc__)
+    pipeline_parser.add_argument('--source', choices=['fake', 'file', 'linux'], default='fake')
+    pipeline_parser.add_argument('--pid', type=int, help="process to scan (linux source)")
+    pipeline_parser.add_argument('--file', help="raw memory dump (file source)")
+    pipeline_parser.add_argument('--size-mb', type=int, default=64)
+    pipeline_parser.add_argument('--noise', type=float, default=0.05)
+    pipeline_parser.add_argument('--region-kb', type=int, default=1024)
+    pipeline_parser.add_argument('--passes', type=int, default=3)
+    pipeline_parser.add_argument('--incremental', action='store_true')
+    pipeline_parser.add_argument('--cold-interval', type=int, default=8,
+                                 help="passes between reads of regions without text (1 = every pass)")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    parallel_parser = subparsers.add_parser('parallel', help=bench_parallel.__doc__)
+    parallel_parser.add_argument('--workers', type=int, nargs='+')
+    parallel_parser.add_argument('--source', choices=['fake', 'file', 'linux'], default='fake')
+    parallel_parser.add_argument('--pid', type=int)
+    parallel_parser.add_argument('--file')
+    parallel_parser.add_argument('--size-mb', type=int, default=256)
+    parallel_parser.add_argument('--noise', type=float, default=0.05)
+    parallel_parser.add_argument('--region-kb', type=int, default=1024)
+    parallel_parser.set_defaults(func=bench_parallel)
+
+    buffers_parser = subparsers.add_parser('buffers', help=bench_buffers.__doc__)
+    buffers_parser.add_argument('--source', choices=['fake', 'file', 'linux'], default='fake')
+    buffers_parser.add_argument('--pid', type=int)
+    buffers_parser.add_argument('--file')
+    buffers_parser.add_argument('--size-mb', type=int, default=256)
+    buffers_parser.add_argument('--noise', type=float, default=0.05)
+    buffers_parser.add_argument('--region-kb', type=int, default=16 * 1024)
+    buffers_parser.add_argument('--child', choices=['bytes', 'pool'], help=argparse.SUPPRESS)
+    buffers_parser.set_defaults(func=bench_buffers)
+
+    regions_parser = subparsers.add_parser('regions', help=bench_regions.__doc__)
+    regions_parser.add_argument('--heap-mb', type=int, default=128)
+    regions_parser.add_argument('--text-regions', type=int, default=4)
+    regions_parser.add_argument('--threads', type=int, default=16)
+    regions_parser.add_argument('--gpu-buffers', type=int, default=4)
+    regions_parser.add_argument('--passes', type=int, default=16)
+    regions_parser.add_argument('--cold-interval', type=int, default=8)
+    regions_parser.set_defaults(func=bench_regions)
+
+    pins_parser = subparsers.add_parser('pins', help=bench_pins.__doc__)
+    pins_parser.add_argument('--heap-mb', type=int, default=128)
+    pins_parser.add_argument('--text-regions', type=int, default=4)
+    pins_parser.add_argument('--threads', type=int, default=16)
+    pins_parser.add_argument('--gpu-buffers', type=int, default=4)
+    pins_parser.add_argument('--lines', type=int, default=50)
+    pins_parser.set_defaults(func=bench_pins)
+
+    script_parser = subparsers.add_parser('script', help=bench_script.__doc__)
+    script_parser.add_argument('--size-mb', type=int, default=64)
+    script_parser.add_argument('--script-lines', type=int, default=20000)
+    script_parser.add_argument('--passes', type=int, default=5)
+    script_parser.add_argument('--embedded', type=int, default=2000,
+                               help="script lines stored next to other Japanese text")
+    script_parser.set_defaults(func=bench_script)
+
+    translation_parser = subparsers.add_parser('translation', help=bench_translation.__doc__)
+    translation_parser.add_argument('--lines', type=int, default=40)
+    translation_parser.add_argument('--latency', type=float, default=0.3)
+    translation_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    translation_parser.add_argument('--queue-size', type=int, default=64)
+    translation_parser.set_defaults(func=bench_translation)
+
+    batching_parser = subparsers.add_parser('batching', help=bench_batching.__doc__)
+    batching_parser.add_argument('--bursts', type=int, default=5)
+    batching_parser.add_argument('--lines', type=int, default=30)
+    batching_parser.add_argument('--interval', type=float, default=0.002)
+    batching_parser.add_argument('--latency', type=float, default=0.3)
+    batching_parser.add_argument('--concurrency', type=int, default=2)
+    batching_parser.add_argument('--window', type=float, default=0.05)
+    batching_parser.add_argument('--max-batch', type=int, default=20)
+    batching_parser.add_argument('--failure-rate', type=float, default=0.0)
+    batching_parser.set_defaults(func=bench_batching)
+
+    pretranslate_parser = subparsers.add_parser('pretranslate', help=bench_pretranslate.__doc__)
+    pretranslate_parser.add_argument('--script-lines', type=int, default=5000)
+    pretranslate_parser.add_argument('--latency', type=float, default=0.3)
+    pretranslate_parser.add_argument('--concurrency', type=int, default=8)
+    pretranslate_parser.add_argument('--rpm', type=float, default=0, help="0 = no rate limit")
+    pretranslate_parser.add_argument('--failure-rate', type=float, default=0.05)
+    pretranslate_parser.add_argument('--lines', type=int, default=20000, help="session lines looked up")
+    pretranslate_parser.add_argument('--api-lines', type=int, default=5,
+                                     help="session lines sent to the stub API")
+    pretranslate_parser.add_argument('--known', type=float, default=0.9,
+                                     help="share of session lines that are in the script")
+    pretranslate_parser.set_defaults(func=bench_pretranslate)
+
+    client_parser = subparsers.add_parser('client', help=bench_client.__doc__)
+    client_parser.add_argument('--lines', type=int, default=60)
+    client_parser.add_argument('--concurrency', type=int, default=8)
+    client_parser.add_argument('--latency', type=float, default=0.05)
+    client_parser.add_argument('--server-rate', type=float, default=5, help="requests a second")
+    client_parser.add_argument('--server-burst', type=int, default=5)
+    client_parser.add_argument('--error-rate', type=float, default=0.1)
+    client_parser.add_argument('--deadline', type=float, default=30.0)
+    client_parser.set_defaults(func=bench_client)
+
+    backends_parser = subparsers.add_parser('backends', help=bench_backends.__doc__)
+    backends_parser.add_argument('--lines', type=int, default=500)
+    backends_parser.add_argument('--latency', type=float, default=0.0)
+    backends_parser.add_argument('--batch', type=int, default=20)
+    backends_parser.set_defaults(func=bench_backends)
+
+    typewriter_parser = subparsers.add_parser('typewriter', help=bench_typewriter.__doc__)
+    typewriter_parser.add_argument('--lines', type=int, default=20)
+    typewriter_parser.add_argument('--char-ms', type=float, default=40)
+    typewriter_parser.add_argument('--pause', type=float, default=0.2,
+                                   help="seconds the reveal stops after punctuation")
+    typewriter_parser.add_argument('--read', type=float, default=0.8, help="seconds between lines")
+    typewriter_parser.add_argument('--latency', type=float, default=0.3)
+    typewriter_parser.add_argument('--settle', type=float, default=0.3)
+    typewriter_parser.add_argument('--concurrency', type=int, default=2)
+    typewriter_parser.set_defaults(func=bench_typewriter)
+
+    capture_parser = subparsers.add_parser('capture', help=bench_capture.__doc__)
+    capture_parser.add_argument('--seconds', type=float, default=10)
+    capture_parser.add_argument('--mean-interval', type=float, default=1.5,
+                                help="mean seconds between text changes")
+    capture_parser.add_argument('--capture-ms', type=float, default=2.0)
+    capture_parser.set_defaults(func=bench_capture)
+
+    queue_parser = subparsers.add_parser('queue', help=bench_queue.__doc__)
+    queue_parser.add_argument('--lines', type=int, nargs='+', default=[10000, 50000, 200000])
+    queue_parser.set_defaults(func=bench_queue)
+
+    render_parser = subparsers.add_parser('render', help=bench_render.__doc__)
+    render_parser.add_argument('--lines', type=int, default=100000)
+    render_parser.add_argument('--batch', type=int, default=200)
+    render_parser.add_argument('--max-lines', type=int, default=2000)
+    render_parser.set_defaults(func=bench_render)
+
+    journal_parser = subparsers.add_parser('journal', help=bench_journal.__doc__)
+    journal_parser.add_argument('--lines', type=int, default=20000)
+    journal_parser.add_argument('--naive-lines', type=int, default=500)
+    journal_parser.add_argument('--max-kb', type=int, default=256)
+    journal_parser.set_defaults(func=bench_journal)
+
+    classifier_parser = subparsers.add_parser('classifier', help=bench_classifier.__doc__)
+    classifier_parser.add_argument('--count', type=int, default=50000)
+    classifier_parser.set_defaults(func=bench_classifier)
+
+    imports_parser = subparsers.add_parser('imports', help=bench_imports.__doc__)
+    imports_parser.add_argument('--modules', nargs='+', default=IMPORT_MODULES)
+    imports_parser.add_argument('--baseline', metavar='REV', help="git revision to compare against")
+    imports_parser.add_argument('--repeat', type=int, default=3)
+    imports_parser.add_argument('--top', type=int, default=4, help="heaviest direct imports shown")
+    imports_parser.set_defaults(func=bench_imports)
+
+    startup_parser = subparsers.add_parser('startup', help=bench_startup.__doc__)
+    startup_parser.add_argument('--app', choices=sorted(STARTUP_APPS), default='overlay')
+    startup_parser.add_argument('--exe', help="built executable to launch instead")
+    startup_parser.add_argument('--title', default="Japanese Text Hooker with Overlay",
+                                help="window title to wait for with --exe")
+    startup_parser.add_argument('--runs', type=int, default=5)
+    startup_parser.add_argument('--timeout', type=float, default=60)
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,624 @@
+import json
+import sys
+import threading
+import time
+
+from capture_journal import CaptureJournal
+from capture_queue import CaptureQueue
+from capture_trigger import create_capture_trigger, run_capture_loop
+from dedup_cache import DedupCache
+from history_store import HistoryRecord, export_fields
+from japanese_classifier import is_japanese
+from line_assembler import LineAssembler
+from metrics import DEPTH_BUCKETS, registry
+
+
+class CaptureSource:
+    """Producer of captured text, run by the engine on its own thread
+
+    run(emit) blocks until stop() is called or the source runs dry,
+    calling emit(source, text) for every line it reads, or
+    emit(source, text, line_id) for a line of a known script.  Sources
+    reading several controls under one label pass stream=<control id>, so
+    the lines of each control are assembled apart.
+    """
+
+    name = 'source'
+
+    def __init__(self, pid=0):
+        self.pid = pid
+        self.stopped = threading.Event()
+
+    def run(self, emit):
+        raise NotImplementedError
+
+    def stop(self):
+        """Ask run() to return; safe to call from any thread"""
+        self.stopped.set()
+
+
+class WindowTextSource(CaptureSource):
+    """Window title, WM_GETTEXT and child window text of one window
+
+    The window is re-read every time its capture trigger fires (WinEvent
+    change notifications, or polling every interval seconds).
+    """
+
+    name = 'window'
+
+    def __init__(self, hwnd, pid=0, mode='event', interval=0.1):
+        super().__init__(pid)
+        self.hwnd = hwnd
+        self.mode = mode
+        self.interval = interval
+        self.trigger = None
+
+    def run(self, emit):
+        from window_capture import capture_window_text
+
+        capture_seconds = registry.histogram('capture_window_seconds', "Duration of one window text capture")
+
+        def capture():
+            started = time.perf_counter()
+            texts = capture_window_text(self.hwnd)
+            capture_seconds.observe(time.perf_counter() - started)
+            for source, text, control in texts:
+                emit(source, text, stream=control)
+
+        self.trigger = create_capture_trigger(self.hwnd, self.mode, self.interval)
+        try:
+            run_capture_loop(self.trigger, capture, lambda: not self.stopped.is_set())
+        finally:
+            self.trigger.stop()
+
+    def stop(self):
+        super().stop()
+        if self.trigger:
+            self.trigger.stop()
+
+
+class MemoryScanSource(CaptureSource):
+    """Periodic memory scans of one process
+
+    Pass the scanner the process is already attached to, or leave it out
+    to open the process with the platform's native MemorySource; the
+    source then owns (and closes) its scanner.  on_scan is called with the
+    ScanStats of every pass.  cold_interval only applies to an owned
+    scanner: regions that never produced text are read every
+    cold_interval passes.
+
+    With pin_interval set, the addresses where new lines appeared are
+    re-read every pin_interval seconds between the full scans, which still
+    run every interval seconds to find new addresses.
+
+    With a script (a ScriptIndex) only its lines are captured, labelled
+    'Script' and carrying their script line ID.
+    """
+
+    name = 'memory'
+
+    def __init__(self, pid, scanner=None, interval=0.5, incremental=True, workers=1, on_scan=None,
+                 cold_interval=8, pin_interval=None, script=None):
+        super().__init__(pid)
+        self.interval = interval
+        self.pin_interval = pin_interval
+        self.incremental = incremental
+        self.on_scan = on_scan
+        self.owns_scanner = scanner is None
+        if scanner is None:
+            # The scan stack (process pools, shared memory) is only loaded
+            # by engines that scan memory
+            from memory_scanner import MemoryScanner
+            from memory_source import open_memory_source
+
+            # Opened here so a missing process or permission fails at setup
+            scanner = MemoryScanner(cold_interval=cold_interval)
+            scanner.set_script(script)
+            scanner.set_scan_workers(workers)
+            try:
+                scanner.attach_source(pid, open_memory_source(pid))
+            except Exception:
+                scanner.close()
+                raise
+        self.scanner = scanner
+
+    def label(self, text):
+        """(source label, script line ID) of a text; the ID is None outside known script mode"""
+        script = self.scanner.script
+        if script is None:
+            return 'Memory', None
+        return 'Script', script.line_id(text)
+
+    def run(self, emit):
+        try:
+            while not self.stopped.is_set():
+                for text in self.scanner.scan_memory_for_text(self.pid, incremental=self.incremental):
+                    label, line_id = self.label(text)
+                    emit(label, text, line_id)
+
+                process = self.scanner.hooked_processes.get(self.pid)
+                if self.on_scan and process and process['scan_stats']:
+                    self.on_scan(process['scan_stats'])
+                self.poll_pins(emit, time.monotonic() + self.interval)
+        finally:
+            if self.owns_scanner:
+                self.scanner.close()
+
+    def poll_pins(self, emit, deadline):
+        """Poll the pinned addresses until deadline, or just wait if there are none"""
+        while not self.stopped.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            process = self.scanner.hooked_processes.get(self.pid)
+            if not self.pin_interval or not process or not len(process['text_addresses']):
+                self.stopped.wait(remaining)
+                return
+
+            for text in self.scanner.poll_pinned_text(self.pid):
+                label, line_id = self.label(text)
+                emit(label, text, line_id)
+            self.stopped.wait(min(self.pin_interval, remaining))
+
+
+class ClipboardSource(CaptureSource):
+    """Clipboard text, read every interval seconds"""
+
+    name = 'clipboard'
+
+    def __init__(self, interval=0.5):
+        super().__init__()
+        self.interval = interval
+
+    def run(self, emit):
+        import pyperclip
+
+        last_clipboard = ""
+        while not self.stopped.is_set():
+            try:
+                data = pyperclip.paste()
+            except pyperclip.PyperclipException:
+                data = ""
+            if data and data != last_clipboard:
+                emit('Clipboard', data)
+                last_clipboard = data
+            self.stopped.wait(self.interval)
+
+
+class LinesSource(CaptureSource):
+    """Lines of an iterable such as a file or stdin; finishes when it runs dry"""
+
+    name = 'lines'
+
+    def __init__(self, lines, label='Input', pid=0, interval=0.0):
+        super().__init__(pid)
+        self.lines = lines
+        self.label = label
+        self.interval = interval
+
+    def run(self, emit):
+        for line in self.lines:
+            if self.stopped.is_set():
+                break
+            line = line.rstrip('\r\n')
+            if line:
+                emit(self.label, line)
+            if self.interval:
+                self.stopped.wait(self.interval)
+
+
+class CaptureSink:
+    """Consumer of accepted captures; only called from the dispatcher thread"""
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def preview(self, record):
+        """A line still being revealed; write() brings it once it settles"""
+
+    def flush(self):
+        """Called after every batch"""
+
+    def close(self):
+        self.flush()
+
+
+class CallbackSink(CaptureSink):
+    """Hands every HistoryRecord to a callable, and previews to on_preview"""
+
+    def __init__(self, callback, on_preview=None):
+        self.callback = callback
+        self.on_preview = on_preview
+
+    def write(self, record):
+        self.callback(record)
+
+    def preview(self, record):
+        if self.on_preview:
+            self.on_preview(record)
+
+
+class NdjsonSink(CaptureSink):
+    """One JSON object per capture on a text stream, flushed per batch"""
+
+    def __init__(self, stream, close_stream=False):
+        self.stream = stream
+        self.close_stream = close_stream
+
+    @classmethod
+    def open(cls, path):
+        """Sink appending to path, or writing to stdout for '-'"""
+        if path == '-':
+            return cls(sys.stdout)
+        return cls(open(path, 'a', encoding='utf-8'), close_stream=True)
+
+    def write(self, record):
+        self.stream.write(json.dumps(export_fields(record), ensure_ascii=False))
+        self.stream.write('\n')
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self.close_stream:
+            self.stream.close()
+
+
+class JournalSink(CaptureSink):
+    """Records captures in a CaptureJournal owned by the caller"""
+
+    def __init__(self, journal):
+        self.journal = journal
+
+    def write(self, record):
+        self.journal.record(record.text, record.source, record.pid, record.line_id)
+
+
+class CaptureEngine:
+    """Headless capture pipeline: sources -> filter -> dedup -> sinks
+
+    Every source runs on its own thread and feeds one bounded CaptureQueue;
+    a full queue makes the sources wait up to a second for room, then drops
+    the line (counted in dropped).  A
+    dispatcher thread drains it in batches, drops lines that are too
+    short, too long, not Japanese or recently seen from the same process,
+    and hands the rest to every sink as HistoryRecords.  A sink that
+    raises is detached, and the engine stops once it has no sink left
+    (stdout piped into a reader that exited).  An engine is started once;
+    stop() stops the sources, delivers what they already captured and
+    closes the sinks.
+
+    With settle set, lines revealed a character at a time are assembled
+    by a LineAssembler: growing prefixes of a line are held back and only
+    the line is delivered, once it has not changed for settle seconds.
+    With preview set as well, sinks get the line through preview() once it
+    has not changed for preview seconds, before it settles.
+    """
+
+    def __init__(self, min_length=1, max_length=None, japanese_only=True, dedup_size=500,
+                 queue_size=1000, batch_size=200, settle=None, preview=None):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.japanese_only = japanese_only
+        self.dedup_size = dedup_size
+        self.batch_size = batch_size
+        self.queue = CaptureQueue(queue_size, policy='block')
+        self.sources = []
+        self.sinks = []
+        self.source_threads = []
+        self.dispatcher = None
+        self.stopping = threading.Event()
+        # Recently seen texts per process
+        self.seen = {}
+        self.assembler = LineAssembler(settle, preview) if settle else None
+        self.captured = 0
+        self.filtered = 0
+        self.duplicates = 0
+        self.delivered = 0
+        self.sink_errors = 0
+
+    @classmethod
+    def for_window(cls, hwnd, pid=0, sinks=(), mode='event', **options):
+        """Started engine capturing one window into the given sinks"""
+        engine = cls(**options)
+        engine.add_source(WindowTextSource(hwnd, pid, mode))
+        for sink in sinks:
+            engine.add_sink(sink)
+        engine.start()
+        return engine
+
+    def add_source(self, source):
+        self.sources.append(source)
+        if self.dispatcher:
+            self._start_source(source)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    @property
+    def running(self):
+        """True until the dispatcher has delivered its last batch"""
+        return self.dispatcher is not None and self.dispatcher.is_alive()
+
+    def start(self):
+        if self.dispatcher:
+            raise RuntimeError("Capture engine already started")
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+        for source in self.sources:
+            self._start_source(source)
+
+    def _start_source(self, source):
+        thread = threading.Thread(target=self._run_source, args=(source,), daemon=True)
+        self.source_threads.append(thread)
+        thread.start()
+
+    def _run_source(self, source):
+        captured = registry.counter('capture_records_total', "Texts emitted by capture sources",
+                                    source=source.name)
+
+        def emit(label, text, line_id=None, stream=None):
+            self.captured += 1
+            captured.inc()
+            self.queue.put((HistoryRecord(time.time(), label, source.pid, text, line_id), stream))
+
+        try:
+            source.run(emit)
+        except Exception as e:
+            print(f"Capture source {source.name} failed: {e}", file=sys.stderr)
+
+    def _sources_alive(self):
+        return any(thread.is_alive() for thread in self.source_threads)
+
+    def accept(self, record):
+        """Apply the length, language and duplicate filters to a record"""
+        text = record.text
+        if (not text or len(text) < self.min_length
+                or (self.max_length is not None and len(text) > self.max_length)
+                or (self.japanese_only and not is_japanese(text))):
+            self.filtered += 1
+            return False
+
+        if self.dedup_size:
+            seen = self.seen.get(record.pid)
+            if seen is None:
+                seen = self.seen[record.pid] = DedupCache(self.dedup_size)
+            if not seen.add(text):
+                self.duplicates += 1
+                return False
+        return True
+
+    def _deliver(self, batch):
+        """Filter and assemble a batch of (record, stream) pairs, then write it"""
+        accepted = [(record, stream) for record, stream in batch if self.accept(record)]
+        if self.assembler is None:
+            self._write([record for record, stream in accepted])
+            return
+
+        lines = []
+        for record, stream in accepted:
+            lines.extend(self.assembler.add(record, stream=stream))
+        self._write(lines)
+
+    def _write(self, accepted):
+        if not accepted:
+            return
+
+        self.delivered += len(accepted)
+        registry.counter('capture_delivered_total', "Texts delivered to the sinks").inc(len(accepted))
+        # Capture to delivery, for the oldest text of the batch
+        registry.histogram('capture_delivery_latency_seconds',
+                           "Time from capture to delivery").observe(time.time() - accepted[0].timestamp)
+        for sink in list(self.sinks):
+            started = time.perf_counter()
+            try:
+                for record in accepted:
+                    sink.write(record)
+                sink.flush()
+                registry.histogram('capture_sink_seconds', "Time a sink takes to take a batch",
+                                   sink=type(sink).__name__).observe(time.perf_counter() - started)
+            except Exception as e:
+                self._detach(sink, e)
+
+    def _detach(self, sink, error):
+        self.sink_errors += 1
+        self.sinks.remove(sink)
+        print(f"Capture sink {type(sink).__name__} failed and was detached: {error}", file=sys.stderr)
+        if not self.sinks:
+            self.stop(wait=False)
+
+    def _release_assembled(self):
+        """Deliver the assembled lines that settled, and preview the ones due"""
+        settled, previews = self.assembler.due()
+        self._write(settled)
+        if not previews:
+            return
+
+        registry.counter('capture_previews_total', "Lines previewed before they settled").inc(len(previews))
+        for sink in list(self.sinks):
+            try:
+                for record in previews:
+                    sink.preview(record)
+            except Exception as e:
+                self._detach(sink, e)
+
+    def _dispatch(self):
+        depth = registry.histogram('capture_queue_depth', "Texts waiting when a batch is taken",
+                                   buckets=DEPTH_BUCKETS)
+        while True:
+            timeout = 0.1
+            if self.assembler is not None:
+                due = self.assembler.next_due()
+                if due is not None:
+                    timeout = min(timeout, max(0.0, due - time.monotonic()))
+
+            record = self.queue.get(timeout=timeout)
+            if record is not None:
+                depth.observe(len(self.queue) + 1)
+                self._deliver([record] + self.queue.drain(self.batch_size - 1))
+            elif self.stopping.is_set() and not self._sources_alive():
+                break
+            if self.assembler is not None:
+                self._release_assembled()
+
+        # Anything queued between the last get() and the sources exiting
+        self._deliver(self.queue.drain())
+        if self.assembler is not None:
+            self._write(self.assembler.flush())
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                print(f"Capture sink {type(sink).__name__} failed to close: {e}", file=sys.stderr)
+
+    def wait(self, timeout=None):
+        """Block until every source has run dry; False if timeout ran out first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.source_threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not self._sources_alive()
+
+    def stop(self, wait=True):
+        """Stop every source; with wait, block until the sinks are closed
+
+        Without wait the engine finishes in the background, so a GUI is not
+        held up by a memory scan in progress.
+        """
+        self.stopping.set()
+        for source in self.sources:
+            source.stop()
+        if wait and self.dispatcher:
+            self.dispatcher.join()
+
+    def stats(self):
+        return {
+            'captured': self.captured,
+            'filtered': self.filtered,
+            'duplicates': self.duplicates,
+            'delivered': self.delivered,
+            'dropped': self.queue.dropped,
+            'sink_errors': self.sink_errors,
+            'prefixes_merged': self.assembler.merged if self.assembler is not None else 0,
+            'previews': self.assembler.previews if self.assembler is not None else 0
+        }
+
+    def report(self):
+        """One-line summary for the status bar"""
+        return (f"{self.delivered} delivered, {self.duplicates} duplicates, "
+                f"{self.filtered} filtered, {self.queue.dropped} dropped")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m capture_engine',
+        description="Capture Japanese text headless and stream it as NDJSON")
+    parser.add_argument('--pid', type=int, help="process to capture from")
+    parser.add_argument('--memory', action='store_true',
+                        help="scan the memory of --pid (the default when no other source is given)")
+    parser.add_argument('--window', type=lambda value: int(value, 0), metavar='HWND',
+                        help="capture the text of this window handle")
+    parser.add_argument('--title', help="capture the first visible window whose title contains TITLE")
+    parser.add_argument('--clipboard', action='store_true', help="capture clipboard text")
+    parser.add_argument('--stdin', action='store_true', help="capture lines read from standard input")
+    parser.add_argument('--list-windows', action='store_true', help="print the visible windows and exit")
+    parser.add_argument('-o', '--output', default='-', help="NDJSON output file (default: stdout)")
+    parser.add_argument('--journal', metavar='DIR', help="also keep a rotating journal in DIR")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="write timings and counters on exit (.prom: Prometheus text, else JSON)")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help="seconds between memory scans and clipboard reads")
+    parser.add_argument('--trigger', choices=('event', 'poll'), default='event',
+                        help="how window captures are triggered")
+    parser.add_argument('--full-scan', action='store_true', help="re-parse every page on every scan")
+    parser.add_argument('--workers', type=int, default=1, help="memory scan worker processes")
+    parser.add_argument('--pin-interval', type=float, default=0.02,
+                        help="seconds between re-reads of addresses where lines appeared (0 = off)")
+    parser.add_argument('--script', metavar='FILE',
+                        help="only capture these known lines (one per line, or ID<TAB>text)")
+    parser.add_argument('--cold-interval', type=int, default=8,
+                        help="read memory regions that never held text every N scans (1 = every scan)")
+    parser.add_argument('--min-length', type=int, default=1)
+    parser.add_argument('--max-length', type=int)
+    parser.add_argument('--all-text', action='store_true', help="keep lines without Japanese")
+    parser.add_argument('--dedup', type=int, default=500,
+                        help="recent texts remembered per process for duplicate filtering (0 = off)")
+    parser.add_argument('--settle', type=float, metavar='SECONDS',
+                        help="assemble lines revealed a character at a time, delivering each "
+                             "once it has not changed for SECONDS")
+    args = parser.parse_args(argv)
+
+    # NDJSON is UTF-8 whatever the console code page
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if args.list_windows or args.title:
+        from window_capture import find_windows
+        windows = find_windows()
+
+    if args.list_windows:
+        for window in windows:
+            print(json.dumps(window, ensure_ascii=False))
+        return 0
+
+    engine = CaptureEngine(min_length=args.min_length, max_length=args.max_length,
+                           japanese_only=not args.all_text, dedup_size=args.dedup,
+                           settle=args.settle)
+
+    if args.title:
+        matches = [w for w in windows if args.title in w['title']]
+        if not matches:
+            parser.error(f"no visible window title contains {args.title!r}")
+        engine.add_source(WindowTextSource(matches[0]['hwnd'], matches[0]['pid'], args.trigger))
+    if args.window:
+        engine.add_source(WindowTextSource(args.window, args.pid or 0, args.trigger))
+    if args.clipboard:
+        engine.add_source(ClipboardSource(args.interval))
+    if args.stdin:
+        engine.add_source(LinesSource(sys.stdin, 'Stdin', args.pid or 0))
+    if args.pid and (args.memory or not engine.sources):
+        script = None
+        if args.script:
+            from script_index import ScriptIndex
+            try:
+                script = ScriptIndex.from_file(args.script)
+            except OSError as e:
+                parser.error(f"cannot read script {args.script}: {e}")
+        try:
+            engine.add_source(MemoryScanSource(args.pid, interval=args.interval,
+                                               incremental=not args.full_scan, workers=args.workers,
+                                               cold_interval=args.cold_interval,
+                                               pin_interval=args.pin_interval, script=script))
+        except Exception as e:
+            parser.error(f"cannot open process {args.pid}: {e}")
+
+    if not engine.sources:
+        parser.error("no capture source; give --pid, --window, --title, --clipboard or --stdin")
+
+    journal = CaptureJournal(args.journal) if args.journal else None
+    engine.add_sink(NdjsonSink.open(args.output))
+    if journal:
+        engine.add_sink(JournalSink(journal))
+
+    engine.start()
+    try:
+        engine.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        if journal:
+            journal.close()
+
+    if args.metrics:
+        registry.write(args.metrics)
+    print(json.dumps(engine.stats()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from capture_queue import CaptureQueue
+
+
+class CaptureJournal:
+    """Background NDJSON log of every captured and translated line
+
+    record() only queues the entry; a writer thread appends it to the
+    current log file through a buffered handle, flushes every
+    flush_interval seconds and fsyncs every fsync_interval seconds, so a
+    crash loses at most the last few seconds.  Each entry is a single line,
+    so a log cut short by a crash is still readable up to its last
+    complete entry (see read_journal).
+
+    The log is rotated once it reaches max_bytes or max_age seconds;
+    rotated files are gzipped in the background when compress is set.
+    """
+
+    def __init__(self, directory="logs", prefix="capture", max_bytes=16 * 1024 * 1024,
+                 max_age=24 * 3600, flush_interval=1.0, fsync_interval=5.0, compress=True):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+        # Producers wait briefly rather than lose entries when the disk stalls
+        self.entries = CaptureQueue(10000, policy='block')
+        self.file = None
+        self.path = None
+        self.opened = 0.0
+        self.file_bytes = 0
+        self.written = 0
+        self.rotations = 0
+        self.running = True
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def record(self, text, source, pid=0, line_id=None):
+        """Queue a captured line; line_id is its script line ID in known script mode"""
+        entry = {'time': datetime.now().isoformat(timespec='milliseconds'),
+                 'kind': 'capture', 'source': source, 'pid': pid or 0, 'text': text}
+        if line_id is not None:
+            entry['line_id'] = line_id
+        self.entries.put(entry)
+
+    def record_translation(self, text, translation, target_language):
+        """Queue a finished translation of a captured line"""
+        self.entries.put({'time': datetime.now().isoformat(timespec='milliseconds'),
+                          'kind': 'translation', 'text': text, 'translation': translation,
+                          'target_language': target_language})
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.directory, f"{self.prefix}_{stamp}.ndjson")
+        suffix = 1
+        while os.path.exists(path) or os.path.exists(path + '.gz'):
+            path = os.path.join(self.directory, f"{self.prefix}_{stamp}_{suffix}.ndjson")
+            suffix += 1
+
+        self.path = path
+        self.file = open(path, 'ab', buffering=64 * 1024)
+        self.opened = time.monotonic()
+        self.file_bytes = 0
+
+    def _sync(self):
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _close_file(self, background=True):
+        """Close the current log and compress it"""
+        if not self.file:
+            return
+
+        self._sync()
+        self.file.close()
+        self.file = None
+        if self.compress and background:
+            threading.Thread(target=compress_file, args=(self.path,), daemon=True).start()
+        elif self.compress:
+            compress_file(self.path)
+
+    def _write_loop(self):
+        last_flush = last_sync = time.monotonic()
+
+        while self.running or len(self.entries):
+            entry = self.entries.get(timeout=self.flush_interval)
+            now = time.monotonic()
+
+            if entry is not None:
+                if self.file and (self.file_bytes >= self.max_bytes
+                                  or now - self.opened >= self.max_age):
+                    self._close_file()
+                    self.rotations += 1
+                if not self.file:
+                    self._open()
+
+                line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+                self.file.write(line)
+                self.file_bytes += len(line)
+                self.written += 1
+
+            if self.file and now - last_sync >= self.fsync_interval:
+                self._sync()
+                last_sync = last_flush = now
+            elif self.file and now - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = now
+
+        self._close_file(background=False)
+
+    def close(self):
+        """Write out everything queued, fsync and stop the writer"""
+        self.running = False
+        self.writer.join()
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'queued': len(self.entries),
+            'dropped': self.entries.dropped,
+            'rotations': self.rotations,
+            'path': self.path
+        }
+
+
+def compress_file(path):
+    """Gzip a closed log next to itself and remove the original"""
+    try:
+        # Written under a temporary name so an interrupted run never leaves
+        # a truncated .gz next to a removed original
+        with open(path, 'rb') as source, gzip.open(path + '.gz.tmp', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(path + '.gz.tmp', path + '.gz')
+        os.remove(path)
+    except OSError as e:
+        print(f"Failed to compress {path}: {e}")
+
+
+def read_journal(path):
+    """Yield the entries of a log file (.ndjson or .ndjson.gz), skipping a torn last line"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Only the entry being written during a crash can be partial
+                continue
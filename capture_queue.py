@@ -0,0 +1,88 @@
+import threading
+from collections import deque
+
+
+class CaptureQueue:
+    """Bounded channel from capture threads to the GUI
+
+    Items are appended at one end of a deque and drained in batches from the
+    other, both O(1) per item.  When the queue is full the policy decides:
+    'oldest' drops the oldest queued item (a stale line is worth less than
+    a new one), 'newest' rejects the incoming item, and 'block' makes the
+    producer wait up to block_timeout seconds for room before dropping it.
+    """
+
+    def __init__(self, max_size=1000, policy='oldest', block_timeout=1.0):
+        if policy not in ('oldest', 'newest', 'block'):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.enqueued = 0
+        self.dropped = 0
+        self.drained = 0
+        self.high_water = 0
+
+    def put(self, item):
+        """Queue an item; returns False if it was dropped"""
+        with self.condition:
+            if len(self.items) >= self.max_size:
+                if self.policy == 'oldest':
+                    self.items.popleft()
+                    self.dropped += 1
+                elif self.policy == 'newest' or not self.condition.wait_for(
+                        lambda: len(self.items) < self.max_size, self.block_timeout):
+                    self.dropped += 1
+                    return False
+
+            self.items.append(item)
+            self.enqueued += 1
+            if len(self.items) > self.high_water:
+                self.high_water = len(self.items)
+            self.condition.notify_all()
+            return True
+
+    def drain(self, max_items=None):
+        """Remove and return up to max_items queued items (all by default), oldest first"""
+        with self.condition:
+            count = len(self.items) if max_items is None else min(max_items, len(self.items))
+            batch = [self.items.popleft() for _ in range(count)]
+            self.drained += count
+            if count:
+                self.condition.notify_all()
+            return batch
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, waiting up to timeout; None if none came"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items, timeout):
+                return None
+            self.drained += 1
+            self.condition.notify_all()
+            return self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        """Discard queued items (counters are kept)"""
+        with self.condition:
+            self.items.clear()
+            self.condition.notify_all()
+
+    def stats(self):
+        """Queue counters"""
+        return {
+            'queued': len(self.items),
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'drained': self.drained,
+            'high_water': self.high_water
+        }
+
+    def report(self):
+        """One-line summary for the status bar"""
+        return (f"{self.enqueued} captured, {self.dropped} dropped, "
+                f"peak queue {self.high_water}/{self.max_size}")
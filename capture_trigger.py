@@ -0,0 +1,227 @@
+import ctypes
+import ctypes.wintypes
+import threading
+
+
+# WinEvent constants (winuser.h)
+EVENT_OBJECT_NAMECHANGE = 0x800C
+EVENT_OBJECT_VALUECHANGE = 0x800E
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+WM_QUIT = 0x0012
+
+
+class CaptureTrigger:
+    """Decides when a window's text has to be captured again
+
+    A monitor loop captures once, then calls wait() before every further
+    capture; wait() returns False once the trigger was stopped.
+    """
+
+    def start(self):
+        """Begin watching (called from the monitor thread)"""
+        pass
+
+    def wait(self):
+        """Block until the text may have changed; False when stopped"""
+        raise NotImplementedError
+
+    def stop(self):
+        """Stop watching and wake up wait(); safe from any thread"""
+        raise NotImplementedError
+
+
+class PollingTrigger(CaptureTrigger):
+    """Capture on a fixed interval (the original 100 ms loop)"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.wakeups = 0
+
+    def wait(self):
+        if self.stopped.wait(self.interval):
+            return False
+        self.wakeups += 1
+        return True
+
+    def stop(self):
+        self.stopped.set()
+
+
+class EventTrigger(CaptureTrigger):
+    """Capture when fire() reports a change
+
+    Events arriving within debounce seconds of each other are coalesced into
+    one capture, so a typewriter effect does not cause a capture per
+    character.  With fallback_interval set, a capture also happens after
+    that long without any event, for text the events never announce.
+    """
+
+    def __init__(self, debounce=0.02, fallback_interval=1.0):
+        self.debounce = debounce
+        self.fallback_interval = fallback_interval
+        self.changed = threading.Event()
+        self.stopped = threading.Event()
+        self.events = 0
+        self.wakeups = 0
+        self.fallback_polls = 0
+
+    def fire(self):
+        """Report a possible text change; safe from any thread"""
+        self.events += 1
+        self.changed.set()
+
+    def wait(self):
+        fired = self.changed.wait(self.fallback_interval)
+        if self.stopped.is_set():
+            return False
+
+        if fired:
+            if self.debounce and self.stopped.wait(self.debounce):
+                return False
+            self.wakeups += 1
+        else:
+            self.fallback_polls += 1
+
+        self.changed.clear()
+        return True
+
+    def stop(self):
+        self.stopped.set()
+        self.changed.set()
+
+
+class SyntheticTrigger(EventTrigger):
+    """EventTrigger fed by a scripted event generator instead of Windows"""
+
+    def __init__(self, intervals=(), debounce=0.0, fallback_interval=None):
+        super().__init__(debounce, fallback_interval)
+        # Delays between generated events, in seconds
+        self.intervals = list(intervals)
+        self.generator = None
+
+    def start(self):
+        if self.intervals:
+            self.generator = threading.Thread(target=self._generate, daemon=True)
+            self.generator.start()
+
+    def _generate(self):
+        for interval in self.intervals:
+            if self.stopped.wait(interval):
+                return
+            self.fire()
+
+
+class WinEventTrigger(EventTrigger):
+    """Capture on name/value-change WinEvents raised by the window's process
+
+    The hook is out-of-context, so no code is injected into the game; the
+    callbacks are delivered to a message loop on a thread of our own.
+    """
+
+    def __init__(self, hwnd, debounce=0.02, fallback_interval=1.0):
+        super().__init__(debounce, fallback_interval)
+        self.hwnd = hwnd
+        self.thread = None
+        self.thread_id = None
+        self.installed = threading.Event()
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._message_loop, daemon=True)
+        self.thread.start()
+        self.installed.wait()
+        if self.error:
+            raise self.error
+
+    def _message_loop(self):
+        try:
+            hook = self._install()
+        except Exception as e:
+            hook = None
+            self.error = e
+        self.installed.set()
+        if not hook:
+            return
+
+        user32 = ctypes.windll.user32
+        msg = ctypes.wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+
+        user32.UnhookWinEvent(hook)
+
+    def _install(self):
+        """Register the hook on the calling thread; returns the hook handle"""
+        from ctypes import windll
+
+        user32 = windll.user32
+        self.thread_id = windll.kernel32.GetCurrentThreadId()
+
+        pid = ctypes.wintypes.DWORD()
+        user32.GetWindowThreadProcessId(self.hwnd, ctypes.byref(pid))
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, ctypes.wintypes.HANDLE, ctypes.wintypes.DWORD, ctypes.wintypes.HWND,
+            ctypes.wintypes.LONG, ctypes.wintypes.LONG, ctypes.wintypes.DWORD,
+            ctypes.wintypes.DWORD)
+
+        def callback(hook, event, hwnd, id_object, id_child, thread, time_ms):
+            # Only changes in the watched window or its children matter
+            if hwnd == self.hwnd or (hwnd and user32.IsChild(self.hwnd, hwnd)):
+                self.fire()
+
+        # Keep a reference so the callback is not garbage collected
+        self.callback = WinEventProc(callback)
+        hook = user32.SetWinEventHook(
+            EVENT_OBJECT_NAMECHANGE, EVENT_OBJECT_VALUECHANGE, 0, self.callback,
+            pid.value, 0, WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+
+        if not hook:
+            raise ctypes.WinError()
+        return hook
+
+    def stop(self):
+        super().stop()
+        if self.thread_id is not None:
+            from ctypes import windll
+            windll.user32.PostThreadMessageW(self.thread_id, WM_QUIT, 0, 0)
+            self.thread_id = None
+
+
+def create_capture_trigger(hwnd, mode='event', interval=0.1):
+    """Event-driven trigger for hwnd, or polling if mode is 'poll' or hooks are unavailable
+
+    The trigger is already started.
+    """
+    if mode == 'event':
+        trigger = WinEventTrigger(hwnd)
+        try:
+            trigger.start()
+            return trigger
+        except (OSError, ImportError) as e:
+            print(f"WinEvent hook unavailable, polling instead: {e}")
+
+    trigger = PollingTrigger(interval)
+    trigger.start()
+    return trigger
+
+
+def run_capture_loop(trigger, capture, running):
+    """Capture once, then again every time the trigger fires, while running() is true
+
+    capture is called with no arguments and handles its own results.
+    Returns the number of captures made.
+    """
+    captures = 0
+    while running():
+        try:
+            capture()
+        except Exception:
+            pass
+        captures += 1
+        if not trigger.wait():
+            break
+    return captures
@@ -0,0 +1,65 @@
+import time
+from collections import OrderedDict
+
+
+class DedupCache:
+    """Bounded LRU set of recently captured texts
+
+    Lookups and inserts are O(1).  Seeing a text again refreshes it, so the
+    least recently seen text is evicted first; with a ttl, a text that has
+    not been seen for ttl seconds counts as new again.
+    """
+
+    def __init__(self, max_size=500, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        # text -> time last seen, oldest first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add(self, text):
+        """Record a text; returns True if it was not seen recently"""
+        now = time.monotonic()
+        last_seen = self.entries.get(text)
+
+        if last_seen is not None and (self.ttl is None or now - last_seen <= self.ttl):
+            self.hits += 1
+            self.entries[text] = now
+            self.entries.move_to_end(text)
+            return False
+
+        self.misses += 1
+        self.entries[text] = now
+        self.entries.move_to_end(text)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+        return True
+
+    def __contains__(self, text):
+        last_seen = self.entries.get(text)
+        if last_seen is None:
+            return False
+        return self.ttl is None or time.monotonic() - last_seen <= self.ttl
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        """Forget all texts (counters are kept)"""
+        self.entries.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0
+        }
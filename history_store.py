@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+
+# line_id is the script line ID of a capture in known script mode, else None
+HistoryRecord = namedtuple('HistoryRecord', ['timestamp', 'source', 'pid', 'text', 'line_id'],
+                           defaults=(None,))
+
+EXPORT_FORMATS = ('json', 'ndjson', 'csv')
+
+
+def export_fields(record):
+    """JSON-ready dict of a HistoryRecord, with an ISO timestamp
+
+    line_id is only included for script captures.
+    """
+    fields = {
+        'timestamp': datetime.fromtimestamp(record.timestamp).isoformat(timespec='milliseconds'),
+        'source': record.source,
+        'pid': record.pid,
+        'text': record.text
+    }
+    if record.line_id is not None:
+        fields['line_id'] = record.line_id
+    return fields
+
+
+class LineLog:
+    """Append-only list of text lines packed into one UTF-8 buffer
+
+    A line costs its encoded bytes plus an 8-byte offset instead of a
+    Python str object, so hours of captured text stay small.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        # offsets[i]:offsets[i + 1] is line i
+        self.offsets = array('Q', [0])
+
+    def append(self, line):
+        self.data += line.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+    def text(self, start=0, stop=None):
+        """Lines start..stop joined back into one string"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return ""
+        return self.data[self.offsets[start]:self.offsets[stop]].decode('utf-8')
+
+    def clear(self):
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+
+
+class HistoryStore:
+    """Append-only log of captured text kept in columnar arrays
+
+    Timestamps, pids and interned source ids live in typed arrays and the
+    texts in one UTF-8 buffer, so a record costs a few dozen bytes plus its
+    text.  Exports stream record by record and never build the whole
+    document in memory.
+    """
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.pids = array('q')
+        self.source_ids = array('H')
+        self.sources = []
+        self.source_index = {}
+        self.texts = LineLog()
+        # Record index -> script line ID, for the records that have one
+        self.line_ids = {}
+
+    def append(self, text, source, pid=0, timestamp=None, line_id=None):
+        """Record a capture; returns its index"""
+        source_id = self.source_index.get(source)
+        if source_id is None:
+            source_id = self.source_index[source] = len(self.sources)
+            self.sources.append(source)
+
+        self.timestamps.append(time.time() if timestamp is None else timestamp)
+        self.pids.append(pid or 0)
+        self.source_ids.append(source_id)
+        self.texts.append(text)
+        if line_id is not None:
+            self.line_ids[len(self.timestamps) - 1] = line_id
+        return len(self.timestamps) - 1
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return HistoryRecord(self.timestamps[index], self.sources[self.source_ids[index]],
+                             self.pids[index], self.texts[index], self.line_ids.get(index))
+
+    def records(self, start=0, stop=None):
+        """Yield HistoryRecords start..stop in capture order"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self[index]
+
+    def format(self, index):
+        """Display line of one record, as shown in the capture panes"""
+        record = self[index]
+        timestamp = datetime.fromtimestamp(record.timestamp).strftime("%H:%M:%S")
+        source = record.source if record.line_id is None else f"{record.source} {record.line_id}"
+        return f"[{timestamp}][{source}] {record.text}\n"
+
+    def clear(self):
+        self.timestamps = array('d')
+        self.pids = array('q')
+        self.source_ids = array('H')
+        self.sources = []
+        self.source_index = {}
+        self.texts.clear()
+        self.line_ids = {}
+
+    def write_json(self, f):
+        """Write all records as one JSON array"""
+        f.write('[')
+        for index, record in enumerate(self.records()):
+            f.write(',\n  ' if index else '\n  ')
+            f.write(json.dumps(export_fields(record), ensure_ascii=False))
+        f.write('\n]\n' if len(self) else ']\n')
+
+    def write_ndjson(self, f):
+        """Write one JSON object per line"""
+        for record in self.records():
+            f.write(json.dumps(export_fields(record), ensure_ascii=False))
+            f.write('\n')
+
+    def write_csv(self, f):
+        """Write a header row and one row per record"""
+        writer = csv.writer(f)
+        writer.writerow(HistoryRecord._fields)
+        for record in self.records():
+            fields = export_fields(record)
+            writer.writerow([fields.get(name, '') for name in HistoryRecord._fields])
+
+    def export(self, filename, format=None):
+        """Export to a file; the format defaults to the file extension"""
+        if format is None:
+            format = os.path.splitext(filename)[1].lstrip('.').lower()
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {format}")
+
+        with open(filename, 'w', encoding='utf-8', newline='' if format == 'csv' else None) as f:
+            getattr(self, f"write_{format}")(f)
@@ -0,0 +1,80 @@
+import re
+
+
+# Unicode blocks that count as Japanese text, as (first, last) code points
+JAPANESE_BLOCKS = {
+    'punctuation': (0x3000, 0x303F),         # CJK symbols and punctuation: 、。「」
+    'hiragana': (0x3040, 0x309F),
+    'katakana': (0x30A0, 0x30FF),
+    'katakana_ext': (0x31F0, 0x31FF),        # small katakana for Ainu
+    'kanji_ext_a': (0x3400, 0x4DBF),
+    'kanji': (0x4E00, 0x9FFF),
+    'kanji_compat': (0xF900, 0xFAFF),
+    'halfwidth_katakana': (0xFF61, 0xFF9F),  # ｱｲｳ and halfwidth ｡｢｣､･
+    'kanji_ext_b_f': (0x20000, 0x2EBEF),
+}
+
+DEFAULT_BLOCKS = tuple(JAPANESE_BLOCKS)
+
+# The blocks nearly all game text is written in
+CORE_BLOCKS = ('punctuation', 'hiragana', 'katakana', 'kanji')
+
+# Blocks real text seldom uses but random bytes often decode into, so the
+# memory scanner only looks for them when asked to
+EXTRA_BLOCKS = tuple(block for block in JAPANESE_BLOCKS if block not in CORE_BLOCKS)
+
+
+def character_class(blocks=DEFAULT_BLOCKS):
+    """Regex character class matching any character of the given blocks"""
+    ranges = sorted(JAPANESE_BLOCKS[block] for block in blocks)
+    return '[' + ''.join(f'\\U{first:08X}-\\U{last:08X}' for first, last in ranges) + ']'
+
+
+class JapaneseClassifier:
+    """Japanese character tests backed by one precompiled character class
+
+    The regex engine scans in C, so a title with no Japanese in it costs one
+    search call instead of a Python loop over every character.
+    """
+
+    def __init__(self, blocks=DEFAULT_BLOCKS):
+        self.blocks = tuple(blocks)
+        char_class = character_class(self.blocks)
+        self.char_pattern = re.compile(char_class)
+        self.run_pattern = re.compile(char_class + '+')
+
+    def is_japanese(self, text):
+        """True if text contains at least one Japanese character"""
+        return bool(text) and self.char_pattern.search(text) is not None
+
+    def runs(self, text):
+        """Maximal runs of consecutive Japanese characters"""
+        return self.run_pattern.findall(text) if text else []
+
+    def japanese_ratio(self, text):
+        """Share of the characters of text that are Japanese (0.0 for empty text)"""
+        if not text:
+            return 0.0
+        return sum(map(len, self.run_pattern.findall(text))) / len(text)
+
+    def longest_run(self, text):
+        """Length of the longest run of consecutive Japanese characters"""
+        return max(map(len, self.runs(text)), default=0)
+
+    def filter_japanese(self, texts):
+        """The texts that contain Japanese, in order"""
+        search = self.char_pattern.search
+        return [text for text in texts if text and search(text)]
+
+    def ratios(self, texts):
+        """japanese_ratio of every text"""
+        return [self.japanese_ratio(text) for text in texts]
+
+
+_default = JapaneseClassifier()
+
+is_japanese = _default.is_japanese
+japanese_runs = _default.runs
+japanese_ratio = _default.japanese_ratio
+longest_japanese_run = _default.longest_run
+filter_japanese = _default.filter_japanese
@@ -0,0 +1,97 @@
+import time
+
+
+class LineAssembler:
+    """Joins the growing prefixes of a typewriter-revealed line into one line
+
+    Engines that reveal dialogue a character at a time are captured as
+    "こ", "こん", "こんに"...  Each stream (process, source label and the
+    stream id the source gave, such as the control the text was read from)
+    assembles one line at a time: a text extending that line replaces it,
+    and a text the line already starts with (a late capture of an earlier
+    frame) is dropped.  The line is released once it has not changed for
+    settle seconds, or at once when a text that does not continue it
+    arrives, since the next line has started.  A prefix of the line last
+    released is dropped too while it arrives within settle seconds of the
+    release; after that it is a new line that happens to repeat it.
+
+    With preview set, a line that has not changed for preview seconds is
+    also handed out early, once per text, so its translation can start
+    while the engine is still waiting for it to settle.
+    """
+
+    def __init__(self, settle=0.3, preview=None):
+        self.settle = settle
+        self.preview = preview
+        # (pid, source, stream) -> [record, time of the last change, previewed]
+        self.pending = {}
+        # (pid, source, stream) -> (the last line released, time it was released)
+        self.released = {}
+        self.merged = 0
+        self.dropped = 0
+        self.previews = 0
+
+    def add(self, record, now=None, stream=None):
+        """Take a record; returns the lines it releases (the previous line of its stream)"""
+        now = time.monotonic() if now is None else now
+        key = (record.pid, record.source, stream)
+        entry = self.pending.get(key)
+
+        if entry is not None:
+            text = entry[0].text
+            if record.text.startswith(text):
+                self.merged += 1
+                self.pending[key] = [record, now, False]
+                return []
+            if text.startswith(record.text):
+                self.dropped += 1
+                return []
+        elif key in self.released:
+            text, released_at = self.released[key]
+            if now - released_at < self.settle and text.startswith(record.text):
+                self.dropped += 1
+                return []
+
+        self.pending[key] = [record, now, False]
+        if entry is None:
+            return []
+        self.released[key] = (entry[0].text, now)
+        return [entry[0]]
+
+    def due(self, now=None):
+        """(lines that settled, lines to preview) as of now"""
+        now = time.monotonic() if now is None else now
+        settled = []
+        previews = []
+        for key, entry in list(self.pending.items()):
+            record, changed, previewed = entry
+            if now - changed >= self.settle:
+                settled.append(record)
+                self.released[key] = (record.text, now)
+                del self.pending[key]
+            elif self.preview is not None and not previewed and now - changed >= self.preview:
+                entry[2] = True
+                self.previews += 1
+                previews.append(record)
+        return settled, previews
+
+    def next_due(self):
+        """Monotonic time at which due() next has something, or None"""
+        times = []
+        for record, changed, previewed in self.pending.values():
+            times.append(changed + self.settle)
+            if self.preview is not None and not previewed:
+                times.append(changed + self.preview)
+        return min(times) if times else None
+
+    def flush(self, now=None):
+        """Release every line still being assembled"""
+        now = time.monotonic() if now is None else now
+        records = [entry[0] for entry in self.pending.values()]
+        for key, entry in self.pending.items():
+            self.released[key] = (entry[0].text, now)
+        self.pending.clear()
+        return records
+
+    def __len__(self):
+        return len(self.pending)
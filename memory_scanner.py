@@ -0,0 +1,627 @@
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+
+from dedup_cache import DedupCache
+from memory_source import BufferPool
+from metrics import SIZE_BUCKETS, registry
+from region_policy import RegionPolicy, RegionSchedule
+from text_scanner import BYTE_PATTERNS, JapaneseTextScanner
+
+
+PAGE_SIZE = 4096
+
+
+class ScanStats:
+    """Counters for a single memory scan pass"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.regions = 0
+        self.bytes_read = 0
+        self.pages_parsed = 0
+        self.pages_skipped = 0
+        self.texts_found = 0
+        self.read_failures = 0
+        # Regions the region policy left out, by reason
+        self.skipped = {}
+        self.regions_deferred = 0
+        self.hot_regions = 0
+
+    def finish(self, kind='full'):
+        """Record the pass duration, and the pass in the metrics registry
+
+        kind labels the metrics: 'full' for scans, 'pinned' for pin polls.
+        """
+        self.elapsed = time.perf_counter() - self.started
+        registry.histogram('memory_scan_seconds', "Duration of a memory scan pass",
+                           kind=kind).observe(self.elapsed)
+        registry.histogram('memory_scan_bytes', "Bytes read by a memory scan pass",
+                           buckets=SIZE_BUCKETS, kind=kind).observe(self.bytes_read)
+        registry.counter('memory_read_bytes_total', "Bytes read from process memory",
+                         kind=kind).inc(self.bytes_read)
+        registry.counter('memory_read_failures_total', "Region or pin reads that returned nothing",
+                         kind=kind).inc(self.read_failures)
+        registry.counter('memory_texts_total', "New texts found in process memory",
+                         kind=kind).inc(self.texts_found)
+        return self
+
+    def report(self):
+        """One-line summary for the status bar / console"""
+        total = self.pages_parsed + self.pages_skipped
+        skipped = self.pages_skipped / total if total else 0.0
+        return (f"Scan: {self.elapsed * 1000:.0f} ms, {self.regions} regions "
+                f"({self.hot_regions} hot, {self.regions_deferred} deferred, "
+                f"{sum(self.skipped.values())} filtered), "
+                f"{self.bytes_read / (1024 * 1024):.1f} MB, "
+                f"pages parsed {self.pages_parsed} / skipped {self.pages_skipped} "
+                f"({skipped:.0%}), {self.texts_found} new texts")
+
+
+class PageFingerprints:
+    """Per-page content hashes of a process, one array per memory region"""
+
+    def __init__(self, page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.regions = {}
+
+    def changed_spans(self, base, data, stats=None):
+        """Update the region's fingerprints and return the byte spans to re-parse
+
+        Each changed page is widened by one neighbouring page on either side
+        so text crossing a page boundary is always parsed in one piece;
+        overlapping windows are merged.
+        """
+        view = memoryview(data)
+        size = len(view)
+        page_size = self.page_size
+
+        fingerprints = array('L', [zlib.crc32(view[offset:offset + page_size])
+                                   for offset in range(0, size, page_size)])
+        previous = self.regions.get(base)
+        self.regions[base] = fingerprints
+
+        if previous is None or len(previous) != len(fingerprints):
+            # New or resized region: everything has to be parsed
+            dirty = range(len(fingerprints))
+        elif previous == fingerprints:
+            dirty = ()
+        else:
+            dirty = [page for page, (old, new) in enumerate(zip(previous, fingerprints))
+                     if old != new]
+
+        if stats is not None:
+            stats.pages_parsed += len(dirty)
+            stats.pages_skipped += len(fingerprints) - len(dirty)
+
+        spans = []
+        for page in dirty:
+            start = max(page - 1, 0) * page_size
+            end = min((page + 2) * page_size, size)
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = end
+            else:
+                spans.append([start, end])
+
+        return spans
+
+    def retain(self, bases):
+        """Forget regions that were not seen in the last full pass"""
+        for base in list(self.regions):
+            if base not in bases:
+                del self.regions[base]
+
+
+class PinnedAddress:
+    """A small window of process memory where text has appeared before"""
+
+    __slots__ = ('address', 'size', 'checksum')
+
+    def __init__(self, address, size):
+        self.address = address
+        self.size = size
+        self.checksum = None
+
+
+class PinnedAddresses:
+    """Addresses where new lines turned up, polled between full scans
+
+    Games usually rewrite dialogue into the same buffer, so once a line has
+    been found its address is worth re-reading on its own: a window of a
+    kilobyte instead of the whole process.  At most max_pins are
+    kept; the one that changed least recently is dropped first.
+    """
+
+    def __init__(self, max_pins=32, window=1024, burst=4, seen_size=65536):
+        self.max_pins = max_pins
+        self.window = window
+        # Changed spans with more fresh texts than this are not pinned
+        self.burst = burst
+        # address -> PinnedAddress, least recently changed first
+        self.pins = OrderedDict()
+        # Every text extracted so far, and the ones first seen on this pass.
+        # Much larger than the scanner's dedup cache: the memory noise that
+        # keeps turning up in changed pages must not look new.
+        self.seen = DedupCache(seen_size)
+        self.pass_texts = set()
+
+    def __len__(self):
+        return len(self.pins)
+
+    def __iter__(self):
+        return iter(list(self.pins.values()))
+
+    def start_pass(self):
+        self.pass_texts.clear()
+
+    def fresh(self, texts):
+        """The texts first seen on this pass
+
+        A line often has several copies (script, string object, text
+        buffer); each copy found on the pass the line first appeared counts.
+        """
+        fresh = []
+        for text in texts:
+            if self.seen.add(text):
+                self.pass_texts.add(text)
+                fresh.append(text)
+            elif text in self.pass_texts:
+                fresh.append(text)
+        return fresh
+
+    def covers(self, address):
+        return any(pin.address <= address < pin.address + pin.size for pin in self.pins.values())
+
+    def pin(self, address, region_end):
+        """Start polling the window at address; returns False if already covered"""
+        if not self.max_pins or self.covers(address):
+            return False
+
+        self.pins[address] = PinnedAddress(address, min(self.window, region_end - address))
+        while len(self.pins) > self.max_pins:
+            self.pins.popitem(last=False)
+        return True
+
+    def changed(self, pin, checksum):
+        """Record pin's new checksum; returns True if its bytes changed"""
+        if checksum == pin.checksum:
+            return False
+        if pin.checksum is not None:
+            self.pins.move_to_end(pin.address)
+        pin.checksum = checksum
+        return True
+
+    def unpin(self, pin):
+        self.pins.pop(pin.address, None)
+
+    def retain(self, regions):
+        """Drop pins outside the given (base, size) regions"""
+        for pin in list(self.pins.values()):
+            if not any(base <= pin.address < base + size for base, size in regions):
+                del self.pins[pin.address]
+
+
+def locate_text(data, text, encodings):
+    """Offset of text in data in the first of encodings that finds it, or -1"""
+    for encoding in encodings:
+        try:
+            encoded = text.encode(encoding)
+        except UnicodeEncodeError:
+            continue
+        offset = data.find(encoded)
+        if offset != -1:
+            return offset
+    return -1
+
+
+def region_spans(base, data, fingerprints=None, stats=None):
+    """Return the [start, end] byte spans of one region that have to be parsed"""
+    if stats is not None:
+        stats.regions += 1
+        stats.bytes_read += len(data)
+
+    if fingerprints is None:
+        if stats is not None:
+            stats.pages_parsed += (len(data) + PAGE_SIZE - 1) // PAGE_SIZE
+        return [[0, len(data)]]
+
+    return fingerprints.changed_spans(base, data, stats)
+
+
+def extract_region_text(extract, base, data, fingerprints=None, stats=None):
+    """Extract Japanese text from one region, only re-parsing changed pages
+
+    extract is the text extractor, e.g. AdvancedTextHooker.extract_japanese_text.
+    """
+    texts = []
+    for start, end in region_spans(base, data, fingerprints, stats):
+        texts.extend(extract(data[start:end]))
+    return texts
+
+
+_worker_scanner = None
+
+
+def _init_worker(patterns, script=None):
+    """Process pool initializer: build the scanner once per worker
+
+    With a script (a ScriptIndex) the workers match its lines instead.
+    """
+    global _worker_scanner
+    _worker_scanner = script if script is not None else JapaneseTextScanner(patterns)
+
+
+def _extract_shared(shm_name, pieces):
+    """Worker task: extract text from (offset, length, piece, lo, hi) parts of a shared block
+
+    Only text starting at byte offsets lo..hi of a part is kept.  Returns
+    (piece, texts) for every part, in order.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return [(piece, _worker_scanner.extract(bytes(shm.buf[offset:offset + length]), lo, hi))
+                for offset, length, piece, lo, hi in pieces]
+    finally:
+        shm.close()
+
+
+class ParallelExtractor:
+    """Extract text on a process pool, handing buffers over in shared memory"""
+
+    def __init__(self, workers, patterns=None, batch_bytes=256 * 1024 * 1024, script=None):
+        self.workers = workers
+        self.script = script
+        # Regions are buffered up to this size before being dispatched
+        self.batch_bytes = batch_bytes
+        # Shared block reused across batches; replaced only when too small
+        self.shm = None
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(patterns or BYTE_PATTERNS, script)
+        )
+
+    def shards(self, lengths):
+        """Group consecutive pieces into ordered shards of similar byte size
+
+        Pieces larger than a shard are split with one page of overlap so text
+        on the cut is still seen whole by one of the two shards.  Each part
+        is (offset, length, index of its piece, owned start, owned end): it
+        keeps only text starting at those offsets, and the owned ranges of
+        two parts meet halfway through their overlap, the same rule as the
+        scanner's windows, so a line on the cut comes out once and whole.
+        """
+        half = PAGE_SIZE // 2
+        total = sum(lengths)
+        shard_size = max(total // (self.workers * 4), 64 * 1024)
+        shards = [[]]
+        shard_bytes = 0
+        offset = 0
+
+        for index, length in enumerate(lengths):
+            start = offset
+            end = offset + length
+            while start < end:
+                piece_end = min(start + shard_size, end)
+                owned_start = half if start != offset else 0
+                owned_end = piece_end - start - (half if piece_end != end else 0)
+                shards[-1].append((start, piece_end - start, index, owned_start, owned_end))
+                shard_bytes += piece_end - start
+                if shard_bytes >= shard_size:
+                    shards.append([])
+                    shard_bytes = 0
+                if piece_end == end:
+                    break
+                start = piece_end - PAGE_SIZE
+            offset = end
+
+        return [shard for shard in shards if shard]
+
+    def extract(self, pieces):
+        """Extract text from bytes-like pieces; results keep the piece order"""
+        return [text for texts in self.extract_pieces(pieces) for text in texts]
+
+    def extract_pieces(self, pieces):
+        """Extract text from bytes-like pieces; returns one list of texts per piece"""
+        lengths = [len(piece) for piece in pieces]
+        total = sum(lengths)
+        found = [[] for _ in pieces]
+        if not total:
+            return found
+
+        if self.shm is None or self.shm.size < total:
+            self._release_shm()
+            self.shm = shared_memory.SharedMemory(create=True, size=total)
+
+        offset = 0
+        for piece, length in zip(pieces, lengths):
+            self.shm.buf[offset:offset + length] = piece
+            offset += length
+
+        # map() yields results in submission order, so the merge is deterministic
+        results = self.executor.map(_extract_shared, repeat(self.shm.name),
+                                    self.shards(lengths))
+        for parts in results:
+            for piece, texts in parts:
+                found[piece].extend(texts)
+        return found
+
+    def _release_shm(self):
+        """Close and remove the shared block"""
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.executor.shutdown(wait=True)
+        self._release_shm()
+
+
+class MemoryScanner:
+    """Memory text scanning pipeline over pluggable memory sources"""
+
+    def __init__(self, workers=1, region_policy=None, cold_interval=8, max_pins=32):
+        self.hooked_processes = {}
+        self.text_patterns = []
+        self.parallel = None
+        # Which regions are read at all, and how many passes apart regions
+        # that never produced text are read (1 = every pass)
+        self.region_policy = region_policy or RegionPolicy()
+        self.cold_interval = cold_interval
+        # Addresses of new lines polled by poll_pinned_text (0 = no pinning)
+        self.max_pins = max_pins
+        # ScriptIndex of known lines; when set, only its lines are reported
+        self.script = None
+        # Regions are read straight into pooled arenas; set to None to fall
+        # back to one bytes object per region read
+        self.buffer_pool = BufferPool()
+        self.load_patterns()
+        self.set_scan_workers(workers)
+
+    def load_patterns(self):
+        """Load common text patterns for Japanese visual novels"""
+        # (encoding, byte class, minimum run) entries used by the byte scanner
+        self.text_patterns = list(BYTE_PATTERNS)
+        self.scanner = JapaneseTextScanner(self.text_patterns)
+
+    def set_scan_workers(self, workers):
+        """Use a process pool of this many workers for text extraction (1 = in-process)"""
+        if self.parallel and self.parallel.workers == workers and self.parallel.script is self.script:
+            return
+
+        if self.parallel:
+            self.parallel.shutdown()
+            self.parallel = None
+
+        if workers > 1:
+            self.parallel = ParallelExtractor(workers, self.text_patterns, script=self.script)
+
+    def set_script(self, script):
+        """Report only the lines of a ScriptIndex (None: any Japanese text)"""
+        self.script = script
+        if self.parallel:
+            self.set_scan_workers(self.parallel.workers)
+
+    def close(self):
+        """Detach all sources and stop the worker pool"""
+        for pid in list(self.hooked_processes):
+            self.detach_source(pid)
+        self.set_scan_workers(1)
+
+    def attach_source(self, pid, source):
+        """Start tracking a process through a MemorySource"""
+        self.hooked_processes[pid] = {
+            'source': source,
+            'text_addresses': PinnedAddresses(self.max_pins),
+            'last_texts': DedupCache(500),
+            'page_fingerprints': PageFingerprints(),
+            'region_schedule': RegionSchedule(self.cold_interval),
+            'scan_stats': None,
+            'poll_stats': None
+        }
+
+    def detach_source(self, pid):
+        """Stop tracking a process and close its source"""
+        process = self.hooked_processes.pop(pid, None)
+        if process:
+            process['source'].close()
+
+    def read_process_memory(self, pid, address, size):
+        """Read memory from a process"""
+        if pid not in self.hooked_processes:
+            return None
+
+        return self.hooked_processes[pid]['source'].read(address, size)
+
+    def read_region(self, pid, region):
+        """Read a region into the buffer pool; returns a memoryview or None"""
+        if self.buffer_pool is None:
+            return self.read_process_memory(pid, region.base, region.size)
+
+        view = self.buffer_pool.acquire(region.size)
+        bytes_read = self.hooked_processes[pid]['source'].read_into(region.base, view)
+        if not bytes_read:
+            return None
+        return view[:bytes_read]
+
+    def scan_memory_for_text(self, pid, incremental=True):
+        """Scan process memory for Japanese text
+
+        Only regions the region policy accepts are read: regions that have
+        produced text first, the rest on the region schedule's slower
+        cadence.  In incremental mode only pages whose fingerprint changed
+        since the previous read are parsed again.  The addresses of new
+        lines that appear in a region read before are pinned for
+        poll_pinned_text.
+        """
+        if pid not in self.hooked_processes:
+            return []
+
+        process = self.hooked_processes[pid]
+        fingerprints = process['page_fingerprints'] if incremental else None
+        schedule = process['region_schedule']
+        schedule.cold_interval = self.cold_interval
+        stats = ScanStats()
+        found_texts = []
+        process['text_addresses'].start_pass()
+
+        regions = list(self.region_policy.select(process['source'].regions(), stats.skipped))
+        planned, stats.regions_deferred = schedule.plan(regions)
+
+        # (region, offset, span, region read before) pieces waiting for the
+        # process pool, and the pooled bytes they pin
+        pending = []
+        buffered_bytes = 0
+
+        for region in planned:
+            # Read memory region
+            data = self.read_region(pid, region)
+            # Text showing up in a region read before was written there
+            # since, so its address is worth pinning
+            known = region.base in schedule.next_scan
+            schedule.scanned(region.base)
+
+            if not data:
+                stats.read_failures += 1
+            else:
+                if self.parallel:
+                    # Queue the spans to parse; extraction happens in batches
+                    view = memoryview(data)
+                    for start, end in region_spans(region.base, data, fingerprints, stats):
+                        pending.append((region, start, view[start:end], known))
+                    buffered_bytes += len(data)
+
+                    if buffered_bytes >= self.parallel.batch_bytes:
+                        self._extract_pending(process, pending, found_texts)
+                        pending = []
+                        buffered_bytes = 0
+                        self._reset_buffers()
+                else:
+                    # Search for text patterns
+                    count = 0
+                    for start, end in region_spans(region.base, data, fingerprints, stats):
+                        piece = data[start:end]
+                        texts = self.extract_japanese_text(piece)
+                        count += len(texts)
+                        self._remember_texts(process, texts, found_texts)
+                        self._pin_texts(process, region, start, piece, texts, known)
+                    schedule.found(region.base, count)
+
+            if not pending:
+                buffered_bytes = 0
+                self._reset_buffers()
+
+        if pending:
+            self._extract_pending(process, pending, found_texts)
+            self._reset_buffers()
+
+        # Deferred regions keep their fingerprints and history
+        bases = {region.base for region in regions}
+        if fingerprints is not None:
+            fingerprints.retain(bases)
+        schedule.retain(bases)
+        process['text_addresses'].retain([(region.base, region.size) for region in regions])
+
+        stats.hot_regions = schedule.hot_count()
+        stats.texts_found = len(found_texts)
+        process['scan_stats'] = stats.finish()
+        registry.gauge('memory_pinned_addresses', "Addresses polled between full scans").set(
+            len(process['text_addresses']))
+
+        return found_texts
+
+    def _extract_pending(self, process, pending, found_texts):
+        """Run queued (region, offset, span, known) pieces through the process pool"""
+        results = self.parallel.extract_pieces([piece for _, _, piece, _ in pending])
+        for (region, offset, piece, known), texts in zip(pending, results):
+            process['region_schedule'].found(region.base, len(texts))
+            self._remember_texts(process, texts, found_texts)
+            self._pin_texts(process, region, offset, piece, texts, known)
+
+    def _pin_texts(self, process, region, offset, piece, texts, known):
+        """Pin the addresses of never-seen texts of piece, which starts at offset in region
+
+        Only regions read before (known) are pinned: text there was written
+        since the last read.  A dialogue buffer changes a line at a time, so
+        a span with more fresh texts than the burst limit is reshuffled
+        heap and is not pinned.
+        """
+        pins = process['text_addresses']
+        if not pins.max_pins:
+            return
+        fresh = pins.fresh(texts)
+        if not known or not fresh or len(fresh) > pins.burst:
+            return
+
+        raw = bytes(piece)
+        encodings = [encoding for encoding, _, _ in self.text_patterns]
+        for text in fresh:
+            position = locate_text(raw, text, encodings)
+            if position != -1:
+                pins.pin(region.base + offset + position, region.base + region.size)
+
+    def poll_pinned_text(self, pid):
+        """Re-read only the pinned addresses; returns the new texts found there
+
+        A pin that can no longer be read is dropped.  Full scans still have
+        to run now and then to find new addresses.
+        """
+        if pid not in self.hooked_processes:
+            return []
+
+        process = self.hooked_processes[pid]
+        pins = process['text_addresses']
+        source = process['source']
+        stats = ScanStats()
+        found_texts = []
+
+        for pin in pins:
+            data = source.read(pin.address, pin.size)
+            if not data:
+                stats.read_failures += 1
+                pins.unpin(pin)
+                continue
+
+            stats.regions += 1
+            stats.bytes_read += len(data)
+            if pins.changed(pin, zlib.crc32(data)):
+                stats.pages_parsed += 1
+                texts = self.extract_japanese_text(data)
+                # Known to the pins from now on, so the next full scan does
+                # not pin and report them again
+                pins.fresh(texts)
+                self._remember_texts(process, texts, found_texts)
+            else:
+                stats.pages_skipped += 1
+
+        stats.texts_found = len(found_texts)
+        process['poll_stats'] = stats.finish('pinned')
+
+        return found_texts
+
+    def _reset_buffers(self):
+        """Reuse the pooled region buffers once nothing refers to them"""
+        if self.buffer_pool is not None:
+            self.buffer_pool.reset()
+
+    def _remember_texts(self, process, texts, found_texts):
+        """Append texts not seen recently to found_texts, in order; returns them"""
+        last_texts = process['last_texts']
+        new_texts = [text for text in texts if last_texts.add(text)]
+        found_texts.extend(new_texts)
+        return new_texts
+
+    def extract_japanese_text(self, data):
+        """Extract Japanese text from binary data"""
+        # Candidate runs are located in the raw bytes and only those spans
+        # are decoded, instead of decoding the whole region per encoding
+        if self.script is not None:
+            return self.script.extract(data)
+        return self.scanner.extract(data)
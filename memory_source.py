@@ -0,0 +1,340 @@
+import ctypes
+import ctypes.wintypes
+import mmap
+import os
+from collections import namedtuple
+from ctypes import Structure, c_void_p
+
+
+# Win32 memory constants (winnt.h); used by every source so the scan
+# pipeline can filter regions the same way on any platform
+MEM_COMMIT = 0x1000
+MEM_PRIVATE = 0x20000
+MEM_MAPPED = 0x40000
+MEM_IMAGE = 0x1000000
+
+PAGE_NOACCESS = 0x01
+PAGE_READONLY = 0x02
+PAGE_READWRITE = 0x04
+PAGE_WRITECOPY = 0x08
+PAGE_EXECUTE = 0x10
+PAGE_EXECUTE_READ = 0x20
+PAGE_EXECUTE_READWRITE = 0x40
+PAGE_EXECUTE_WRITECOPY = 0x80
+
+# Modifier bits combined with one of the protections above
+PAGE_GUARD = 0x100
+PAGE_NOCACHE = 0x200
+PAGE_WRITECOMBINE = 0x400
+
+PROCESS_QUERY_INFORMATION = 0x0400
+PROCESS_VM_READ = 0x0010
+
+
+MemoryRegion = namedtuple('MemoryRegion', ['base', 'size', 'protect', 'type'])
+
+
+class MemorySource:
+    """Region enumeration and bulk reads for one process"""
+
+    def regions(self):
+        """Yield a MemoryRegion for every committed region"""
+        raise NotImplementedError
+
+    def read(self, address, size):
+        """Read size bytes at address; returns bytes or None on failure"""
+        raise NotImplementedError
+
+    def read_into(self, address, buffer):
+        """Read len(buffer) bytes at address straight into a writable buffer
+
+        Returns the number of bytes read (0 on failure).  Sources override
+        this to avoid the intermediate bytes object read() creates.
+        """
+        data = self.read(address, len(buffer))
+        if not data:
+            return 0
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        """Release OS handles"""
+        pass
+
+
+class BufferPool:
+    """Reusable bytearray arenas that memory regions are read straight into
+
+    Views are carved out of the arenas bump-pointer style and all handed back
+    at once with reset(), so once the pool is warm a scan pass allocates no
+    region buffers at all.
+    """
+
+    def __init__(self, arena_size=16 * 1024 * 1024):
+        # Smallest arena allocated; regions larger than this get their own
+        self.arena_size = arena_size
+        self.arenas = []
+        self.current = 0
+        self.offset = 0
+        self.arenas_allocated = 0
+        self.acquired = 0
+
+    def acquire(self, size):
+        """Return a writable memoryview of exactly size bytes"""
+        self.acquired += 1
+
+        while self.current < len(self.arenas):
+            arena = self.arenas[self.current]
+            if self.offset + size <= len(arena):
+                view = memoryview(arena)[self.offset:self.offset + size]
+                self.offset += size
+                return view
+            self.current += 1
+            self.offset = 0
+
+        arena = bytearray(max(size, self.arena_size))
+        self.arenas.append(arena)
+        self.arenas_allocated += 1
+        self.offset = size
+        return memoryview(arena)[:size]
+
+    def reset(self):
+        """Hand back every view; their memory is reused by the next acquire calls"""
+        self.current = 0
+        self.offset = 0
+
+    def arena_bytes(self):
+        """Total memory held by the pool"""
+        return sum(len(arena) for arena in self.arenas)
+
+
+# Windows API structures
+class MEMORY_BASIC_INFORMATION(Structure):
+    _fields_ = [
+        ("BaseAddress", c_void_p),
+        ("AllocationBase", c_void_p),
+        ("AllocationProtect", ctypes.wintypes.DWORD),
+        ("RegionSize", ctypes.c_size_t),
+        ("State", ctypes.wintypes.DWORD),
+        ("Protect", ctypes.wintypes.DWORD),
+        ("Type", ctypes.wintypes.DWORD)
+    ]
+
+
+class SYSTEM_INFO(Structure):
+    _fields_ = [
+        ("wProcessorArchitecture", ctypes.wintypes.WORD),
+        ("wReserved", ctypes.wintypes.WORD),
+        ("dwPageSize", ctypes.wintypes.DWORD),
+        ("lpMinimumApplicationAddress", c_void_p),
+        ("lpMaximumApplicationAddress", c_void_p),
+        ("dwActiveProcessorMask", c_void_p),
+        ("dwNumberOfProcessors", ctypes.wintypes.DWORD),
+        ("dwProcessorType", ctypes.wintypes.DWORD),
+        ("dwAllocationGranularity", ctypes.wintypes.DWORD),
+        ("wProcessorLevel", ctypes.wintypes.WORD),
+        ("wProcessorRevision", ctypes.wintypes.WORD)
+    ]
+
+
+class Win32MemorySource(MemorySource):
+    """VirtualQueryEx / ReadProcessMemory on a Windows process"""
+
+    def __init__(self, pid):
+        from ctypes import windll
+
+        self.pid = pid
+        self.kernel32 = windll.kernel32
+        self.handle = self.kernel32.OpenProcess(
+            PROCESS_VM_READ | PROCESS_QUERY_INFORMATION,
+            False,
+            pid
+        )
+
+        if not self.handle:
+            raise ctypes.WinError()
+
+    def regions(self):
+        # Get system info for memory scanning
+        system_info = SYSTEM_INFO()
+        self.kernel32.GetSystemInfo(ctypes.byref(system_info))
+
+        current_address = system_info.lpMinimumApplicationAddress or 0
+        max_address = system_info.lpMaximumApplicationAddress
+        memory_info = MEMORY_BASIC_INFORMATION()
+
+        while current_address < max_address:
+            # Query memory region
+            result = self.kernel32.VirtualQueryEx(
+                self.handle,
+                ctypes.c_void_p(current_address),
+                ctypes.byref(memory_info),
+                ctypes.sizeof(memory_info)
+            )
+
+            if result == 0:
+                break
+
+            if memory_info.State == MEM_COMMIT:
+                yield MemoryRegion(current_address, memory_info.RegionSize,
+                                   memory_info.Protect, memory_info.Type)
+
+            current_address += memory_info.RegionSize
+
+    def read(self, address, size):
+        buffer = ctypes.create_string_buffer(size)
+        bytes_read = ctypes.c_size_t()
+
+        result = self.kernel32.ReadProcessMemory(
+            self.handle,
+            ctypes.c_void_p(address),
+            buffer,
+            size,
+            ctypes.byref(bytes_read)
+        )
+
+        if result:
+            return buffer.raw[:bytes_read.value]
+        return None
+
+    def read_into(self, address, buffer):
+        target = (ctypes.c_char * len(buffer)).from_buffer(buffer)
+        bytes_read = ctypes.c_size_t()
+
+        result = self.kernel32.ReadProcessMemory(
+            self.handle,
+            ctypes.c_void_p(address),
+            target,
+            len(buffer),
+            ctypes.byref(bytes_read)
+        )
+
+        if result:
+            return bytes_read.value
+        return 0
+
+    def close(self):
+        if self.handle:
+            self.kernel32.CloseHandle(self.handle)
+            self.handle = None
+
+
+class LinuxMemorySource(MemorySource):
+    """/proc/<pid>/maps enumeration and /proc/<pid>/mem reads
+
+    Reading another process needs ptrace permission (same user with
+    kernel.yama.ptrace_scope=0, or CAP_SYS_PTRACE).
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.maps_path = f"/proc/{pid}/maps"
+        self.fd = os.open(f"/proc/{pid}/mem", os.O_RDONLY)
+
+    def regions(self):
+        with open(self.maps_path, 'r') as f:
+            entries = [line.split(None, 5) for line in f]
+
+        # Files mapped with execute permission anywhere are loaded images
+        images = {entry[5].strip() for entry in entries
+                  if len(entry) == 6 and 'x' in entry[1]}
+
+        for entry in entries:
+            start, end = (int(value, 16) for value in entry[0].split('-'))
+            perms = entry[1]
+            path = entry[5].strip() if len(entry) == 6 else ''
+
+            if perms[0] != 'r':
+                protect = PAGE_NOACCESS
+            elif 'x' in perms:
+                protect = PAGE_EXECUTE_READWRITE if perms[1] == 'w' else PAGE_EXECUTE_READ
+            else:
+                protect = PAGE_READWRITE if perms[1] == 'w' else PAGE_READONLY
+
+            if path.startswith('/'):
+                region_type = MEM_IMAGE if path in images else MEM_MAPPED
+            else:
+                region_type = MEM_PRIVATE
+
+            yield MemoryRegion(start, end - start, protect, region_type)
+
+    def read(self, address, size):
+        buffer = bytearray(size)
+        try:
+            bytes_read = os.preadv(self.fd, [buffer], address)
+        except (OSError, OverflowError):
+            return None
+
+        if bytes_read == size:
+            return bytes(buffer)
+        return bytes(buffer[:bytes_read]) or None
+
+    def read_into(self, address, buffer):
+        try:
+            return os.preadv(self.fd, [buffer], address)
+        except (OSError, OverflowError):
+            return 0
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FakeMemorySource(MemorySource):
+    """In-memory regions, or a raw dump file mapped in as consecutive regions"""
+
+    def __init__(self, regions=None, protect=PAGE_READWRITE, region_type=MEM_PRIVATE, attributes=None):
+        # base address -> bytes-like region contents
+        self.memory = dict(regions or {})
+        self.protect = protect
+        self.region_type = region_type
+        # base address -> (protect, type) of regions that differ from the defaults
+        self.attributes = dict(attributes or {})
+        self.mapped_file = None
+
+    @classmethod
+    def from_file(cls, path, region_size=1024 * 1024, base=0x10000):
+        """Map a memory dump file and split it into fixed-size regions"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(mapped)
+        source = cls({base + offset: view[offset:offset + region_size]
+                      for offset in range(0, len(mapped), region_size)})
+        source.mapped_file = mapped
+        return source
+
+    def regions(self):
+        for base in sorted(self.memory):
+            protect, region_type = self.attributes.get(base, (self.protect, self.region_type))
+            yield MemoryRegion(base, len(self.memory[base]), protect, region_type)
+
+    def read(self, address, size):
+        for base, data in self.memory.items():
+            if base <= address < base + len(data):
+                offset = address - base
+                return bytes(data[offset:offset + size])
+        return None
+
+    def read_into(self, address, buffer):
+        for base, data in self.memory.items():
+            if base <= address < base + len(data):
+                offset = address - base
+                chunk = memoryview(data)[offset:offset + len(buffer)]
+                buffer[:len(chunk)] = chunk
+                return len(chunk)
+        return 0
+
+    def close(self):
+        if self.mapped_file is not None:
+            self.memory.clear()
+            self.mapped_file.close()
+            self.mapped_file = None
+
+
+def open_memory_source(pid):
+    """Native MemorySource for pid on this platform"""
+    if os.name == 'nt':
+        return Win32MemorySource(pid)
+    return LinuxMemorySource(pid)
@@ -0,0 +1,262 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(4 ** exponent * 1024 for exponent in range(12))   # 1 KB .. 4 GB
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+class Counter:
+    """Monotonic count, e.g. bytes read or failed reads"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+    def sample(self):
+        return {'value': self.value}
+
+
+class Gauge:
+    """Value that goes up and down, e.g. queue depth or pinned addresses"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        """A gauge is a current level, not a total; it keeps its value"""
+
+    def sample(self):
+        return {'value': self.value}
+
+
+class Histogram:
+    """Distribution over fixed buckets, with count, sum, min and max
+
+    observe() is a bisect and a few additions under a lock, so it can stay
+    on for every scan pass, capture and API call.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the overflow (+Inf) bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.min = None
+            self.max = None
+
+    def quantile(self, q):
+        """Estimate of the q quantile: the upper bound of the bucket it falls in"""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            total = 0
+            for bound, count in zip(self.buckets, self.counts):
+                total += count
+                if total >= rank:
+                    return min(bound, self.max)
+            return self.max
+
+    def sample(self):
+        with self.lock:
+            counts = list(self.counts)
+            count, total, low, high = self.count, self.sum, self.min, self.max
+        return {
+            'count': count,
+            'sum': total,
+            'min': low,
+            'max': high,
+            'mean': total / count if count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], counts))
+        }
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms, exportable as JSON or Prometheus text
+
+    Metrics are created on first use and looked up by name and labels, so
+    instrumented code just asks for the metric it records into.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def _get(self, cls, name, help_text, labels, **options):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = self.metrics[key] = cls(name, help_text, dict(key[1]), **options)
+        return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", **labels):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    @contextmanager
+    def timer(self, name, help_text="", **labels):
+        """Time the with block into a seconds histogram"""
+        histogram = self.histogram(name, help_text, **labels)
+        started = time.perf_counter()
+        try:
+            yield histogram
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    def reset(self):
+        """Zero every metric in place
+
+        Instrumented code may hold on to a metric object, so the metrics
+        themselves stay registered.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+            self.started = time.time()
+        for metric in metrics:
+            metric.reset()
+
+    def snapshot(self):
+        """Every metric as plain data, sorted by name"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        metrics.sort(key=lambda metric: (metric.name, sorted(metric.labels.items())))
+        return {
+            'started': self.started,
+            'uptime': time.time() - self.started,
+            'metrics': [{'name': metric.name, 'type': metric.kind, 'help': metric.help,
+                         'labels': metric.labels, **metric.sample()} for metric in metrics]
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        described = set()
+        for entry in self.snapshot()['metrics']:
+            name = entry['name']
+            if name not in described:
+                described.add(name)
+                if entry['help']:
+                    lines.append(f"# HELP {name} {entry['help']}")
+                lines.append(f"# TYPE {name} {entry['type']}")
+
+            labels = entry['labels']
+            if entry['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in entry['buckets'].items():
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {entry['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {entry['count']}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {entry['value']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to path: Prometheus text for .prom/.txt, JSON otherwise"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def report(self):
+        """Readable multi-line summary for the stats panel"""
+        lines = []
+        for entry in self.snapshot()['metrics']:
+            label = entry['name'] + format_labels(entry['labels'])
+            if entry['type'] != 'histogram':
+                lines.append(f"{label:50} {format_value(entry['name'], entry['value'])}")
+            elif entry['count']:
+                lines.append(f"{label:50} n={entry['count']} "
+                             f"mean={format_value(entry['name'], entry['mean'])} "
+                             f"p50={format_value(entry['name'], entry['p50'])} "
+                             f"p95={format_value(entry['name'], entry['p95'])} "
+                             f"max={format_value(entry['name'], entry['max'])}")
+        return '\n'.join(lines)
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def format_value(name, value):
+    """Seconds as ms, bytes as MB, anything else as is"""
+    if value is None:
+        return '-'
+    if name.endswith('_seconds'):
+        return f"{value * 1000:.2f}ms"
+    if name.endswith('_bytes') or name.endswith('_bytes_total'):
+        return f"{value / (1024 * 1024):.1f}MB"
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+# Process-wide registry the engines record into
+registry = MetricsRegistry()
@@ -1,21 +1,17 @@
-import ctypes
-import ctypes.wintypes
 import win32api
 import win32con
-import win32gui
-import win32process
-import psutil
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
-import threading
-import queue
-import time
 import json
 import os
 from datetime import datetime
-import google.generativeai as genai
-import asyncio
-import aiohttp
+
+from capture_engine import CallbackSink, CaptureEngine, JournalSink
+from capture_journal import CaptureJournal
+from translation_cache import TranslationCache
+from translation_index import TranslationIndex
+from translators import BACKENDS, create_translator
+from window_capture import capture_window_text, find_windows
 
 
 class OverlayWindow:
@@ -150,16 +146,24 @@ class OverlayWindow:
             self.translate_text()
 
     def translate_text(self):
-        """Translate text using Gemini API"""
+        """Translate text with the configured backend"""
         text = self.text_display.get(1.0, tk.END).strip()
         if not text:
             return
 
         if self.parent_callback:
+            # Cached translations come back right away, others later through
+            # show_translation
             translation = self.parent_callback('translate', text)
             if translation:
-                self.translation_display.delete(1.0, tk.END)
-                self.translation_display.insert(1.0, translation)
+                self.show_translation(text, translation)
+
+    def show_translation(self, text, translation):
+        """Display the translation of text, unless the overlay moved on to another line"""
+        if not translation or text != self.text_display.get(1.0, tk.END).strip():
+            return
+        self.translation_display.delete(1.0, tk.END)
+        self.translation_display.insert(1.0, translation)
 
     def copy_text(self):
         """Copy both original and translation to clipboard"""
@@ -212,69 +216,51 @@ class OverlayWindow:
         self.root.destroy()
 
 
-class GeminiTranslator:
-    """Gemini API translator"""
-
-    def __init__(self, api_key=None):
-        self.api_key = api_key
-        self.model = None
-        self.initialized = False
-
-    def initialize(self, api_key):
-        """Initialize Gemini API"""
-        try:
-            self.api_key = api_key
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-            self.initialized = True
-            return True
-        except Exception as e:
-            print(f"Failed to initialize Gemini: {e}")
-            return False
-
-    def translate(self, text, target_language="English"):
-        """Translate text using Gemini"""
-        if not self.initialized or not self.model:
-            return None
-
-        try:
-            prompt = f"""Translate the following Japanese text to {target_language}.
-            Provide only the translation without any additional explanation or notes.
-            If the text contains character names or dialogue, preserve the format.
-
-            Text: {text}"""
-
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return f"Translation error: {str(e)}"
-
-
 class OverlayTextHooker:
     """Main application with overlay support"""
 
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Japanese Text Hooker with Overlay")
-        self.root.geometry("1000x650")
+        self.root.geometry("1000x720")
 
         # Components
         self.hooker = TextHookerCore()
-        self.translator = GeminiTranslator()
+        self.translation_cache = TranslationCache()
+        self.journal = CaptureJournal()
         self.overlay = None
-        self.monitor_thread = None
         self.selected_window = None
 
         # Settings
         self.load_settings()
 
+        # Translation backend chosen in the settings
+        self.translator = create_translator(self.settings)
+
+        # Lines translated ahead of time (python -m pretranslate), looked up
+        # before the cache and the API
+        self.translation_index = TranslationIndex.open(self.settings['translation_index'])
+
+        # Translations run off the Tk thread; created with the translation
+        # stack on first use (see submit_translation)
+        self.translation_worker = None
+        # Translation started early for a line still being revealed
+        self.speculation = None
+        # (text, target_language, model, translation) of the last speculative
+        # translation; it only goes into the cache once the line settles on it
+        self.speculated = None
+
         # Setup UI
         self.setup_ui()
 
         # Create overlay
         self.create_overlay()
 
+        # Auto-translate will need the backend soon; connect once the window
+        # is up rather than on the first captured line
+        if self.translator.initialized and self.settings['auto_translate']:
+            self.root.after(1000, self.translator.preload)
+
     def load_settings(self):
         """Load settings from file"""
         self.settings_file = "settings.json"
@@ -283,6 +269,16 @@ class OverlayTextHooker:
             'auto_translate': False,
             'overlay_enabled': True,
             'target_language': 'English',
+            'translation_concurrency': 2,
+            'translation_index': 'pretranslated.db',
+            'translation_backend': 'gemini',
+            'gemini_model': 'gemini-pro',
+            'local_url': 'http://127.0.0.1:8080',
+            'local_api': 'openai',
+            'local_model': 'local',
+            'glossary_file': 'glossary.tsv',
+            'line_settle_time': 0.3,
+            'speculative_translation': True,
             'overlay_position': None
         }
 
@@ -298,10 +294,6 @@ class OverlayTextHooker:
                 with open(self.settings_file, 'r') as f:
                     saved = json.load(f)
                     self.settings.update(saved)
-
-                # Initialize translator if API key exists
-                if self.settings['gemini_api_key']:
-                    self.translator.initialize(self.settings['gemini_api_key'])
             except:
                 pass
 
@@ -405,6 +397,36 @@ class OverlayTextHooker:
         self.refresh_windows()
 
     def setup_settings_tab(self, parent):
+        # Translation backend
+        backend_frame = ttk.LabelFrame(parent, text="Translation Backend", padding="10")
+        backend_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(backend_frame, text="Backend:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        self.backend_var = tk.StringVar(value=BACKENDS[self.settings['translation_backend']])
+        backend_combo = ttk.Combobox(backend_frame, textvariable=self.backend_var, width=47,
+                                     state="readonly")
+        backend_combo['values'] = tuple(BACKENDS.values())
+        backend_combo.grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Button(backend_frame, text="Test", command=self.test_api, width=10).grid(row=0, column=3, padx=5)
+
+        # Local server: URL, protocol and model
+        ttk.Label(backend_frame, text="Local server:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        self.local_url_var = tk.StringVar(value=self.settings['local_url'])
+        ttk.Entry(backend_frame, textvariable=self.local_url_var, width=50).grid(row=1, column=1, padx=5, pady=2)
+        self.local_api_var = tk.StringVar(value=self.settings['local_api'])
+        local_api_combo = ttk.Combobox(backend_frame, textvariable=self.local_api_var, width=14,
+                                       state="readonly")
+        local_api_combo['values'] = ('openai', 'libretranslate')
+        local_api_combo.grid(row=1, column=2, padx=5, pady=2)
+        self.local_model_var = tk.StringVar(value=self.settings['local_model'])
+        ttk.Entry(backend_frame, textvariable=self.local_model_var, width=12).grid(row=1, column=3, padx=5, pady=2)
+
+        # Glossary file
+        ttk.Label(backend_frame, text="Glossary:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.glossary_var = tk.StringVar(value=self.settings['glossary_file'])
+        ttk.Entry(backend_frame, textvariable=self.glossary_var, width=50).grid(row=2, column=1, padx=5, pady=2)
+        ttk.Button(backend_frame, text="Browse...", command=self.browse_glossary).grid(row=2, column=2, padx=5)
+
         # API Settings
         api_frame = ttk.LabelFrame(parent, text="Gemini API Settings", padding="10")
         api_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -427,9 +449,6 @@ class OverlayTextHooker:
         show_btn = ttk.Button(api_frame, text="Show", command=toggle_api_visibility, width=8)
         show_btn.grid(row=0, column=2, padx=5)
 
-        # Test API button
-        ttk.Button(api_frame, text="Test API", command=self.test_api, width=10).grid(row=0, column=3, padx=5)
-
         # Target language
         ttk.Label(api_frame, text="Target Language:").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.target_lang_var = tk.StringVar(value=self.settings['target_language'])
@@ -453,6 +472,46 @@ class OverlayTextHooker:
         ttk.Checkbutton(trans_frame, text="Translate character names",
                        variable=self.translate_names).pack(anchor=tk.W, pady=2)
 
+        # Concurrent translation requests
+        concurrency_frame = ttk.Frame(trans_frame)
+        concurrency_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(concurrency_frame, text="Concurrent requests:").pack(side=tk.LEFT)
+        self.concurrency_var = tk.IntVar(value=self.settings['translation_concurrency'])
+        ttk.Spinbox(concurrency_frame, from_=1, to=8, width=5,
+                   textvariable=self.concurrency_var).pack(side=tk.LEFT, padx=5)
+
+        # Lines revealed a character at a time (applies from the next capture)
+        settle_frame = ttk.Frame(trans_frame)
+        settle_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(settle_frame, text="Typewriter text settles after (s, 0 = off):").pack(side=tk.LEFT)
+        self.settle_var = tk.DoubleVar(value=self.settings['line_settle_time'])
+        ttk.Spinbox(settle_frame, from_=0.0, to=2.0, increment=0.05, width=5,
+                   textvariable=self.settle_var).pack(side=tk.LEFT, padx=5)
+
+        self.speculative_var = tk.BooleanVar(value=self.settings['speculative_translation'])
+        ttk.Checkbutton(trans_frame, text="Start translating typewriter lines before they settle",
+                       variable=self.speculative_var).pack(anchor=tk.W, pady=2)
+
+        # Translation cache
+        cache_frame = ttk.Frame(trans_frame)
+        cache_frame.pack(fill=tk.X, pady=(5, 0))
+
+        self.cache_label = ttk.Label(cache_frame, text=self.translation_cache.report())
+        self.cache_label.pack(side=tk.LEFT)
+        ttk.Button(cache_frame, text="Clear Cache",
+                  command=self.clear_translation_cache).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(cache_frame, text="Refresh",
+                  command=self.update_cache_stats).pack(side=tk.RIGHT, padx=5)
+
+        # Pre-translated lines
+        index_frame = ttk.Frame(trans_frame)
+        index_frame.pack(fill=tk.X, pady=(5, 0))
+
+        self.index_label = ttk.Label(index_frame, text=self.index_report())
+        self.index_label.pack(side=tk.LEFT)
+        ttk.Button(index_frame, text="Open Index...",
+                  command=self.open_translation_index).pack(side=tk.RIGHT, padx=5)
+
         # Overlay Settings
         overlay_frame = ttk.LabelFrame(parent, text="Overlay Settings", padding="10")
         overlay_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -491,11 +550,19 @@ class OverlayTextHooker:
     def overlay_callback(self, action, data):
         """Handle overlay callbacks"""
         if action == 'translate':
-            if self.translator.initialized:
-                return self.translator.translate(data, self.target_lang_var.get())
+            target_language = self.target_lang_var.get()
+            translation = self.lookup_translation(data, target_language)
+            if translation is not None:
+                return translation
+            elif self.translator.initialized:
+                self.submit_translation(
+                    data, target_language,
+                    lambda text, translation: self.root.after(
+                        0, self.overlay.show_translation, text, translation))
+                return None
             else:
-                messagebox.showwarning("API Not Configured",
-                                      "Please configure Gemini API key in Settings")
+                messagebox.showwarning("Translator Not Configured",
+                                      "Please configure the translation backend in Settings")
                 return None
         elif action == 'settings':
             # Switch to settings tab
@@ -538,24 +605,20 @@ class OverlayTextHooker:
         if self.hooker.hook_process(self.selected_window['pid']):
             self.update_status(f"Hooked to: {self.selected_window['title']}")
 
-        # Start monitoring
-        self.monitor_thread = threading.Thread(
-            target=self.monitor_loop,
-            daemon=True
-        )
-        self.monitor_thread.start()
+        # Typewriter lines are delivered once they settle; with speculative
+        # translation they are previewed after a third of the settle time
+        settle = self.settings['line_settle_time'] or None
+        preview = settle / 3 if settle and self.settings['speculative_translation'] else None
 
-        self.update_status(f"Capturing from: {self.selected_window['title']}")
+        # Start monitoring; new lines go to the displays and the journal
+        self.hooker.start_monitoring(
+            self.selected_window['hwnd'], self.selected_window['pid'],
+            [CallbackSink(lambda record: self.add_captured_text(record.text),
+                          lambda record: self.preview_captured_text(record.text)),
+             JournalSink(self.journal)],
+            settle=settle, preview=preview)
 
-    def monitor_loop(self):
-        """Monitor loop for capturing text"""
-        while self.hooker.running:
-            if self.selected_window:
-                texts = self.hooker.capture_text(self.selected_window['hwnd'])
-                for source, text in texts:
-                    if self.hooker._is_japanese(text):
-                        self.add_captured_text(text)
-            time.sleep(0.1)
+        self.update_status(f"Capturing from: {self.selected_window['title']}")
 
     def add_captured_text(self, text):
         """Add captured text to displays"""
@@ -566,18 +629,148 @@ class OverlayTextHooker:
         if self.overlay and self.overlay_enabled.get():
             self.root.after(0, lambda: self.overlay.update_text(text))
 
+    def preview_captured_text(self, text):
+        """A line still being revealed; start translating it early"""
+        self.root.after(0, self._speculate, text)
+
+    def _speculate(self, text):
+        """Translate a previewed line ahead of time (must be called from main thread)
+
+        The result only warms the cache; the settled line is submitted by
+        _add_text_to_display and joins this request if it is still running.
+        A preview of a longer text supersedes the previous one.
+        """
+        if not self.auto_translate.get():
+            return
+        if self.translation_worker:
+            self.translation_worker.cancel(self.speculation)
+        self.speculation = self.submit_translation(text, self.target_lang_var.get(),
+                                                   lambda text, translation: None,
+                                                   speculative=True)
+
     def _add_text_to_display(self, text):
         """Add text to main display"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.text_display.insert(tk.END, f"[{timestamp}] {text}\n")
         self.text_display.see(tk.END)
 
+        # A translation started for a prefix of this line is not needed
+        if self.speculation is not None:
+            if self.speculation.text != text:
+                self.translation_worker.cancel(self.speculation)
+            self.speculation = None
+
         # Auto-translate if enabled
-        if self.auto_translate.get() and self.translator.initialized:
-            translation = self.translator.translate(text, self.target_lang_var.get())
-            if translation:
-                self.translation_display.insert(tk.END, f"[{timestamp}] {translation}\n")
-                self.translation_display.see(tk.END)
+        if self.auto_translate.get():
+            target_language = self.target_lang_var.get()
+
+            def deliver(text, translation):
+                if translation:
+                    self.keep_speculated(text, target_language)
+                    self.journal.record_translation(text, translation, target_language)
+                self.root.after(0, self._add_translation_to_display, translation, f"[{timestamp}] ")
+
+            self.submit_translation(text, target_language, deliver)
+
+    def _add_translation_to_display(self, translation, prefix=""):
+        """Append a finished translation (must be called from main thread)"""
+        if translation:
+            self.translation_display.insert(tk.END, f"{prefix}{translation}\n")
+            self.translation_display.see(tk.END)
+
+    def submit_translation(self, text, target_language, callback, speculative=False):
+        """Queue a translation on the worker, creating the worker on first use
+
+        callback(text, translation) runs on a worker thread.  Returns the
+        request, for TranslationWorker.cancel().
+        """
+        if self.translation_worker is None:
+            from translation_worker import TranslationWorker
+            self.translation_worker = TranslationWorker(
+                self.translate, concurrency=self.settings['translation_concurrency'],
+                translate_batch=self.translate_batch, speculate=self.speculate)
+        return self.translation_worker.submit(text, target_language, callback, speculative)
+
+    def lookup_translation(self, text, target_language):
+        """Translation from the pre-translated index, the cache or the last speculation, or None"""
+        if self.translation_index is not None:
+            translation = self.translation_index.get(text, target_language)
+            if translation is not None:
+                return translation
+        model = self.translator.model_name
+        speculated = self.speculated
+        if speculated is not None and speculated[:3] == (text, target_language, model):
+            return speculated[3]
+        return self.translation_cache.get(text, target_language, model)
+
+    def speculate(self, text, target_language):
+        """Translate a line that may still change, keeping the result out of the cache
+
+        Runs on translation worker threads; keep_speculated() caches it
+        once the settled line turns out to be this text.
+        """
+        translator = self.translator
+
+        translation = self.lookup_translation(text, target_language)
+        if translation is not None or not translator.initialized:
+            return translation
+
+        translation = translator.translate(text, target_language)
+        if translation and translator.cacheable:
+            self.speculated = (text, target_language, translator.model_name, translation)
+        return translation
+
+    def keep_speculated(self, text, target_language):
+        """Cache the last speculative translation if it was for this settled line"""
+        speculated = self.speculated
+        if speculated is not None and speculated[:2] == (text, target_language):
+            self.speculated = None
+            self.translation_cache.put(*speculated)
+
+    def translate(self, text, target_language):
+        """Translate text, answering from the index or the cache when possible
+
+        Runs on translation worker threads; must not touch Tk.
+        """
+        # The settings tab may switch backends meanwhile
+        translator = self.translator
+
+        translation = self.lookup_translation(text, target_language)
+        if translation is not None or not translator.initialized:
+            return translation
+
+        translation = translator.translate(text, target_language)
+        if translation and translator.cacheable:
+            self.translation_cache.put(text, target_language, translator.model_name, translation)
+        return translation
+
+    def translate_batch(self, texts, target_language):
+        """Translate several lines with one backend call for the uncached ones
+
+        Returns None if the batch reply was unusable; the worker then falls
+        back to translate() per line.  Runs on translation worker threads.
+        """
+        translator = self.translator
+        translations = [self.lookup_translation(text, target_language) for text in texts]
+        missing = [index for index, translation in enumerate(translations)
+                   if translation is None]
+        if not missing or not translator.initialized:
+            return translations
+
+        if len(missing) == 1:
+            translations[missing[0]] = self.translate(texts[missing[0]], target_language)
+            return translations
+
+        batch = translator.translate_batch([texts[index] for index in missing], target_language)
+        if batch is None:
+            return None
+
+        for index, translation in zip(missing, batch):
+            translations[index] = translation
+            if translation and translator.cacheable:
+                self.translation_cache.put(texts[index], target_language, translator.model_name,
+                                           translation)
+        return translations
 
     def translate_selected(self):
         """Translate selected text"""
@@ -586,11 +779,11 @@ class OverlayTextHooker:
         except:
             selected = self.text_display.get(1.0, tk.END)
 
-        if selected.strip() and self.translator.initialized:
-            translation = self.translator.translate(selected, self.target_lang_var.get())
-            if translation:
-                self.translation_display.insert(tk.END, f"\n{translation}\n")
-                self.translation_display.see(tk.END)
+        if selected.strip():
+            self.submit_translation(
+                selected, self.target_lang_var.get(),
+                lambda text, translation: self.root.after(
+                    0, self._add_translation_to_display, translation, "\n"))
 
     def stop_capture(self):
         """Stop capturing"""
@@ -599,21 +792,86 @@ class OverlayTextHooker:
             self.hooker.unhook_process(self.selected_window['pid'])
         self.update_status("Capture stopped")
 
+    def backend_settings(self):
+        """Translation backend settings as entered in the settings tab"""
+        names = {label: name for name, label in BACKENDS.items()}
+        return {
+            'translation_backend': names[self.backend_var.get()],
+            'gemini_api_key': self.api_key_var.get(),
+            'local_url': self.local_url_var.get(),
+            'local_api': self.local_api_var.get(),
+            'local_model': self.local_model_var.get(),
+            'glossary_file': self.glossary_var.get()
+        }
+
+    def apply_translator(self):
+        """Switch to the backend in the settings; the old one is closed"""
+        previous, self.translator = self.translator, create_translator(self.settings)
+        previous.close()
+
+    def browse_glossary(self):
+        """Pick the glossary file of the glossary backend"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Glossary", "*.tsv *.txt *.json"), ("All files", "*.*")])
+        if filename:
+            self.glossary_var.set(filename)
+
     def test_api(self):
-        """Test Gemini API"""
-        api_key = self.api_key_var.get()
-        if not api_key:
+        """Translate a test line with the backend as entered in the settings tab"""
+        settings = {**self.settings, **self.backend_settings()}
+        if settings['translation_backend'] == 'gemini' and not settings['gemini_api_key']:
             messagebox.showwarning("No API Key", "Please enter an API key")
             return
 
-        if self.translator.initialize(api_key):
-            test_result = self.translator.translate("こんにちは", "English")
-            if test_result and "error" not in test_result.lower():
-                messagebox.showinfo("Success", f"API test successful!\nTest translation: こんにちは → {test_result}")
-            else:
-                messagebox.showerror("Failed", "API test failed. Please check your API key.")
+        translator = create_translator(settings)
+        try:
+            if not translator.initialized:
+                messagebox.showerror("Failed", f"Failed to set up the translation backend.\n\n"
+                                               f"{translator.last_error}")
+                return
+            test_result = translator.translate("こんにちは", "English")
+        finally:
+            translator.close()
+
+        if test_result:
+            messagebox.showinfo("Success", f"Backend test successful!\nTest translation: こんにちは → {test_result}")
         else:
-            messagebox.showerror("Failed", "Failed to initialize API. Please check your API key.")
+            messagebox.showerror("Failed", f"Backend test failed. Please check the settings.\n\n"
+                                           f"{translator.last_error or 'No translation'}")
+
+    def update_cache_stats(self):
+        """Show the translation cache and index counters in the settings tab"""
+        self.cache_label.config(text=self.translation_cache.report())
+        self.index_label.config(text=self.index_report())
+
+    def index_report(self):
+        if self.translation_index is None:
+            return "Pre-translated: no index (build one with python -m pretranslate)"
+        return self.translation_index.report()
+
+    def open_translation_index(self):
+        """Switch to another pre-translated index file"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Translation index", "*.db"), ("All files", "*.*")])
+        if not filename:
+            return
+
+        index = TranslationIndex.open(filename)
+        if index is None:
+            messagebox.showerror("Failed", f"Cannot open translation index {filename}")
+            return
+
+        previous, self.translation_index = self.translation_index, index
+        if previous is not None:
+            previous.close()
+        self.settings['translation_index'] = filename
+        self.update_cache_stats()
+
+    def clear_translation_cache(self):
+        """Drop all cached translations"""
+        if messagebox.askyesno("Clear Cache", "Delete all cached translations?"):
+            self.translation_cache.clear()
+            self.update_cache_stats()
 
     def save_all_settings(self):
         """Save all settings"""
@@ -621,10 +879,15 @@ class OverlayTextHooker:
         self.settings['auto_translate'] = self.auto_translate.get()
         self.settings['overlay_enabled'] = self.overlay_enabled.get()
         self.settings['target_language'] = self.target_lang_var.get()
+        self.settings['translation_concurrency'] = self.concurrency_var.get()
+        self.settings['line_settle_time'] = self.settle_var.get()
+        self.settings['speculative_translation'] = self.speculative_var.get()
+        if self.translation_worker:
+            self.translation_worker.set_concurrency(self.settings['translation_concurrency'])
 
-        # Initialize translator with new API key
-        if self.settings['gemini_api_key']:
-            self.translator.initialize(self.settings['gemini_api_key'])
+        # Switch backends (or API keys) for the rest of the session
+        self.settings.update(self.backend_settings())
+        self.apply_translator()
 
         self.save_settings()
         messagebox.showinfo("Saved", "Settings saved successfully")
@@ -637,12 +900,33 @@ class OverlayTextHooker:
                 'auto_translate': False,
                 'overlay_enabled': True,
                 'target_language': 'English',
+                'translation_concurrency': 2,
+                'translation_index': 'pretranslated.db',
+                'translation_backend': 'gemini',
+                'gemini_model': 'gemini-pro',
+                'local_url': 'http://127.0.0.1:8080',
+                'local_api': 'openai',
+                'local_model': 'local',
+                'glossary_file': 'glossary.tsv',
+                'line_settle_time': 0.3,
+                'speculative_translation': True,
                 'overlay_position': None
             }
             self.api_key_var.set('')
+            self.backend_var.set(BACKENDS['gemini'])
+            self.local_url_var.set(self.settings['local_url'])
+            self.local_api_var.set(self.settings['local_api'])
+            self.local_model_var.set(self.settings['local_model'])
+            self.glossary_var.set(self.settings['glossary_file'])
             self.auto_translate.set(False)
             self.overlay_enabled.set(True)
             self.target_lang_var.set('English')
+            self.concurrency_var.set(2)
+            self.settle_var.set(self.settings['line_settle_time'])
+            self.speculative_var.set(True)
+            if self.translation_worker:
+                self.translation_worker.set_concurrency(2)
+            self.apply_translator()
             self.save_settings()
 
     def copy_all(self):
@@ -691,6 +975,14 @@ class OverlayTextHooker:
         """Handle window closing"""
         if self.overlay:
             self.overlay.destroy()
+        self.hooker.stop_monitoring(wait=True)
+        if self.translation_worker:
+            self.translation_worker.stop()
+        self.translator.close()
+        self.translation_cache.close()
+        if self.translation_index is not None:
+            self.translation_index.close()
+        self.journal.close()
         self.root.destroy()
 
 
@@ -700,30 +992,12 @@ class TextHookerCore:
     def __init__(self):
         self.hooked_processes = {}
         self.running = False
+        # CaptureEngine of the running capture
+        self.engine = None
 
     def find_game_windows(self):
         """Find all visible windows"""
-        windows = []
-
-        def enum_callback(hwnd, windows):
-            if win32gui.IsWindowVisible(hwnd):
-                title = win32gui.GetWindowText(hwnd)
-                if title:
-                    try:
-                        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                        process = psutil.Process(pid)
-                        windows.append({
-                            'hwnd': hwnd,
-                            'title': title,
-                            'pid': pid,
-                            'process_name': process.name()
-                        })
-                    except:
-                        pass
-            return True
-
-        win32gui.EnumWindows(enum_callback, windows)
-        return windows
+        return find_windows()
 
     def hook_process(self, pid):
         """Hook a process"""
@@ -733,8 +1007,7 @@ class TextHookerCore:
         try:
             handle = win32api.OpenProcess(win32con.PROCESS_ALL_ACCESS, False, pid)
             self.hooked_processes[pid] = {
-                'handle': handle,
-                'last_texts': set()
+                'handle': handle
             }
             self.running = True
             return True
@@ -753,60 +1026,25 @@ class TextHookerCore:
 
     def capture_text(self, hwnd):
         """Capture text from window"""
-        texts = []
+        return capture_window_text(hwnd)
 
-        # Get window text
-        try:
-            text = win32gui.GetWindowText(hwnd)
-            if text:
-                texts.append(('Window', text))
-        except:
-            pass
-
-        # Get text using WM_GETTEXT
-        try:
-            length = win32gui.SendMessage(hwnd, win32con.WM_GETTEXTLENGTH, 0, 0)
-            if length > 0:
-                buffer = ctypes.create_unicode_buffer(length + 1)
-                win32gui.SendMessage(hwnd, win32con.WM_GETTEXT, length + 1, buffer)
-                if buffer.value:
-                    texts.append(('WM_GETTEXT', buffer.value))
-        except:
-            pass
-
-        # Enumerate child windows
-        def enum_child(child_hwnd, texts):
-            try:
-                child_text = win32gui.GetWindowText(child_hwnd)
-                if child_text and self._is_japanese(child_text):
-                    texts.append(('Child', child_text))
-            except:
-                pass
-            return True
-
-        try:
-            win32gui.EnumChildWindows(hwnd, enum_child, texts)
-        except:
-            pass
-
-        return texts
-
-    def _is_japanese(self, text):
-        """Check if text contains Japanese"""
-        if not text:
-            return False
+    def start_monitoring(self, hwnd, pid=0, sinks=(), **options):
+        """Capture new Japanese text from a window into the given sinks
 
-        for char in text:
-            code = ord(char)
-            if (0x3040 <= code <= 0x309F) or \
-               (0x30A0 <= code <= 0x30FF) or \
-               (0x4E00 <= code <= 0x9FAF):
-                return True
-        return False
+        The window is re-read on change notifications, or every 100 ms when
+        WinEvent hooks are unavailable.  options go to the CaptureEngine
+        (settle and preview for typewriter text).
+        """
+        self.stop_monitoring()
+        self.running = True
+        self.engine = CaptureEngine.for_window(hwnd, pid, sinks, **options)
 
-    def stop_monitoring(self):
-        """Stop monitoring"""
+    def stop_monitoring(self, wait=False):
+        """Stop monitoring; with wait, block until the last captures are delivered"""
         self.running = False
+        if self.engine:
+            self.engine.stop(wait)
+            self.engine = None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import registry
+from translation_cache import normalize_text
+from translation_client import TokenBucket
+from translation_index import TranslationIndex
+
+
+def load_corpus(path):
+    """Lines of a script (one per line, or ID<TAB>text) or of a captured
+    NDJSON session (.ndjson, .ndjson.gz, .jsonl: the text of every entry)"""
+    if path.endswith(('.ndjson', '.ndjson.gz', '.jsonl')):
+        from capture_journal import read_journal
+        return [entry['text'] for entry in read_journal(path) if entry.get('text')]
+
+    from script_index import read_script
+    return [text for _, text in read_script(path)]
+
+
+def corpus_texts(lines, min_length=1, japanese_only=True):
+    """Normalized, distinct lines worth translating, in first-seen order"""
+    from japanese_classifier import is_japanese
+
+    texts = {}
+    for line in lines:
+        text = normalize_text(line)
+        if len(text) >= min_length and (not japanese_only or is_japanese(text)):
+            texts[text] = None
+    return list(texts)
+
+
+def make_batches(texts, max_batch=20, max_batch_chars=2000):
+    """Split texts into batches of at most max_batch lines and about max_batch_chars characters"""
+    batches = []
+    batch = []
+    chars = 0
+    for text in texts:
+        if batch and (len(batch) >= max_batch or chars + len(text) > max_batch_chars):
+            batches.append(batch)
+            batch = []
+            chars = 0
+        batch.append(text)
+        chars += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class Pretranslator:
+    """Translates a corpus ahead of time into a TranslationIndex
+
+    Lines already in the index are skipped, so an interrupted run resumes
+    where it stopped.  Batches go through translator.translate_batch on
+    concurrency threads, never more than per_minute requests a minute;
+    leave per_minute out for a translator that limits its own requests,
+    like GeminiTranslator, or both limits apply to every request.  A
+    failed batch is retried up to retries times with exponential backoff,
+    then split in half, down to single lines; a line that still fails is
+    left out of the index and counted in failed.  Results are written as
+    batches finish.
+    """
+
+    def __init__(self, translator, index, target_language="English", concurrency=4,
+                 per_minute=None, retries=3, backoff=1.0, max_batch=20, max_batch_chars=2000):
+        self.translator = translator
+        self.index = index
+        self.target_language = target_language
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(per_minute / 60.0) if per_minute else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_batch = max_batch
+        self.max_batch_chars = max_batch_chars
+        self.random = random.Random()
+        self.requests = 0
+        self.retried = 0
+        self.splits = 0
+        self.translated = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def run(self, texts, progress=None):
+        """Translate the normalized texts missing from the index
+
+        progress(done, total) is called after every batch.
+        """
+        todo = self.index.missing(texts, self.target_language)
+        self.skipped += len(texts) - len(todo)
+        batches = make_batches(todo, self.max_batch, self.max_batch_chars)
+        model = self.translator.model_name
+        done = 0
+
+        executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='pretranslate')
+        futures = {executor.submit(self.translate_batch, batch): batch for batch in batches}
+        try:
+            for future in as_completed(futures):
+                pairs = future.result()
+                self.index.put_many(pairs, self.target_language, model)
+                self.translated += len(pairs)
+                self.failed += len(futures[future]) - len(pairs)
+                done += len(futures[future])
+                if progress:
+                    progress(done, len(todo))
+        finally:
+            # On Ctrl+C only the requests already in flight are waited for
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+        return self.stats()
+
+    def translate_batch(self, texts):
+        """(text, translation) pairs for the texts that could be translated"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                # Full jitter, so threads that failed together do not retry together
+                time.sleep(self.random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            if self.limiter:
+                self.limiter.acquire()
+            self.requests += 1
+            try:
+                with registry.timer('pretranslate_request_seconds',
+                                    "Duration of a pre-translation batch request"):
+                    translations = self.translator.translate_batch(texts, self.target_language)
+            except Exception as e:
+                print(f"Batch translation error: {e}", file=sys.stderr)
+                translations = None
+            if translations is not None and len(translations) == len(texts):
+                return [(text, translation) for text, translation in zip(texts, translations)
+                        if translation]
+
+        if len(texts) == 1:
+            return []
+        # A batch the model keeps answering badly is often one awkward line
+        self.splits += 1
+        middle = len(texts) // 2
+        return self.translate_batch(texts[:middle]) + self.translate_batch(texts[middle:])
+
+    def stats(self):
+        return {
+            'translated': self.translated,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'requests': self.requests,
+            'retries': self.retried,
+            'splits': self.splits,
+            'entries': len(self.index)
+        }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m pretranslate',
+        description="Translate a script or captured session ahead of time into a lookup index")
+    parser.add_argument('corpus', nargs='+',
+                        help="script files (one line per line, or ID<TAB>text) "
+                             "or captured sessions (.ndjson, .ndjson.gz)")
+    parser.add_argument('-o', '--output', default='pretranslated.db', help="index file to fill")
+    parser.add_argument('--target', default='English', help="target language")
+    parser.add_argument('--backend', choices=('gemini', 'local', 'glossary'),
+                        help="translation backend (default: the one saved in settings.json)")
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'),
+                        help="Gemini API key (default: $GEMINI_API_KEY, then settings.json)")
+    parser.add_argument('--model', help="Gemini model, or the model of the local server")
+    parser.add_argument('--local-url', help="local server, e.g. http://127.0.0.1:8080")
+    parser.add_argument('--local-api', choices=('openai', 'libretranslate'))
+    parser.add_argument('--glossary', help="glossary file for the glossary backend")
+    parser.add_argument('--stub', type=float, metavar='LATENCY',
+                        help="use the offline stub translator with this latency (for testing)")
+    parser.add_argument('--concurrency', type=int, default=4, help="requests in flight")
+    parser.add_argument('--rpm', type=float,
+                        help="at most this many requests a minute (default: 60 for Gemini, else no limit)")
+    parser.add_argument('--retries', type=int, default=3, help="attempts per batch before splitting it")
+    parser.add_argument('--max-batch', type=int, default=20, help="lines per request")
+    parser.add_argument('--min-length', type=int, default=1)
+    parser.add_argument('--all-text', action='store_true', help="keep lines without Japanese")
+    args = parser.parse_args(argv)
+
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    lines = []
+    for path in args.corpus:
+        try:
+            lines.extend(load_corpus(path))
+        except OSError as e:
+            parser.error(f"cannot read {path}: {e}")
+    texts = corpus_texts(lines, args.min_length, not args.all_text)
+
+    if args.stub is not None:
+        from benchmarks import StubTranslator
+        translator = StubTranslator(args.stub)
+    else:
+        from translators import create_translator
+
+        # The overlay's saved backend, with the options given here on top
+        settings = {}
+        if os.path.exists('settings.json'):
+            with open('settings.json') as f:
+                settings = json.load(f)
+        backend = args.backend or settings.get('translation_backend', 'gemini')
+        model_setting = 'gemini_model' if backend == 'gemini' else 'local_model'
+        for key, value in (('translation_backend', backend), ('gemini_api_key', args.api_key),
+                           ('gemini_requests_per_minute', args.rpm), (model_setting, args.model),
+                           ('local_url', args.local_url), ('local_api', args.local_api),
+                           ('glossary_file', args.glossary)):
+            if value:
+                settings[key] = value
+
+        translator = create_translator(settings)
+        if not translator.initialized:
+            if backend == 'gemini':
+                parser.error("no API key; give --api-key, set GEMINI_API_KEY or save one in the overlay")
+            parser.error(f"cannot use the {backend} backend: {translator.last_error}")
+
+    # Gemini's client already keeps to gemini_requests_per_minute (--rpm,
+    # else the saved setting); the other backends are limited here
+    rpm = None if getattr(translator, 'name', None) == 'gemini' else args.rpm
+    index = TranslationIndex(args.output, writable=True)
+    pretranslator = Pretranslator(translator, index, args.target, args.concurrency, rpm,
+                                  args.retries, max_batch=args.max_batch)
+    print(f"{len(lines)} lines, {len(texts)} distinct, into {args.output}", file=sys.stderr)
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    try:
+        pretranslator.run(texts, progress)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(file=sys.stderr)
+        index.close()
+
+    print(json.dumps(pretranslator.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import zlib
+
+from memory_source import (
+    MEM_IMAGE, MEM_MAPPED, MEM_PRIVATE,
+    PAGE_EXECUTE_READ, PAGE_EXECUTE_READWRITE, PAGE_EXECUTE_WRITECOPY,
+    PAGE_GUARD, PAGE_NOACCESS, PAGE_NOCACHE, PAGE_READONLY, PAGE_READWRITE,
+    PAGE_WRITECOMBINE, PAGE_WRITECOPY,
+)
+
+
+PAGE_SIZE = 4096
+
+REGION_TYPES = {'private': MEM_PRIVATE, 'mapped': MEM_MAPPED, 'image': MEM_IMAGE}
+
+# Base protections (the low byte of Protect) by what they allow
+READABLE = {PAGE_READONLY, PAGE_READWRITE, PAGE_WRITECOPY,
+            PAGE_EXECUTE_READ, PAGE_EXECUTE_READWRITE, PAGE_EXECUTE_WRITECOPY}
+WRITABLE = {PAGE_READWRITE, PAGE_WRITECOPY, PAGE_EXECUTE_READWRITE, PAGE_EXECUTE_WRITECOPY}
+EXECUTABLE = {PAGE_EXECUTE_READ, PAGE_EXECUTE_READWRITE, PAGE_EXECUTE_WRITECOPY}
+
+# Thread stack guards are a few pages; larger no-access regions are reservations
+MAX_GUARD_SIZE = 64 * 1024
+
+
+class RegionPolicy:
+    """Decides which committed regions a memory scan reads
+
+    A region must be readable, writable unless read_only is set (text that
+    changes at runtime has to be written somewhere), and not executable
+    unless executable is set.  PAGE_WRITECOPY counts as writable: it is
+    image or mapped data nobody has written to yet, which can still hold
+    the script.  Guard pages are never read, since a read consumes the
+    guard and breaks the owning thread's stack growth.  No-cache and
+    write-combined memory (device and GPU staging buffers) is never read
+    either, because reading it is very slow.  A private region right above
+    a guard page is a thread stack and is skipped unless stacks is set.
+    """
+
+    def __init__(self, types=('private', 'mapped', 'image'), min_size=PAGE_SIZE,
+                 max_size=256 * 1024 * 1024, read_only=False, executable=False, stacks=False):
+        self.types = 0
+        for name in types:
+            self.types |= REGION_TYPES[name]
+        self.min_size = min_size
+        self.max_size = max_size
+        self.read_only = read_only
+        self.executable = executable
+        self.stacks = stacks
+
+    def reason(self, region, previous=None):
+        """Why region is skipped ('guard', 'uncached', 'protection', 'type',
+        'size' or 'stack'), or None if it is scanned
+
+        previous is the region just below it, for stack detection.
+        """
+        protect = region.protect
+        base_protect = protect & 0xFF
+
+        if protect & PAGE_GUARD:
+            return 'guard'
+        if protect & (PAGE_NOCACHE | PAGE_WRITECOMBINE):
+            return 'uncached'
+        if (base_protect not in READABLE
+                or (not self.read_only and base_protect not in WRITABLE)
+                or (not self.executable and base_protect in EXECUTABLE)):
+            return 'protection'
+        if not region.type & self.types:
+            return 'type'
+        if region.size < self.min_size or (self.max_size and region.size > self.max_size):
+            return 'size'
+        if not self.stacks and region.type == MEM_PRIVATE and is_stack_guard(previous, region):
+            return 'stack'
+        return None
+
+    def select(self, regions, skipped=None):
+        """Yield the regions to scan, in address order
+
+        skipped, if given, is a dict counting the other regions by reason.
+        """
+        previous = None
+        for region in regions:
+            reason = self.reason(region, previous)
+            previous = region
+            if reason is None:
+                yield region
+            elif skipped is not None:
+                skipped[reason] = skipped.get(reason, 0) + 1
+
+
+def is_stack_guard(previous, region):
+    """True if previous is a guard page directly below region
+
+    Windows marks stack guards PAGE_GUARD; Linux leaves a small no-access
+    mapping below each thread stack.
+    """
+    return (previous is not None
+            and previous.base + previous.size == region.base
+            and previous.size <= MAX_GUARD_SIZE
+            and bool(previous.protect & PAGE_GUARD or previous.protect & 0xFF == PAGE_NOACCESS))
+
+
+class RegionSchedule:
+    """Per-process scan order and cadence, learned from where text turned up
+
+    A region that produced text within the last hot_passes passes is hot.
+    Hot regions are read on every pass, the most productive first.  A
+    region never read before is read on the next pass so it can be
+    classified.  Every other region is cold and is read once every
+    cold_interval passes, staggered by a hash of the address so the cold
+    regions do not all come due on the same pass.  With cold_interval=1
+    every region is read on every pass.
+    """
+
+    def __init__(self, cold_interval=8, hot_passes=120):
+        self.cold_interval = cold_interval
+        self.hot_passes = hot_passes
+        self.passes = 0
+        # base -> texts found there so far, pass of the last find, pass a
+        # cold region is next due
+        self.hits = {}
+        self.last_hit = {}
+        self.next_scan = {}
+
+    def is_hot(self, base):
+        last_hit = self.last_hit.get(base)
+        return last_hit is not None and self.passes - last_hit < self.hot_passes
+
+    def plan(self, regions):
+        """Start a pass; returns (regions to read in order, number deferred)"""
+        self.passes += 1
+        hot = []
+        due = []
+        deferred = 0
+
+        for region in regions:
+            if self.is_hot(region.base):
+                hot.append(region)
+            elif self.next_scan.get(region.base, 0) <= self.passes:
+                due.append(region)
+            else:
+                deferred += 1
+
+        hot.sort(key=lambda region: self.hits[region.base], reverse=True)
+        return hot + due, deferred
+
+    def scanned(self, base):
+        """Record that base was read on this pass"""
+        if base in self.next_scan:
+            self.next_scan[base] = self.passes + max(1, self.cold_interval)
+        else:
+            # Hash the base: regions are often aligned to a power of two, so
+            # the address itself would put most of them on the same pass
+            stagger = zlib.crc32(base.to_bytes(8, 'little')) % max(1, self.cold_interval)
+            self.next_scan[base] = self.passes + 1 + stagger
+
+    def found(self, base, count):
+        """Record count texts extracted from base on this pass"""
+        if count:
+            self.hits[base] = self.hits.get(base, 0) + count
+            self.last_hit[base] = self.passes
+
+    def hot_count(self):
+        return sum(1 for base in self.last_hit if self.is_hot(base))
+
+    def retain(self, bases):
+        """Forget regions that no longer exist"""
+        for table in (self.hits, self.last_hit, self.next_scan):
+            for base in list(table):
+                if base not in bases:
+                    del table[base]
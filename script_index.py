@@ -0,0 +1,131 @@
+import re
+
+from text_scanner import BYTE_PATTERNS, JapaneseTextScanner
+
+
+class ScriptIndex:
+    """Known script lines, looked up directly in the scanner's candidate spans
+
+    The candidate spans of the byte scanner's mask are decoded as usual,
+    but the runs cut from them use the script's own alphabet instead of
+    every kana and kanji, and only the script lines inside a run are
+    reported: the whole run if it is one (a dict lookup), else every line
+    found in it, looked up by its first min_length characters.  A line
+    stored right next to other Japanese text (a name tag, the previous
+    line, stale bytes) is still found.  Memory noise that decodes to stray
+    kanji almost never spells a whole line, so none of it comes out; lines
+    with punctuation outside the generic Japanese class (！, ？, Ａ) are no
+    longer cut in two.
+    """
+
+    def __init__(self, lines, patterns=None, min_length=2, context=64):
+        if patterns is None:
+            patterns = BYTE_PATTERNS
+        # Line ID -> text; IDs are whatever the script uses, line numbers by default
+        self.lines = {}
+        # Text -> first line ID with that text
+        self.ids = {}
+        for line_id, text in lines:
+            text = text.strip()
+            if len(text) >= min_length and text not in self.ids:
+                self.lines[line_id] = text
+                self.ids[text] = line_id
+
+        # First min_length characters -> the lines starting with them, longest first
+        self.heads = {}
+        for text in sorted(self.ids, key=len, reverse=True):
+            self.heads.setdefault(text[:min_length], []).append(text)
+
+        self.min_length = min_length
+        # Spans are widened by this many bytes (even, for UTF-16) so a line
+        # starting or ending with characters outside the byte class is whole
+        self.context = context
+        self.scanner = JapaneseTextScanner(patterns)
+
+        alphabet = set(''.join(self.ids)) - {'\n'}
+        char_class = ''.join(sorted(re.escape(char) for char in alphabet))
+        self.run_pattern = re.compile(f'[{char_class}]{{{min_length},}}') if alphabet else None
+
+    @classmethod
+    def from_file(cls, path, **options):
+        """Load a script file (see read_script)"""
+        return cls(read_script(path), **options)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def line_id(self, text):
+        """ID of the script line with exactly this text, or None"""
+        return self.ids.get(text)
+
+    def extract(self, data, lo=0, hi=None):
+        """Texts of the script lines found in data
+
+        Same shape as JapaneseTextScanner.extract, so the index can stand in
+        for the generic extractor anywhere in the scan pipeline.
+        """
+        if self.run_pattern is None:
+            return []
+        texts = []
+        for raw, owned_start, owned_end in self.scanner.windows(data, lo, hi):
+            texts.extend(self.extract_window(raw, owned_start, owned_end))
+        return texts
+
+    def find_lines(self, run):
+        """Script lines inside a run, leftmost-longest and not overlapping"""
+        if run in self.ids:
+            return [run]
+
+        found = []
+        heads = self.heads
+        width = self.min_length
+        last = len(run) - width
+        index = 0
+        while index <= last:
+            for text in heads.get(run[index:index + width], ()):
+                if run.startswith(text, index):
+                    found.append(text)
+                    index += len(text)
+                    break
+            else:
+                index += 1
+        return found
+
+    def matches(self, data):
+        """(line ID, text) of every script line found in data"""
+        return [(self.ids[text], text) for text in self.extract(data)]
+
+    def extract_window(self, raw, lo=0, hi=None):
+        """Script lines starting at byte offsets lo..hi of one bytes window"""
+        texts = []
+        context = self.context
+
+        for encoding, table, seed in self.scanner.patterns:
+            spans = []
+            for start, end in self.scanner.encoding_spans(raw, encoding, table, seed):
+                start = max(start - context, 0)
+                end = min(end + context, len(raw))
+                if spans and start <= spans[-1][1]:
+                    spans[-1][1] = end
+                else:
+                    spans.append([start, end])
+            if not spans:
+                continue
+
+            for run in self.scanner.owned_matches(raw, encoding, spans, self.run_pattern, lo, hi):
+                texts.extend(self.find_lines(run))
+
+        return texts
+
+
+def read_script(path):
+    """(line ID, text) of every line of a script file
+
+    One line per line (IDs are line numbers), or ID<TAB>text.
+    """
+    lines = []
+    with open(path, encoding='utf-8-sig') as f:
+        for number, line in enumerate(f, 1):
+            line_id, tab, text = line.rstrip('\r\n').partition('\t')
+            lines.append((line_id, text) if tab else (number, line_id))
+    return lines
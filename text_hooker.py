@@ -1,49 +1,30 @@
-import ctypes
-import ctypes.wintypes
 import win32api
 import win32con
-import win32gui
-import win32process
-import psutil
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import threading
-import queue
-import time
 import pyperclip
 from datetime import datetime
 
+from capture_engine import CallbackSink, CaptureEngine, JournalSink
+from capture_queue import CaptureQueue
+from capture_journal import CaptureJournal
+from text_pane import PaneRenderer
+from window_capture import capture_window_text, find_windows
+
 
 class TextHooker:
     def __init__(self):
         self.hooked_processes = {}
-        self.text_queue = queue.Queue()
+        # Captured lines waiting for the GUI
+        self.text_queue = CaptureQueue(1000)
         self.running = False
         self.hook = None
+        # CaptureEngine of the running capture
+        self.engine = None
 
     def find_game_windows(self):
         """Find all running game windows"""
-        game_windows = []
-
-        def enum_windows_callback(hwnd, windows):
-            if win32gui.IsWindowVisible(hwnd):
-                window_text = win32gui.GetWindowText(hwnd)
-                if window_text:
-                    try:
-                        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                        process = psutil.Process(pid)
-                        windows.append({
-                            'hwnd': hwnd,
-                            'title': window_text,
-                            'pid': pid,
-                            'process_name': process.name()
-                        })
-                    except:
-                        pass
-            return True
-
-        win32gui.EnumWindows(enum_windows_callback, game_windows)
-        return game_windows
+        return find_windows()
 
     def hook_process(self, pid):
         """Hook into a specific process to capture text"""
@@ -81,90 +62,26 @@ class TextHooker:
 
     def capture_text(self, hwnd):
         """Capture text from a window using various methods"""
-        captured_texts = []
-
-        # Method 1: GetWindowText
-        try:
-            window_text = win32gui.GetWindowText(hwnd)
-            if window_text:
-                captured_texts.append(('Window Title', window_text))
-        except:
-            pass
-
-        # Method 2: SendMessage with WM_GETTEXT
-        try:
-            length = win32gui.SendMessage(hwnd, win32con.WM_GETTEXTLENGTH, 0, 0)
-            if length > 0:
-                buffer = ctypes.create_unicode_buffer(length + 1)
-                win32gui.SendMessage(hwnd, win32con.WM_GETTEXT, length + 1, buffer)
-                if buffer.value:
-                    captured_texts.append(('WM_GETTEXT', buffer.value))
-        except:
-            pass
-
-        # Method 3: Enumerate child windows
-        def enum_child_callback(child_hwnd, texts):
-            try:
-                child_text = win32gui.GetWindowText(child_hwnd)
-                if child_text and self._is_japanese(child_text):
-                    texts.append(('Child Window', child_text))
-
-                # Try WM_GETTEXT on child windows
-                length = win32gui.SendMessage(child_hwnd, win32con.WM_GETTEXTLENGTH, 0, 0)
-                if length > 0:
-                    buffer = ctypes.create_unicode_buffer(length + 1)
-                    win32gui.SendMessage(child_hwnd, win32con.WM_GETTEXT, length + 1, buffer)
-                    if buffer.value and self._is_japanese(buffer.value):
-                        texts.append(('Child Text', buffer.value))
-            except:
-                pass
-            return True
-
-        try:
-            win32gui.EnumChildWindows(hwnd, enum_child_callback, captured_texts)
-        except:
-            pass
+        return capture_window_text(hwnd)
 
-        return captured_texts
+    def start_monitoring(self, hwnd, pid=0, sinks=()):
+        """Monitor a window for text changes
 
-    def _is_japanese(self, text):
-        """Check if text contains Japanese characters"""
-        if not text:
-            return False
-
-        # Check for Hiragana (3040-309F), Katakana (30A0-30FF), or Kanji (4E00-9FAF)
-        for char in text:
-            code = ord(char)
-            if (0x3040 <= code <= 0x309F) or \
-               (0x30A0 <= code <= 0x30FF) or \
-               (0x4E00 <= code <= 0x9FAF):
-                return True
-        return False
-
-    def monitor_window(self, hwnd, callback):
-        """Monitor a window for text changes"""
+        The capture engine re-reads the window whenever it changes (WinEvent
+        notifications, falling back to 100 ms polling) and queues each new
+        Japanese line on text_queue; extra sinks see every accepted capture.
+        """
         self.running = True
-        last_texts = set()
-
-        while self.running:
-            try:
-                texts = self.capture_text(hwnd)
-                for source, text in texts:
-                    if text and text not in last_texts:
-                        if self._is_japanese(text):
-                            callback(f"[{source}] {text}")
-                            last_texts.add(text)
-                            # Keep only recent texts to avoid memory issues
-                            if len(last_texts) > 100:
-                                last_texts = set(list(last_texts)[-50:])
-            except:
-                pass
+        sink = CallbackSink(lambda record: self.text_queue.put(f"[{record.source}] {record.text}"))
+        self.engine = CaptureEngine.for_window(hwnd, pid, [sink, *sinks], dedup_size=100)
 
-            time.sleep(0.1)  # Check every 100ms
-
-    def stop_monitoring(self):
-        """Stop monitoring"""
+    def stop_monitoring(self, wait=False):
+        """Stop monitoring; with wait, block until the last captures are delivered"""
         self.running = False
+        if self.engine:
+            # The engine finishes in the background; engine.running stays
+            # true until its last captures are queued
+            self.engine.stop(wait)
 
 
 class TextHookerGUI:
@@ -174,7 +91,8 @@ class TextHookerGUI:
         self.root.geometry("900x600")
 
         self.hooker = TextHooker()
-        self.monitor_thread = None
+        # Every captured line is also appended to an on-disk log
+        self.journal = CaptureJournal()
         self.selected_window = None
 
         self.setup_ui()
@@ -208,6 +126,7 @@ class TextHookerGUI:
             font=("Yu Gothic", 11)  # Font that supports Japanese
         )
         self.text_display.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+        self.display_pane = PaneRenderer(self.text_display)
 
         # Bottom frame for actions
         action_frame = ttk.Frame(self.root, padding="10")
@@ -243,7 +162,7 @@ class TextHookerGUI:
             messagebox.showwarning("No Selection", "Please select a window first")
             return
 
-        if self.monitor_thread and self.monitor_thread.is_alive():
+        if self.hooker.engine and self.hooker.engine.running:
             messagebox.showinfo("Already Running", "Capture is already running")
             return
 
@@ -255,13 +174,10 @@ class TextHookerGUI:
         if self.hooker.hook_process(self.selected_window['pid']):
             self.update_status(f"Hooked to: {self.selected_window['title']}")
 
-        # Start monitoring in a separate thread
-        self.monitor_thread = threading.Thread(
-            target=self.hooker.monitor_window,
-            args=(self.selected_window['hwnd'], self.add_captured_text),
-            daemon=True
-        )
-        self.monitor_thread.start()
+        # The capture engine feeds the text queue and the journal
+        self.hooker.start_monitoring(self.selected_window['hwnd'], self.selected_window['pid'],
+                                     [JournalSink(self.journal)])
+        self.root.after(100, self.drain_captured_text)
 
         self.update_status(f"Capturing from: {self.selected_window['title']}")
 
@@ -274,15 +190,19 @@ class TextHookerGUI:
 
         self.update_status("Capture stopped")
 
-    def add_captured_text(self, text):
-        """Add captured text to the display"""
-        self.root.after(0, self._add_text_to_display, text)
+    def drain_captured_text(self):
+        """Move queued captures to the display (runs on the main thread)"""
+        for text in self.hooker.text_queue.drain(200):
+            self._add_text_to_display(text)
+
+        if self.hooker.engine.running or len(self.hooker.text_queue):
+            self.root.after(10 if len(self.hooker.text_queue) else 100,
+                            self.drain_captured_text)
 
     def _add_text_to_display(self, text):
         """Add text to display (must be called from main thread)"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.text_display.insert(tk.END, f"[{timestamp}] {text}\n")
-        self.text_display.see(tk.END)
+        self.display_pane.append(f"[{timestamp}] {text}\n")
 
     def copy_selected(self):
         """Copy selected text to clipboard"""
@@ -295,13 +215,13 @@ class TextHookerGUI:
 
     def copy_all(self):
         """Copy all text to clipboard"""
-        all_text = self.text_display.get(1.0, tk.END)
+        all_text = self.display_pane.text()
         pyperclip.copy(all_text)
         self.update_status("All text copied to clipboard")
 
     def clear_text(self):
         """Clear the text display"""
-        self.text_display.delete(1.0, tk.END)
+        self.display_pane.clear()
         self.update_status("Text cleared")
 
     def save_to_file(self):
@@ -317,7 +237,7 @@ class TextHookerGUI:
         if filename:
             try:
                 with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(self.text_display.get(1.0, tk.END))
+                    f.write(self.display_pane.text())
                 self.update_status(f"Saved to: {filename}")
             except Exception as e:
                 messagebox.showerror("Save Error", f"Failed to save file: {e}")
@@ -329,6 +249,8 @@ class TextHookerGUI:
     def run(self):
         """Run the GUI"""
         self.root.mainloop()
+        self.hooker.stop_monitoring(wait=True)
+        self.journal.close()
 
 
 if __name__ == "__main__":
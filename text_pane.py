@@ -0,0 +1,72 @@
+import tkinter as tk
+
+from history_store import LineLog
+
+
+class PaneRenderer:
+    """Batched, bounded rendering of captured lines into a Text widget
+
+    append() only queues a line; once per frame every queued line goes in
+    with a single insert and a single see().  The widget keeps at most
+    max_lines lines, trimmed from the top in chunks, while every line ever
+    appended stays in the LineLog so copy/save still see the full text.
+    Panes rendering from a HistoryStore pass keep_log=False; the store is
+    their backing copy.  Must be used from the Tk thread.
+    """
+
+    def __init__(self, widget, max_lines=2000, frame_ms=50, autoscroll=True, keep_log=True):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.frame_ms = frame_ms
+        self.autoscroll = autoscroll
+        self.log = LineLog() if keep_log else None
+        self.pending = []
+        self.scheduled = None
+
+    def append(self, line):
+        """Queue a line (newline-terminated) for the next frame"""
+        self.pending.append(line)
+        if self.log is not None:
+            self.log.append(line)
+        if self.scheduled is None:
+            self.scheduled = self.widget.after(self.frame_ms, self.flush)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def flush(self):
+        """Apply queued lines to the widget now"""
+        if self.scheduled is not None:
+            self.widget.after_cancel(self.scheduled)
+            self.scheduled = None
+        if not self.pending:
+            return
+
+        self.widget.insert(tk.END, ''.join(self.pending))
+        self.pending = []
+        self.trim()
+
+        if self.autoscroll:
+            self.widget.see(tk.END)
+
+    def trim(self):
+        """Drop the oldest widget lines once the pane is a tenth over max_lines"""
+        # Every line ends in a newline, so the last index line is empty
+        lines = int(self.widget.index('end-1c').split('.')[0]) - 1
+        if lines > self.max_lines + self.max_lines // 10:
+            self.widget.delete('1.0', f'{lines - self.max_lines + 1}.0')
+
+    def text(self):
+        """Full text of every line appended since the last clear()"""
+        return self.log.text()
+
+    def clear(self):
+        """Empty the pane and its backing log"""
+        if self.scheduled is not None:
+            self.widget.after_cancel(self.scheduled)
+            self.scheduled = None
+        self.pending = []
+        if self.log is not None:
+            self.log.clear()
+        self.widget.delete(1.0, tk.END)
@@ -0,0 +1,218 @@
+import re
+
+from japanese_classifier import CORE_BLOCKS, EXTRA_BLOCKS, character_class
+
+
+# Byte classes, one per encoding, in the order the original decoder tried
+# them: (encoding, run byte class, minimum run length in bytes).
+#
+# The class lists every byte that can occur inside a Japanese character in
+# that encoding, and the minimum run is two such characters.  Buffers are
+# translated into a 0/1 mask of the class so candidate runs can be located
+# with bytes.find at C speed; only those spans are ever decoded.  The
+# classes cover japanese_classifier.CORE_BLOCKS.
+BYTE_PATTERNS = [
+    # Shift-JIS: lead byte 81-9F/E0-FC + trail byte 40-7E/80-FC
+    ('shift_jis', rb'[\x40-\x7E\x80-\xFC]', 4),
+    # UTF-8: kana/punctuation (E3 80-83 xx) and CJK (E4-E9 xx xx)
+    ('utf-8', rb'[\x80-\xBF\xE3-\xE9]', 6),
+    # EUC-JP: two bytes in the A1-FE range
+    ('euc-jp', rb'[\xA1-\xFE]', 4),
+    # UTF-16-LE: matched against the high-byte plane (every odd byte), so
+    # candidates are always aligned on a code unit boundary
+    ('utf-16-le', rb'[\x30\x4E-\x9F]', 2),
+]
+
+# The same, widened to every block of japanese_classifier.JAPANESE_BLOCKS
+EXTRA_BYTE_PATTERNS = [
+    # Shift-JIS halfwidth katakana A1-DF is already in the trail byte range
+    ('shift_jis', rb'[\x40-\x7E\x80-\xFC]', 4),
+    # UTF-8: extension A (E3 xx xx), compatibility kanji and halfwidth
+    # katakana (EF xx xx), extensions B-F (F0 xx xx xx)
+    ('utf-8', rb'[\x80-\xBF\xE3-\xE9\xEF\xF0]', 6),
+    # EUC-JP: 8E + halfwidth katakana
+    ('euc-jp', rb'[\x8E\xA1-\xFE]', 4),
+    # UTF-16-LE: D8-DF are the surrogates of extensions B-F
+    ('utf-16-le', rb'[\x30\x31\x34-\x9F\xD8-\xDF\xF9\xFA\xFF]', 2),
+]
+
+# Runs of two or more characters of the core blocks
+JAPANESE_TEXT_PATTERN = re.compile(character_class(CORE_BLOCKS) + '{2,}')
+
+# With the extra blocks, a run of only their characters must be at least
+# RARE_MIN_LENGTH long, and one mixing halfwidth katakana (Shift-JIS A1-DF,
+# where random bytes land all the time) with kanji MIXED_MIN_LENGTH long
+RARE_RUN_PATTERN = re.compile(character_class(EXTRA_BLOCKS) + '+')
+RARE_MIN_LENGTH = 4
+HALFWIDTH_PATTERN = re.compile(character_class(('halfwidth_katakana',)))
+KANJI_PATTERN = re.compile(character_class(
+    ('kanji_ext_a', 'kanji', 'kanji_compat', 'kanji_ext_b_f')))
+MIXED_MIN_LENGTH = 8
+
+
+def _mask_table(byte_class):
+    """Build a bytes.translate table mapping the byte class to 1, others to 0"""
+    pattern = re.compile(byte_class)
+    return bytes(1 if pattern.match(bytes([value])) else 0 for value in range(256))
+
+
+def is_rare_noise(text):
+    """True for a run too short for the extra-block characters in it"""
+    if len(text) < RARE_MIN_LENGTH and RARE_RUN_PATTERN.fullmatch(text):
+        return True
+    return (len(text) < MIXED_MIN_LENGTH and HALFWIDTH_PATTERN.search(text) is not None
+            and KANJI_PATTERN.search(text) is not None)
+
+
+class JapaneseTextScanner:
+    """Find Japanese text runs directly in raw memory bytes
+
+    Looks for text in japanese_classifier.CORE_BLOCKS.  Passing more blocks
+    (e.g. DEFAULT_BLOCKS) opts into the others, scanned with
+    EXTRA_BYTE_PATTERNS unless patterns is given, at the cost of more noise
+    and a slower scan.
+    """
+
+    def __init__(self, patterns=None, min_length=2, max_length=500, merge_gap=16,
+                 window_size=1024 * 1024, window_overlap=4096, blocks=CORE_BLOCKS):
+        extra = not set(blocks) <= set(CORE_BLOCKS)
+        if patterns is None:
+            patterns = EXTRA_BYTE_PATTERNS if extra else BYTE_PATTERNS
+        self.patterns = [
+            (encoding, _mask_table(byte_class), b'\x01' * min_run)
+            for encoding, byte_class, min_run in patterns
+        ]
+        self.text_pattern = (re.compile(character_class(blocks) + '{2,}') if extra
+                             else JAPANESE_TEXT_PATTERN)
+        self.extra = extra
+        self.min_length = min_length
+        self.max_length = max_length
+        # A span ends at the first stretch of this many non-class bytes, so
+        # dense areas cost one find call instead of one per short run
+        self.span_end = b'\x00' * merge_gap
+        # Big buffers are scanned in windows so the masks and the bytes copy
+        # of a pooled memoryview stay small; the overlap (even, so UTF-16
+        # stays aligned) is over twice as long as any accepted line
+        self.window_size = window_size
+        self.window_overlap = window_overlap
+
+    def find_spans(self, mask, seed):
+        """Yield (start, end) of mask spans that contain a run of len(seed)"""
+        start = mask.find(seed)
+
+        while start != -1:
+            end = mask.find(self.span_end, start)
+            if end == -1:
+                end = len(mask)
+            yield start, end
+            start = mask.find(seed, end)
+
+    def encoding_spans(self, raw, encoding, table, seed):
+        """Return the (start, end) byte spans that may hold text in one encoding"""
+        if encoding == 'utf-16-le':
+            # Scan only the high bytes; span i..j maps to bytes 2i..2j
+            mask = raw[1::2].translate(table)
+            return [(start * 2, end * 2) for start, end in self.find_spans(mask, seed)]
+
+        return list(self.find_spans(raw.translate(table), seed))
+
+    def find_candidates(self, data):
+        """Yield (encoding, start, end) byte spans that may hold Japanese text"""
+        raw = data if isinstance(data, bytes) else bytes(data)
+
+        for encoding, table, seed in self.patterns:
+            for start, end in self.encoding_spans(raw, encoding, table, seed):
+                yield encoding, start, end
+
+    def windows(self, data, lo=0, hi=None):
+        """Yield (window, owned start, owned end) for overlapping bytes windows of data
+
+        data is bytes, bytearray or memoryview.  Each window owns the text
+        starting at byte offsets owned start..owned end (relative to the
+        window); the owned ranges meet halfway through the overlaps, so a
+        line shorter than half an overlap is whole in the one window that
+        owns it, and a piece of it cut by a window edge is never owned.
+        lo and hi restrict ownership to that range of data.
+        """
+        size = len(data)
+        hi = size if hi is None else hi
+        if size <= self.window_size:
+            yield (data if isinstance(data, bytes) else bytes(data)), lo, hi
+            return
+
+        step = self.window_size - self.window_overlap
+        half = self.window_overlap // 2
+        starts = range(0, size - self.window_overlap, step)
+        for start in starts:
+            owned_start = start + half if start else 0
+            owned_end = start + step + half if start != starts[-1] else size
+            if owned_end <= lo or owned_start >= hi:
+                continue
+            yield (bytes(data[start:start + self.window_size]),
+                   max(owned_start, lo) - start, min(owned_end, hi) - start)
+
+    def owned_matches(self, raw, encoding, spans, pattern, lo=0, hi=None):
+        """Matches of pattern in the decoded spans of raw that start at byte offsets lo..hi
+
+        Spans wholly inside lo..hi are decoded together in a single call;
+        the few crossing an edge are decoded alone, so each match can be
+        traced back to its byte offset.  The offset is carried from match
+        to match, encoding only the text in between, so a dense span as
+        long as the window costs one pass.
+        """
+        hi = len(raw) if hi is None else hi
+        inside = []
+        matches = []
+        for start, end in spans:
+            if end <= lo or start >= hi:
+                continue
+            if lo <= start and end <= hi:
+                inside.append(raw[start:end])
+                continue
+            decoded = str(raw[start:end], encoding, 'ignore')
+            offset = start
+            position = 0
+            for match in pattern.finditer(decoded):
+                offset += len(decoded[position:match.start()].encode(encoding, 'ignore'))
+                position = match.start()
+                if offset >= hi:
+                    break
+                if offset >= lo:
+                    matches.append(match.group())
+
+        if inside:
+            # The separator keeps runs from neighbouring spans from merging
+            separator = '\n'.encode(encoding)
+            matches.extend(pattern.findall(str(separator.join(inside), encoding, 'ignore')))
+        return matches
+
+    def extract(self, data, lo=0, hi=None):
+        """Extract Japanese text from binary data, decoding only candidate spans
+
+        With lo and hi, only text starting at byte offsets lo..hi is kept.
+        """
+        texts = []
+        for raw, owned_start, owned_end in self.windows(data, lo, hi):
+            texts.extend(self.extract_window(raw, owned_start, owned_end))
+        return texts
+
+    def extract_window(self, raw, lo=0, hi=None):
+        """Extract Japanese text starting at byte offsets lo..hi of one bytes window"""
+        texts = []
+
+        for encoding, table, seed in self.patterns:
+            spans = self.encoding_spans(raw, encoding, table, seed)
+            if not spans:
+                continue
+
+            # Filter out noise: length limits, runs of one repeated character
+            # and short runs of extra-block characters
+            texts.extend(
+                match for match in self.owned_matches(raw, encoding, spans,
+                                                      self.text_pattern, lo, hi)
+                if self.min_length <= len(match) <= self.max_length
+                and match.count(match[0]) != len(match)
+                and (not self.extra or not is_rare_noise(match))
+            )
+
+        return texts
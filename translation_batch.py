@@ -0,0 +1,40 @@
+import json
+
+
+def build_prompt(text, target_language):
+    """Prompt translating one line"""
+    return f"""Translate the following Japanese text to {target_language}.
+    Provide only the translation without any additional explanation or notes.
+    If the text contains character names or dialogue, preserve the format.
+
+    Text: {text}"""
+
+
+def build_batch_prompt(texts, target_language):
+    """One prompt translating several lines, answered as a JSON array"""
+    return f"""Translate each Japanese line in the following JSON array to {target_language}.
+    Reply with only a JSON array of strings: exactly {len(texts)} translations, in the same order.
+    Provide no additional explanation or notes.
+    If a line contains character names or dialogue, preserve the format.
+
+    Lines: {json.dumps(texts, ensure_ascii=False)}"""
+
+
+def parse_batch_response(response, count):
+    """Split a batch reply into count translations; None if it cannot be trusted"""
+    # Models like to wrap the array in a ```json fence or a sentence
+    start = response.find('[')
+    end = response.rfind(']')
+    if start == -1 or end < start:
+        return None
+
+    try:
+        translations = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+
+    if (not isinstance(translations, list) or len(translations) != count
+            or not all(isinstance(translation, str) for translation in translations)):
+        return None
+
+    return [translation.strip() for translation in translations]
@@ -0,0 +1,157 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Cache key form of a line: NFKC (full/half-width folded), whitespace collapsed"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class TranslationCache:
+    """Two-tier translation cache: an in-memory LRU in front of a SQLite store
+
+    Entries are keyed on (normalized text, target language, model), so a
+    line repeated by the game, the backlog or the UI is only ever sent to
+    the API once.  The store keeps at most max_entries rows; the least
+    recently used ones are evicted first.  path=None keeps the second tier
+    in memory only.
+    """
+
+    def __init__(self, path="translations.db", memory_size=1000, max_entries=50000):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        # (text, target_language, model) -> translation, oldest first
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Lookups come from the Tk thread and from translation workers
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                text TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                model TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text, target_language, model)
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS translations_last_used "
+                        "ON translations (last_used)")
+        self.db.commit()
+        self.disk_entries = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def get(self, text, target_language, model):
+        """Return the cached translation, or None"""
+        key = (normalize_text(text), target_language, model)
+
+        with self.lock:
+            translation = self.memory.get(key)
+            if translation is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return translation
+
+            row = self.db.execute(
+                "SELECT translation FROM translations "
+                "WHERE text = ? AND target_language = ? AND model = ?", key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.db.execute(
+                "UPDATE translations SET last_used = ? "
+                "WHERE text = ? AND target_language = ? AND model = ?",
+                (time.time(),) + key)
+            self.db.commit()
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, text, target_language, model, translation):
+        """Store a translation in both tiers"""
+        key = (normalize_text(text), target_language, model)
+
+        with self.lock:
+            self._remember(key, translation)
+            now = time.time()
+            cursor = self.db.execute(
+                "UPDATE translations SET translation = ?, last_used = ? "
+                "WHERE text = ? AND target_language = ? AND model = ?",
+                (translation, now) + key)
+            if cursor.rowcount == 0:
+                self.db.execute(
+                    "INSERT INTO translations "
+                    "(text, target_language, model, translation, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)", key + (translation, now))
+                self.disk_entries += 1
+
+            if self.disk_entries > self.max_entries:
+                self._evict()
+            self.db.commit()
+
+    def _remember(self, key, translation):
+        """Put an entry in the memory tier, dropping the least recently used"""
+        self.memory[key] = translation
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _evict(self):
+        """Trim the store back to max_entries, least recently used first
+
+        A tenth of the limit is removed at once so a full store is not
+        trimmed on every insert.
+        """
+        target = self.max_entries - self.max_entries // 10
+        excess = self.disk_entries - target
+        self.db.execute(
+            "DELETE FROM translations WHERE rowid IN ("
+            "SELECT rowid FROM translations ORDER BY last_used LIMIT ?)", (excess,))
+        self.disk_entries = target
+        self.evictions += excess
+
+    def clear(self):
+        """Drop every cached translation (counters are kept)"""
+        with self.lock:
+            self.memory.clear()
+            self.db.execute("DELETE FROM translations")
+            self.db.commit()
+            self.disk_entries = 0
+
+    def stats(self):
+        """Hit/miss counters per tier and entry counts"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            'memory_entries': len(self.memory),
+            'disk_entries': self.disk_entries,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+    def report(self):
+        """One-line summary for the status bar"""
+        stats = self.stats()
+        return (f"Translation cache: {stats['hit_rate']:.0%} hit rate "
+                f"({stats['memory_hits']} memory / {stats['disk_hits']} disk / "
+                f"{stats['misses']} misses), {stats['disk_entries']} stored")
+
+    def close(self):
+        """Close the store"""
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,312 @@
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from metrics import registry
+
+
+# Answers worth retrying: rate limited, or the server is having trouble
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TranslationError(Exception):
+    """A translation request that produced no translation"""
+
+
+class RateLimitedError(TranslationError):
+    """The API answered 429; retry_after is its Retry-After in seconds, if given"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(TranslationError):
+    """The API failed too often lately, so no request was made"""
+
+
+class DeadlineExceeded(TranslationError):
+    """The request could not be answered before its deadline"""
+
+
+class TokenBucket:
+    """Rate limiter allowing burst requests at once and rate a second on average
+
+    acquire() reserves a token and sleeps until it is due, so concurrent
+    callers queue up in order instead of all retrying at once.  pause()
+    holds every request back, e.g. for a Retry-After.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """Wait for a token; False (and nothing taken) if it would come after deadline
+
+        deadline is a time.monotonic() value.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max((1 - self.tokens) / self.rate, self.paused_until - now, 0.0)
+            if wait and deadline is not None and now + wait > deadline:
+                return False
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def pause(self, seconds):
+        """Let no request start for the next seconds"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """Stops calling an API that keeps failing
+
+    After failure_threshold failures in a row the circuit opens: calls fail
+    at once for reset_timeout seconds instead of each waiting out its
+    retries.  Then a single trial call is let through (half open); if it
+    succeeds the circuit closes, otherwise it opens again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go ahead"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            # A trial call that never reported back does not hold the
+            # circuit half open for good: another one goes after reset_timeout
+            now = time.monotonic()
+            if now - self.opened >= self.reset_timeout:
+                self.state = 'half_open'
+                self.opened = now
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                self.state = 'open'
+                self.opened = time.monotonic()
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one server
+
+    Idle connections are reused last in, first out, so a burst does not pay
+    a TCP and TLS handshake per request.  At most size idle connections are
+    kept; more concurrent requests open extra ones that are closed after.
+    """
+
+    def __init__(self, base_url, size=4):
+        parts = urlsplit(base_url)
+        self.connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.size = size
+        self.idle = []
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def _connection(self, timeout):
+        with self.lock:
+            if self.idle:
+                connection = self.idle.pop()
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                return connection, True
+            self.opened += 1
+        return self.connection_class(self.host, self.port, timeout=timeout), False
+
+    def _release(self, connection):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, path, body=None, headers=None, timeout=30.0):
+        """(status, headers, body bytes) of one request"""
+        while True:
+            connection, reused = self._connection(timeout)
+            try:
+                connection.request(method, self.prefix + path, body, headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if reused:
+                    # The server closed the idle connection; try a fresh one
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, response.headers, data
+
+    def warm(self, timeout=10.0):
+        """Open a connection ahead of the first request"""
+        connection, reused = self._connection(timeout)
+        if not reused:
+            connection.connect()
+        self._release(connection)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+class TranslationClient:
+    """JSON POSTs to a translation API with rate limiting, retries and deadlines
+
+    Requests start no faster than requests_per_minute (burst at once).  A
+    429, a 5xx, a timeout or a dropped connection is retried up to retries
+    times, after the server's Retry-After or a jittered exponential backoff;
+    a 429 also holds back every other request for that long.  Each call
+    must be answered within deadline seconds, waits included, and each
+    attempt within timeout.  Server failures (5xx, timeouts, dropped
+    connections) count towards the circuit breaker; 429s leave it as it
+    is.  Every failure is raised as a TranslationError.
+    """
+
+    def __init__(self, base_url, headers=None, requests_per_minute=60, burst=5, retries=4,
+                 backoff=0.5, max_backoff=20.0, timeout=30.0, deadline=60.0, breaker=None,
+                 pool_size=4, name='gemini'):
+        self.pool = ConnectionPool(base_url, pool_size)
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst) if requests_per_minute else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.name = name
+        self.random = random.Random()
+
+    def post_json(self, path, payload, deadline=None):
+        """POST payload as JSON and return the decoded reply
+
+        deadline overrides the client's deadline, in seconds from now.
+        """
+        deadline = time.monotonic() + (deadline or self.deadline)
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        error = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                retry_after = getattr(error, 'retry_after', None)
+                delay = (retry_after if retry_after is not None else
+                         self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                if time.monotonic() + delay > deadline:
+                    raise DeadlineExceeded(f"Gave up after {attempt} attempts: {error}") from error
+                time.sleep(delay)
+
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} failed {self.breaker.failures} times in a row, "
+                                       f"not retrying for {self.breaker.reset_timeout:.0f} s")
+            if self.bucket and not self.bucket.acquire(deadline):
+                raise DeadlineExceeded("Rate limit leaves no time before the deadline")
+
+            timeout = min(self.timeout, deadline - time.monotonic())
+            try:
+                status, headers, data = self.pool.request('POST', path, body, self.headers,
+                                                          max(timeout, 0.001))
+            except (OSError, http.client.HTTPException) as e:
+                # Timeouts (socket.timeout is an OSError) and dropped connections
+                self.breaker.failure()
+                error = TranslationError(f"{type(e).__name__}: {e}")
+                self._count_failure('timeout' if isinstance(e, socket.timeout) else 'connection')
+                continue
+
+            if status == 200:
+                self.breaker.success()
+                try:
+                    return json.loads(data)
+                except ValueError as e:
+                    raise TranslationError(f"Unreadable reply from {self.name}: {e}") from e
+
+            message = f"HTTP {status} from {self.name}: {error_message(data)}"
+            if status == 429:
+                # Busy, not broken, but no sign of recovery either: the
+                # breaker is left as it is
+                retry_after = parse_retry_after(headers.get('Retry-After'))
+                if self.bucket:
+                    self.bucket.pause(retry_after if retry_after is not None else self.backoff)
+                error = RateLimitedError(message, retry_after)
+                self._count_failure('rate_limited')
+            elif status in RETRY_STATUSES:
+                self.breaker.failure()
+                error = TranslationError(message)
+                self._count_failure('server_error')
+            else:
+                # The server is fine, the request is not (bad key, bad model)
+                self.breaker.success()
+                raise TranslationError(message)
+
+        raise error
+
+    def _count_failure(self, reason):
+        registry.counter('translation_failed_attempts_total', "Failed translation attempts by reason",
+                         reason=reason).inc()
+
+    def warm(self):
+        self.pool.warm(self.timeout)
+
+    def close(self):
+        self.pool.close()
+
+
+def parse_retry_after(value):
+    """Seconds of a Retry-After header (only the delta-seconds form), or None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def error_message(data):
+    """The message of a JSON error reply ({"error": {"message": ...}}), else the raw text"""
+    try:
+        return json.loads(data)['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return data[:200].decode('utf-8', 'replace')
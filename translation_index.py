@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+
+from translation_cache import normalize_text
+
+
+class TranslationIndex:
+    """Read-only lookup of translations made ahead of time by pretranslate.Pretranslator
+
+    A SQLite file with one table keyed on (normalized text, target
+    language), without rowids, so the file is just the key B-tree.  Unlike
+    TranslationCache nothing is evicted and a lookup writes nothing, so a
+    hit is a normalize_text and one indexed read: microseconds, against a
+    network round trip for the API.  writable=True opens it for
+    Pretranslator to fill in.
+    """
+
+    def __init__(self, path="pretranslated.db", writable=False):
+        self.path = path
+        self.writable = writable
+        self.hits = 0
+        self.misses = 0
+
+        # Lookups come from the Tk thread and from translation workers
+        self.lock = threading.Lock()
+        if writable:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    text TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    PRIMARY KEY (text, target_language)
+                ) WITHOUT ROWID""")
+            self.db.commit()
+        else:
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.entries = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    @classmethod
+    def open(cls, path):
+        """Open the index at path read-only, or None if there is none"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except sqlite3.Error as e:
+            print(f"Cannot open translation index {path}: {e}")
+            return None
+
+    def __len__(self):
+        return self.entries
+
+    def get(self, text, target_language):
+        """Return the stored translation, or None"""
+        key = (normalize_text(text), target_language)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT translation FROM translations "
+                "WHERE text = ? AND target_language = ?", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def missing(self, texts, target_language):
+        """The texts (normalized) that have no translation yet"""
+        with self.lock:
+            done = {row[0] for row in self.db.execute(
+                "SELECT text FROM translations WHERE target_language = ?", (target_language,))}
+        return [text for text in texts if text not in done]
+
+    def put_many(self, pairs, target_language, model):
+        """Store (normalized text, translation) pairs"""
+        with self.lock:
+            cursor = self.db.executemany(
+                "INSERT OR REPLACE INTO translations (text, target_language, model, translation) "
+                "VALUES (?, ?, ?, ?)",
+                [(text, target_language, model, translation) for text, translation in pairs])
+            self.db.commit()
+            self.entries = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return cursor.rowcount
+
+    def languages(self):
+        """Entry count per target language"""
+        with self.lock:
+            return dict(self.db.execute(
+                "SELECT target_language, COUNT(*) FROM translations GROUP BY target_language"))
+
+    def report(self):
+        """One-line summary for the status bar"""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return (f"Pre-translated: {self.entries} lines, "
+                f"{rate:.0%} hit rate ({self.hits} hits / {self.misses} misses)")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
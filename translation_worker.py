@@ -0,0 +1,311 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TranslationRequest:
+    """A submitted translation; pass it to TranslationWorker.cancel() to withdraw it"""
+
+    __slots__ = ('text', 'target_language', 'callback', 'speculative', 'queued', 'cancelled')
+
+    def __init__(self, text, target_language, callback, speculative=False):
+        self.text = text
+        self.target_language = target_language
+        self.callback = callback
+        self.speculative = speculative
+        self.queued = time.perf_counter()
+        self.cancelled = False
+
+
+class TranslationWorker:
+    """Runs translations on an asyncio loop in a background thread
+
+    submit() never blocks the caller.  Requests wait in a bounded queue;
+    when it is full the oldest request is dropped, since a line that has
+    already scrolled past is worth less than the newest one.  Up to
+    concurrency requests are in flight at once, and each result is handed
+    to the request's callback on the worker thread; GUI callers must
+    marshal it back with root.after.
+
+    translate is a callable (text, target_language) -> translation, either
+    a blocking function (run on a thread pool) or a coroutine function.
+
+    With translate_batch ((texts, target_language) -> list of translations,
+    or None when the reply could not be split), lines arriving within
+    batch_window seconds of each other are sent as one request, up to
+    max_batch lines or max_batch_chars characters.  A failed batch falls
+    back to one translate call per line.
+
+    A request for a text and language already queued or in flight joins
+    it rather than costing another call.  submit() returns the request,
+    which cancel() withdraws: its callback is not called, and a text whose
+    requests were all cancelled before it was sent is not translated.
+
+    Requests submitted with speculative=True translate a line that may
+    still change.  With speculate ((text, target_language) -> translation,
+    like translate), a text only speculative requests wait for is
+    translated with it, on its own, so the caller can keep those results
+    out of its cache until a real request asks for the text.
+    """
+
+    def __init__(self, translate, concurrency=2, queue_size=64, translate_batch=None,
+                 batch_window=0.05, max_batch=20, max_batch_chars=2000, speculate=None):
+        self.translate = translate
+        self.translate_batch = translate_batch
+        self.speculate = speculate
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        # Rough stand-in for a token limit on the prompt
+        self.max_batch_chars = max_batch_chars
+        self.loop = None
+        self.thread = None
+        self.queue = None
+        self.executor = None
+        # (text, target_language) -> requests waiting for that translation;
+        # only touched on the loop thread
+        self.waiting = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.batch_fallbacks = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.latency_total = 0.0
+
+    def start(self):
+        """Start the loop thread (submit() starts it on demand)"""
+        if self.thread:
+            return
+
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue(self.queue_size)
+        self.waiting = {}
+        self.executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='translate')
+        self.tasks = set()
+        # Tasks waiting for a request, which can be cancelled without losing one
+        self.idle = set()
+        self._resize(self.concurrency)
+        ready.set()
+
+        self.loop.run_forever()
+
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+        # Calls already running on the pool finish in the background
+        self.executor.shutdown(wait=False)
+
+    def submit(self, text, target_language, callback, speculative=False):
+        """Queue a translation; callback(text, translation) is called when done
+
+        translation is None if the translator failed.  Returns the
+        TranslationRequest.
+        """
+        self.start()
+        request = TranslationRequest(text, target_language, callback, speculative)
+        self.loop.call_soon_threadsafe(self._enqueue, request)
+        return request
+
+    def cancel(self, request):
+        """Withdraw a request; safe to call from any thread, and after it finished"""
+        if request is not None:
+            request.cancelled = True
+
+    def _enqueue(self, request):
+        self.submitted += 1
+        key = (request.text, request.target_language)
+        waiters = self.waiting.get(key)
+        if waiters is not None:
+            self.coalesced += 1
+            waiters.append(request)
+            return
+
+        if self.queue.full():
+            oldest = self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += len(self.waiting.pop((oldest.text, oldest.target_language), ()))
+        self.waiting[key] = [request]
+        self.queue.put_nowait(request)
+
+    def _resize(self, concurrency):
+        """Run concurrency worker tasks; surplus tasks stop once idle"""
+        if concurrency != self.concurrency:
+            # Calls running on the old pool finish there
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix='translate')
+        self.concurrency = concurrency
+
+        while len(self.tasks) < concurrency:
+            self.tasks.add(self.loop.create_task(self._work()))
+        for task in list(self.idle)[:len(self.tasks) - concurrency]:
+            self.idle.discard(task)
+            self.tasks.discard(task)
+            task.cancel()
+
+    async def _work(self):
+        task = asyncio.current_task()
+        while True:
+            if len(self.tasks) > self.concurrency:
+                # A busy task that was over the new limit
+                self.tasks.discard(task)
+                return
+
+            self.idle.add(task)
+            try:
+                batch = [await self.queue.get()]
+            finally:
+                self.idle.discard(task)
+            try:
+                if self.translate_batch:
+                    await self._fill_batch(batch)
+                await self._handle(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _fill_batch(self, batch):
+        """Add requests arriving within the batch window, up to the size limits"""
+        deadline = self.loop.time() + self.batch_window
+        chars = len(batch[0].text)
+
+        while len(batch) < self.max_batch and chars < self.max_batch_chars:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            chars += len(request.text)
+
+    async def _call(self, function, *args):
+        if asyncio.iscoroutinefunction(function):
+            return await function(*args)
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    async def _translate_one(self, text, target_language, translate=None):
+        try:
+            translation = await self._call(translate or self.translate, text, target_language)
+            self.completed += 1
+            return translation
+        except Exception as e:
+            print(f"Translation error: {e}")
+            self.failed += 1
+            return None
+
+    async def _handle(self, batch):
+        """Translate a batch of requests and hand every result to its callbacks"""
+        # Requests are grouped per target language, keeping their order;
+        # texts nobody is waiting for any more are left out
+        groups = {}
+        speculative = []
+        for request in batch:
+            key = (request.text, request.target_language)
+            waiters = [waiter for waiter in self.waiting[key] if not waiter.cancelled]
+            if not waiters:
+                self.cancelled += len(self.waiting.pop(key))
+            elif self.speculate and all(waiter.speculative for waiter in waiters):
+                speculative.append(request)
+            else:
+                groups.setdefault(request.target_language, []).append(request)
+
+        for request in speculative:
+            translation = await self._translate_one(request.text, request.target_language,
+                                                    self.speculate)
+            self._finish(request, translation)
+
+        for target_language, requests in groups.items():
+            texts = [request.text for request in requests]
+            translations = None
+
+            if len(texts) > 1:
+                try:
+                    translations = await self._call(self.translate_batch, texts, target_language)
+                except Exception as e:
+                    print(f"Batch translation error: {e}")
+
+                if translations is not None and len(translations) == len(texts):
+                    self.batches += 1
+                    self.completed += len(texts)
+                else:
+                    translations = None
+                    self.batch_fallbacks += 1
+
+            if translations is None:
+                translations = [await self._translate_one(text, target_language)
+                                for text in texts]
+
+            for request, translation in zip(requests, translations):
+                self._finish(request, translation)
+
+    def _finish(self, request, translation):
+        """Hand a translation to every request waiting for its text"""
+        self.latency_total += time.perf_counter() - request.queued
+        # Requests that joined while this one was in flight included
+        for waiter in self.waiting.pop((request.text, request.target_language)):
+            if waiter.cancelled:
+                self.cancelled += 1
+                continue
+            try:
+                waiter.callback(waiter.text, translation)
+            except Exception as e:
+                print(f"Translation callback error: {e}")
+
+    def join(self, timeout=None):
+        """Block until every queued request has been handled"""
+        if self.thread:
+            asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop).result(timeout)
+
+    def set_concurrency(self, concurrency):
+        """Change the number of requests in flight; queued requests are kept
+
+        Requests already in flight finish even when the limit goes down.
+        """
+        if self.thread:
+            self.loop.call_soon_threadsafe(self._resize, concurrency)
+        else:
+            self.concurrency = concurrency
+
+    def stop(self):
+        """Stop the loop thread; queued requests are discarded"""
+        if not self.thread:
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+
+    def pending(self):
+        """Requests waiting in the queue"""
+        return self.queue.qsize() if self.queue else 0
+
+    def stats(self):
+        """Request counters and mean queue-to-result latency"""
+        done = self.completed + self.failed
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'batch_fallbacks': self.batch_fallbacks,
+            'coalesced': self.coalesced,
+            'cancelled': self.cancelled,
+            'pending': self.pending(),
+            'mean_latency': self.latency_total / done if done else 0.0
+        }
@@ -0,0 +1,337 @@
+import json
+import re
+import threading
+
+from metrics import registry
+from translation_batch import build_batch_prompt, build_prompt, parse_batch_response
+from translation_cache import normalize_text
+from translation_client import TranslationClient, TranslationError
+
+
+GEMINI_API_URL = 'https://generativelanguage.googleapis.com'
+
+# Settings value -> what the Settings tab shows
+BACKENDS = {
+    'gemini': "Gemini API",
+    'local': "Local server (OpenAI-compatible / LibreTranslate)",
+    'glossary': "Glossary only (offline)",
+}
+
+# Target languages of the Settings tab as ISO 639-1 codes, for LibreTranslate
+LANGUAGE_CODES = {
+    'English': 'en', 'Korean': 'ko', 'Chinese': 'zh', 'Spanish': 'es',
+    'French': 'fr', 'German': 'de', 'Russian': 'ru', 'Japanese': 'ja',
+}
+
+
+class Translator:
+    """A translation backend
+
+    Subclasses implement request(), and request_batch() if the backend can
+    translate several lines in one call.  Both raise TranslationError on
+    failure and may return None when the backend simply has no
+    translation.  translate() and translate_batch() time them, and turn a
+    failure into None with the error kept in last_error, so an error
+    message is never shown as if it were a translation.
+    """
+
+    name = None
+    model_name = None
+    # Whether results are worth keeping in the translation cache
+    cacheable = True
+
+    def __init__(self):
+        self.initialized = True
+        # Exception raised by the last translate() call, None on success
+        self.last_error = None
+
+    def request(self, text, target_language):
+        """Translation of text"""
+        raise NotImplementedError
+
+    def request_batch(self, texts, target_language):
+        """One translation per line, or None if the reply could not be split
+
+        Backends without batch requests translate line by line.
+        """
+        return [self.request(text, target_language) for text in texts]
+
+    def translate(self, text, target_language="English"):
+        """Translate text; None on failure"""
+        if not self.initialized:
+            return None
+
+        try:
+            with registry.timer('translation_request_seconds', "Duration of a translation request",
+                                backend=self.name, kind='single'):
+                translation = self.request(text, target_language)
+        except TranslationError as e:
+            self.last_error = e
+            registry.counter('translation_errors_total', "Failed translation requests",
+                             backend=self.name, kind='single').inc()
+            print(f"Translation error: {e}")
+            return None
+
+        self.last_error = None
+        return translation
+
+    def translate_batch(self, texts, target_language="English"):
+        """Translate several lines at once
+
+        Returns one translation per line, or None if the request failed or
+        the reply could not be split back into lines.
+        """
+        if not self.initialized:
+            return None
+
+        try:
+            with registry.timer('translation_request_seconds', "Duration of a translation request",
+                                backend=self.name, kind='batch'):
+                return self.request_batch(texts, target_language)
+        except TranslationError as e:
+            self.last_error = e
+            registry.counter('translation_errors_total', "Failed translation requests",
+                             backend=self.name, kind='batch').inc()
+            print(f"Batch translation error: {e}")
+            return None
+
+    def preload(self):
+        """Get ready for the first request in the background"""
+
+    def close(self):
+        """Release connections and files"""
+
+
+class GeminiTranslator(Translator):
+    """Gemini API translator
+
+    Talks to the REST API through a TranslationClient: kept-alive
+    connections, a request rate limit, retries with backoff on 429s and
+    server errors, a deadline per call and a circuit breaker.  base_url
+    points it at another server, e.g. the benchmarks' stub server.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model='gemini-pro', base_url=GEMINI_API_URL,
+                 requests_per_minute=60, deadline=20.0, **client_options):
+        super().__init__()
+        self.model_name = model
+        self.base_url = base_url
+        self.requests_per_minute = requests_per_minute
+        self.deadline = deadline
+        self.client_options = client_options
+        self.api_key = None
+        self.client = None
+        self.initialized = False
+        self.lock = threading.Lock()
+        if api_key:
+            self.initialize(api_key)
+
+    def initialize(self, api_key):
+        """Set the API key; connections are opened on first use"""
+        with self.lock:
+            if self.client:
+                self.client.close()
+            self.api_key = api_key
+            self.client = None
+            if api_key:
+                self.client = TranslationClient(
+                    self.base_url, {'x-goog-api-key': api_key},
+                    requests_per_minute=self.requests_per_minute, deadline=self.deadline,
+                    **self.client_options)
+            self.initialized = bool(api_key)
+        return self.initialized
+
+    def preload(self):
+        """Connect to the API in the background, so the first request skips the handshake"""
+        if self.client:
+            threading.Thread(target=warm, args=(self.client, "Gemini"), daemon=True).start()
+
+    def generate(self, prompt):
+        """Text of the model's reply to prompt"""
+        reply = self.client.post_json(f'/v1beta/models/{self.model_name}:generateContent',
+                                      {'contents': [{'parts': [{'text': prompt}]}]})
+        try:
+            candidate = reply['candidates'][0]
+            return ''.join(part.get('text', '') for part in candidate['content']['parts'])
+        except (KeyError, IndexError, TypeError):
+            reason = (reply.get('promptFeedback', {}).get('blockReason')
+                      if isinstance(reply, dict) else None)
+            raise TranslationError(f"Gemini returned no text ({reason or 'empty reply'})")
+
+    def request(self, text, target_language):
+        return self.generate(build_prompt(text, target_language)).strip()
+
+    def request_batch(self, texts, target_language):
+        return parse_batch_response(self.generate(build_batch_prompt(texts, target_language)),
+                                    len(texts))
+
+    def close(self):
+        with self.lock:
+            if self.client:
+                self.client.close()
+
+
+class LocalHttpTranslator(Translator):
+    """A translation server on this machine: no API key, no quota, no internet
+
+    api='openai' talks to any OpenAI-compatible chat completions server
+    (llama.cpp, Ollama, LM Studio, vLLM) with the same prompts as Gemini;
+    base_url may end in /v1 or not.  api='libretranslate' talks to a
+    LibreTranslate server, which takes language codes (LANGUAGE_CODES) and
+    translates lists of lines natively.  Requests go through a
+    TranslationClient without a rate limit and with a short deadline.
+    """
+
+    name = 'local'
+
+    def __init__(self, base_url='http://127.0.0.1:8080', api='openai', model='local',
+                 api_key=None, source_language='ja', deadline=10.0, **client_options):
+        super().__init__()
+        if api not in ('openai', 'libretranslate'):
+            raise ValueError(f"Unknown local translation API: {api}")
+        self.api = api
+        self.model = model
+        self.api_key = api_key
+        self.source_language = source_language
+        self.model_name = f'openai:{model}' if api == 'openai' else 'libretranslate'
+
+        headers = {'Authorization': f'Bearer {api_key}'} if api_key and api == 'openai' else {}
+        client_options.setdefault('retries', 1)
+        self.client = TranslationClient(base_url, headers, requests_per_minute=None,
+                                        deadline=deadline, name=api, **client_options)
+        self.chat_path = ('/chat/completions' if self.client.pool.prefix.endswith('/v1')
+                          else '/v1/chat/completions')
+
+    def preload(self):
+        threading.Thread(target=warm, args=(self.client, "the local translation server"),
+                         daemon=True).start()
+
+    def chat(self, prompt):
+        """Text of the model's reply to prompt"""
+        reply = self.client.post_json(self.chat_path, {
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': 0,
+        })
+        try:
+            return reply['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            raise TranslationError(f"{self.api} server returned no text")
+
+    def libretranslate(self, q, target_language):
+        payload = {'q': q, 'source': self.source_language, 'format': 'text',
+                   'target': LANGUAGE_CODES.get(target_language, target_language)}
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        reply = self.client.post_json('/translate', payload)
+        try:
+            return reply['translatedText']
+        except (KeyError, TypeError):
+            raise TranslationError(f"LibreTranslate returned no text: {reply}")
+
+    def request(self, text, target_language):
+        if self.api == 'libretranslate':
+            return self.libretranslate(text, target_language).strip()
+        return self.chat(build_prompt(text, target_language)).strip()
+
+    def request_batch(self, texts, target_language):
+        if self.api == 'libretranslate':
+            translations = self.libretranslate(texts, target_language)
+            if not isinstance(translations, list) or len(translations) != len(texts):
+                return None
+            return [translation.strip() for translation in translations]
+        return parse_batch_response(self.chat(build_batch_prompt(texts, target_language)),
+                                    len(texts))
+
+    def close(self):
+        self.client.close()
+
+
+class GlossaryTranslator(Translator):
+    """Translation from a fixed glossary, without any server
+
+    A line that is a glossary entry gets that entry's translation.  Any
+    other line gets every glossary term in it replaced, longest terms
+    first, which is enough to follow menus, names and item lists; a line
+    without any known term has no translation.  Lookups take microseconds,
+    so this doubles as a backend for offline play and benchmarks.  The
+    glossary is for one target language, whatever target_language says.
+    """
+
+    name = 'glossary'
+    model_name = 'glossary'
+    # Changing the glossary file must change the results at once
+    cacheable = False
+
+    def __init__(self, entries):
+        super().__init__()
+        self.entries = {normalize_text(term): translation
+                        for term, translation in entries.items() if term.strip()}
+        terms = sorted(self.entries, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(map(re.escape, terms))) if terms else None
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a glossary: a JSON object, or one term<TAB>translation per line"""
+        with open(path, encoding='utf-8-sig') as f:
+            if path.endswith('.json'):
+                return cls(json.load(f))
+            entries = {}
+            for line in f:
+                term, tab, translation = line.rstrip('\r\n').partition('\t')
+                if tab and not term.startswith('#'):
+                    entries[term] = translation
+            return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def request(self, text, target_language):
+        text = normalize_text(text)
+        translation = self.entries.get(text)
+        if translation is not None or self.pattern is None:
+            return translation
+
+        replaced, count = self.pattern.subn(lambda match: self.entries[match.group()], text)
+        return replaced if count else None
+
+
+def warm(client, label):
+    """Open a connection for client, reporting failures"""
+    try:
+        client.warm()
+    except Exception as e:
+        print(f"Failed to connect to {label}: {e}")
+
+
+def create_translator(settings):
+    """The backend chosen in settings (the overlay's settings dict)
+
+    A backend that cannot be set up is returned uninitialized, with the
+    reason in last_error.
+    """
+    backend = settings.get('translation_backend', 'gemini')
+
+    if backend == 'gemini':
+        return GeminiTranslator(settings.get('gemini_api_key') or None,
+                                model=settings.get('gemini_model') or 'gemini-pro',
+                                requests_per_minute=settings.get('gemini_requests_per_minute') or 60)
+
+    if backend == 'local':
+        return LocalHttpTranslator(settings.get('local_url') or 'http://127.0.0.1:8080',
+                                   settings.get('local_api') or 'openai',
+                                   model=settings.get('local_model') or 'local',
+                                   api_key=settings.get('local_api_key') or None)
+
+    if backend == 'glossary':
+        try:
+            return GlossaryTranslator.from_file(settings.get('glossary_file') or 'glossary.tsv')
+        except (OSError, ValueError) as e:
+            translator = GlossaryTranslator({})
+            translator.initialized = False
+            translator.last_error = e
+            return translator
+
+    raise ValueError(f"Unknown translation backend: {backend}")
@@ -0,0 +1,97 @@
+import ctypes
+
+from japanese_classifier import is_japanese
+
+
+# pywin32 and psutil are imported on first use so headless tools can load
+# this module on machines without them
+
+
+def find_windows():
+    """Find all visible windows that have a title"""
+    import psutil
+    import win32gui
+    import win32process
+
+    windows = []
+
+    def enum_windows_callback(hwnd, windows):
+        if win32gui.IsWindowVisible(hwnd):
+            window_text = win32gui.GetWindowText(hwnd)
+            if window_text:
+                try:
+                    _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                    process = psutil.Process(pid)
+                    windows.append({
+                        'hwnd': hwnd,
+                        'title': window_text,
+                        'pid': pid,
+                        'process_name': process.name()
+                    })
+                except:
+                    pass
+        return True
+
+    win32gui.EnumWindows(enum_windows_callback, windows)
+    return windows
+
+
+def _message_text(hwnd):
+    """Window text through WM_GETTEXT, which also reaches edit controls"""
+    import win32con
+    import win32gui
+
+    length = win32gui.SendMessage(hwnd, win32con.WM_GETTEXTLENGTH, 0, 0)
+    if length <= 0:
+        return ""
+    buffer = ctypes.create_unicode_buffer(length + 1)
+    win32gui.SendMessage(hwnd, win32con.WM_GETTEXT, length + 1, buffer)
+    return buffer.value
+
+
+def capture_window_text(hwnd):
+    """Capture text from a window using various methods
+
+    Returns (source, text, control) triples, control being the window the
+    text was read from; child windows only contribute Japanese text.
+    """
+    import win32gui
+
+    captured_texts = []
+
+    # Method 1: GetWindowText
+    try:
+        window_text = win32gui.GetWindowText(hwnd)
+        if window_text:
+            captured_texts.append(('Window Title', window_text, hwnd))
+    except:
+        pass
+
+    # Method 2: SendMessage with WM_GETTEXT
+    try:
+        text = _message_text(hwnd)
+        if text:
+            captured_texts.append(('WM_GETTEXT', text, hwnd))
+    except:
+        pass
+
+    # Method 3: Enumerate child windows
+    def enum_child_callback(child_hwnd, texts):
+        try:
+            child_text = win32gui.GetWindowText(child_hwnd)
+            if child_text and is_japanese(child_text):
+                texts.append(('Child Window', child_text, child_hwnd))
+
+            text = _message_text(child_hwnd)
+            if text and is_japanese(text):
+                texts.append(('Child Text', text, child_hwnd))
+        except:
+            pass
+        return True
+
+    try:
+        win32gui.EnumChildWindows(hwnd, enum_child_callback, captured_texts)
+    except:
+        pass
+
+    return captured_texts